@@ -0,0 +1,84 @@
+"""
+import-time benchmark.
+
+starts a fresh interpreter per run for each case and reports the best time on top of a bare
+`python -c pass`, plus which heavy dependencies each case loaded. the package import and the
+PBIX-only and --help paths must not load msal or requests and must stay within --budget-ms,
+otherwise the exit status is 1, so this can run in CI.
+
+    python benchmarks/import_bench.py
+    python benchmarks/import_bench.py --runs 30 --budget-ms 30 --json results.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+HEAVY = ('requests', 'msal', 'httpx', 'urllib3', 'asyncio')
+
+# name -> (code, whether it has to stay within the budget without heavy dependencies)
+CASES = {
+    'import bi_publishing': ("import bi_publishing", True),
+    'pbix only': ("from bi_publishing import connect_pbix, disconnect_pbix", True),
+    'cli --help': ("import sys; sys.argv = ['bi-publishing', '--help']\n"
+                   "try:\n    import runpy; runpy.run_module('bi_publishing', run_name='__main__')\n"
+                   "except SystemExit:\n    pass", True),
+    'with client deps': ("import bi_publishing, msal, requests", False),
+}
+
+REPORT = "\nimport sys as _s; print('loaded:' + ','.join(m for m in {heavy!r} if m in _s.modules))"
+
+
+def _run(code, env):
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', code + REPORT.format(heavy=HEAVY)], env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    loaded = [line for line in out.stdout.splitlines() if line.startswith('loaded:')][-1]
+    return time.perf_counter() - started, loaded[len('loaded:'):]
+
+
+def measure(code, runs, env):
+    times = []
+    loaded = ''
+    for _ in range(runs):
+        elapsed, loaded = _run(code, env)
+        times.append(elapsed)
+    # the minimum is the least disturbed by other load on the machine
+    return min(times), [m for m in loaded.split(',') if m]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, default=50, help="allowed import time on top of a bare interpreter")
+    parser.add_argument('--json', help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    # warm the bytecode caches so the first case doesn't pay for compiling
+    _run("import bi_publishing.cli, bi_publishing.pipeline, bi_publishing.spec, bi_publishing.auth", env)
+    baseline, _ = measure("pass", args.runs, env)
+
+    results = []
+    over = False
+    print(f"{'case':<20} {'ms':>8} {'budget':>8}  heavy modules loaded")
+    for name, (code, budgeted) in CASES.items():
+        seconds, loaded = measure(code, args.runs, env)
+        ms = round((seconds - baseline) * 1000, 1)
+        ok = not budgeted or (ms <= args.budget_ms and not loaded)
+        over = over or not ok
+        results.append({'case': name, 'ms': ms, 'loaded': loaded, 'budgeted': budgeted, 'ok': ok})
+        budget = (f"{args.budget_ms:g}" if budgeted else '-') + ('' if ok else ' !')
+        print(f"{name:<20} {ms:>8} {budget:>8}  {', '.join(loaded) or '-'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'baseline_ms': round(baseline * 1000, 1), 'results': results}, f, indent=2)
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+end-to-end publish benchmark against the local mock PowerBI service.
+
+publishes a DATASET_REPORT_MAPPING of generated PBIX files into 1, 10 and 100 workspaces (by default)
+and reports wall time, throughput, api calls per workspace, bytes uploaded and peak python memory.
+everything runs offline and the generated files are seeded, so runs are comparable between commits.
+
+    python benchmarks/publish_bench.py
+    python benchmarks/publish_bench.py --workspaces 1 10 --pbix-mb 1 50 --latency 0.05 --json results.json
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import bi_publishing  # noqa: E402
+from bi_publishing.mockserver import MockPowerBIServer  # noqa: E402
+
+TAG = 'bench'
+MAPPING = {
+    'Dataset - Bench.pbix': ['Management Report.pbix', 'Strategy Report.pbix', 'Tactical Report.pbix'],
+}
+DW_CONN = {'type': 'postgres', 'host': 'bench.local', 'username': 'bench', 'password': 'bench'}
+
+
+def make_pbix(path, size, seed):
+    """
+    write a pbix-like archive with a DataModel member of `size` incompressible bytes
+    """
+    rng = random.Random(seed)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('Version', '1.28')
+        z.writestr('Connections', '{"Version": 3, "Connections": []}')
+        with z.open('DataModel', 'w', force_zip64=True) as f:
+            remaining = size
+            while remaining:
+                chunk = min(remaining, 1024 * 1024)
+                f.write(rng.randbytes(chunk))
+                remaining -= chunk
+        z.writestr('Report/Layout', json.dumps({'sections': [{'name': f'ReportSection{i}'} for i in range(3)]}))
+
+
+def run_case(workspaces, pbix_mb, args):
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockPowerBIServer(latency=args.latency, import_delay=args.import_delay,
+                              visibility_delay=args.visibility_delay, throttle_rate=args.throttle_rate) as server:
+        for i, dset in enumerate(MAPPING):
+            path = os.path.join(tmp, dset)
+            make_pbix(path, int(pbix_mb * 1024 * 1024), seed=i)
+            server.add_file(TAG, dset, path)
+        for i, report in enumerate({r for reports in MAPPING.values() for r in reports}):
+            path = os.path.join(tmp, report)
+            make_pbix(path, 64 * 1024, seed=100 + i)
+            server.add_file(TAG, report, path)
+
+        client = server.client(pool_maxsize=max(32, args.workspace_workers * args.max_workers))
+        cache = bi_publishing.ArtifactCache(os.path.join(tmp, 'cache'), client=client)
+
+        def _publish(i):
+            name = f"bench workspace {i:04d}"
+            bi_publishing.create_group(client, name)
+            group = bi_publishing.get_group_by_name(client, name)
+            work_dir = os.path.join(tmp, 'work', str(i))
+            os.makedirs(work_dir)
+            bi_publishing.publish_workspace(client, group, MAPPING, TAG, 'bench_db', DW_CONN, work_dir=work_dir,
+                                            max_workers=args.max_workers, artifact_cache=cache, refresh=True)
+
+        server.reset_counters()
+        tracemalloc.start()
+        started = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.workspace_workers) as pool:
+            list(pool.map(_publish, range(workspaces)))
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        calls = server.call_counts()
+        total_calls = sum(calls.values())
+        return {
+            'workspaces': workspaces,
+            'pbix_mb': pbix_mb,
+            'seconds': round(elapsed, 3),
+            'workspaces_per_s': round(workspaces / elapsed, 3),
+            'upload_mb_per_s': round(server.bytes_received / elapsed / 1024 ** 2, 2),
+            'calls': total_calls,
+            'calls_per_workspace': round(total_calls / workspaces, 1),
+            'throttled': server.throttled,
+            'peak_mb': round(peak / 1024 ** 2, 2),
+            'top_endpoints': sorted(([f"{m} {e}", n] for (m, e), n in calls.items()), key=lambda row: -row[1])[:5],
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workspaces', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--pbix-mb', type=float, nargs='+', default=[1])
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds added to every mock api call")
+    parser.add_argument('--import-delay', type=float, default=0.2)
+    parser.add_argument('--visibility-delay', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=None, help="mock requests per second before 429s")
+    parser.add_argument('--max-workers', type=int, default=4, help="publish_workspace workers per workspace")
+    parser.add_argument('--workspace-workers', type=int, default=8, help="workspaces published at once")
+    parser.add_argument('--json', help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'workspaces':>10} {'pbix MB':>8} {'seconds':>8} {'ws/s':>7} {'MB/s':>7} {'calls/ws':>8} {'429s':>5} {'peak MB':>8}")
+    for pbix_mb in args.pbix_mb:
+        for workspaces in args.workspaces:
+            result = run_case(workspaces, pbix_mb, args)
+            results.append(result)
+            print(f"{result['workspaces']:>10} {result['pbix_mb']:>8} {result['seconds']:>8} "
+                  f"{result['workspaces_per_s']:>7} {result['upload_mb_per_s']:>7} {result['calls_per_workspace']:>8} "
+                  f"{result['throttled']:>5} {result['peak_mb']:>8}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
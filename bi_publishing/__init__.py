@@ -1,34 +1,234 @@
+import contextlib
+import importlib
 import time
-import requests
 import json
-import msal
-import urllib.parse
-import zipfile
 import os
+import random
+import threading
+from urllib.parse import quote
+
+from .instrument import add_hook, log, remove_hook, set_verbose, span, track_request  # noqa: F401
+from .index import MetadataIndex, DEFAULT_TTL as DEFAULT_INDEX_TTL
+from .throttle import DEFAULT_RETRY_POLICY, RateLimiter, RetryPolicy, shared_rate_limiter  # noqa: F401
 
 POWERBI_BASE_URL = "https://api.powerbi.com/v1.0/myorg"
 
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 32
+# rows requested per $top/$skip page from the endpoints that support paging
+DEFAULT_PAGE_SIZE = 5000
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def _new_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """
+    returns a requests session with a keep-alive connection pool mounted for https
+    """
+    import requests
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _get_session(client):
+    """
+    returns the session owned by the client, or a shared module level session for old dict clients
+    """
+    session = getattr(client, 'session', None)
+    if session is not None:
+        return session
+
+    global _default_session
+    if _default_session is None:
+        with _default_session_lock:
+            if _default_session is None:
+                _default_session = _new_session()
+    return _default_session
+
+
+def _rewind_body(kwargs):
+    """
+    seek uploaded file objects and streamed bodies back to the start so a request can be sent again
+    """
+    if hasattr(kwargs.get('data'), 'seek'):
+        kwargs['data'].seek(0)
+    for value in (kwargs.get('files') or {}).values():
+        f = value[1] if isinstance(value, tuple) else value
+        if hasattr(f, 'seek'):
+            f.seek(0)
+
+
+def _request(client, method, url, **kwargs):
+    """
+    send a request through the client's pooled session.
+    waits on the client's rate limiter first (for PowerBI api calls) and retries throttled or transient failures
+    according to the client's retry policy, honouring Retry-After.
+    """
+    import requests
+    session = _get_session(client)
+    limiter = getattr(client, 'rate_limiter', None)
+    policy = getattr(client, 'retry_policy', DEFAULT_RETRY_POLICY)
+    event = track_request(method, url, kwargs.get('data', kwargs.get('json')))
+    attempt = 0
+    while True:
+        if limiter is not None and url.startswith(POWERBI_BASE_URL):
+            limiter.acquire(method, url)
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if not policy.should_retry(method, attempt, error=e):
+                if event is not None:
+                    event.finish(error=e)
+                raise
+            delay = policy.delay(attempt)
+            reason = type(e).__name__
+        else:
+            if response.status_code < 400 or not policy.should_retry(method, attempt, response.status_code):
+                if event is not None:
+                    event.finish(response)
+                return response
+            delay = policy.delay(attempt, response.headers)
+            reason = response.status_code
+        log(f"==== {method} {url} failed ({reason}), retrying in {delay:.1f}s ====")
+        time.sleep(delay)
+        attempt += 1
+        if event is not None:
+            event.retries = attempt
+        _rewind_body(kwargs)
+
+
+def _backoff_intervals(initial=0.5, maximum=10, factor=2):
+    """
+    yields exponentially growing sleep intervals with jitter, capped at maximum
+    """
+    interval = initial
+    while True:
+        yield random.uniform(interval / 2, interval)
+        interval = min(maximum, interval * factor)
+
+
+def _odata_quote(value):
+    """
+    returns the given value as an OData string literal for use in $filter
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _iter_pages(client, api_url, params=None, page_size=None):
+    """
+    yields the items of the given collection url one page at a time.
+    with page_size the pages are requested with $top/$skip until a short page comes back,
+    and @odata.nextLink continuation links returned by the service are followed either way.
+    """
+    skip = 0
+    while True:
+        query = dict(params or {})
+        if page_size:
+            query['$top'] = page_size
+            if skip:
+                query['$skip'] = skip
+        url = api_url
+        count = 0
+        while url:
+            response = _request(client, 'GET', url, headers=_get_headers(client), params=query)
+            if response.status_code != 200:
+                raise Exception(response.content)
+            body = response.json()
+            items = body.get('value', [])
+            count += len(items)
+            yield from items
+            # next links already carry the query
+            url, query = body.get('@odata.nextLink'), None
+        if not page_size or count < page_size:
+            return
+        skip += count
+
+
+def _all_values(client, body):
+    """
+    returns the 'value' list of the given collection response plus the items of any continuation pages
+    """
+    items = list(body.get('value', []))
+    next_link = body.get('@odata.nextLink')
+    if next_link:
+        items.extend(_iter_pages(client, next_link))
+    return items
+
+
+def _index_store(client, group_id, kind, items):
+    index = getattr(client, 'index', None)
+    if index is not None:
+        index.store(group_id, kind, items)
+
+
+def _index_add(client, group_id, kind, items):
+    index = getattr(client, 'index', None)
+    if index is not None:
+        index.add(group_id, kind, items)
+
+
+def _index_lookup(client, group_id, kind, name):
+    index = getattr(client, 'index', None)
+    return index.lookup(group_id, kind, name) if index is not None else None
+
+
+def _index_invalidate(client, group_id=None, kind=None):
+    index = getattr(client, 'index', None)
+    if index is not None:
+        index.invalidate(group_id, kind)
+
+
+class PowerBIClient(dict):
+    """
+    client used to interact with the PowerBI service.
+    it holds the auth token and a pooled keep-alive session that every api call goes through.
+    it is a dict so code that reads client['auth_token'] keeps working.
+    `index` caches name -> object lookups for `index_ttl` seconds, see bi_publishing.index.
+    `rate_limiter` (shareable between clients) and `retry_policy` are applied to every call,
+    see bi_publishing.throttle.
+
+    `token_provider` keeps 'auth_token' fresh for long runs, see bi_publishing.auth.
+
+    any object with a requests compatible `request()` method can be passed as `session`,
+    e.g. to use an HTTP/2 capable transport.
+    """
+
+    def __init__(self, auth_token, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, session=None, index_ttl=DEFAULT_INDEX_TTL,
+                 rate_limiter=None, retry_policy=DEFAULT_RETRY_POLICY, token_provider=None):
+        super().__init__(auth_token=auth_token)
+        self.token_provider = token_provider
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.session = session if session is not None else _new_session(pool_connections, pool_maxsize)
+        self.index = MetadataIndex(ttl=index_ttl)
+
+    def __getitem__(self, key):
+        if key == 'auth_token' and self.token_provider is not None:
+            return self.token_provider.token()
+        return super().__getitem__(key)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 
 def get_auth_token(config):
-    app = msal.ConfidentialClientApplication(
-        config["client_id"], authority=config["authority"],
-        client_credential=config["secret"])
-
-    result = None
-    result = app.acquire_token_silent(config["scope"], account=None)
-
-    if not result:
-        print("No suitable token exists in cache. Let's get a new one from Azure AD.")
-        result = app.acquire_token_for_client(scopes=config["scope"])
-    # print(result)
-    if "access_token" in result:
-        access_token = result['access_token']
-        return access_token
-    else:
-        print(result.get("error"))
-        print(result.get("error_description"))
-        print(result.get("correlation_id"))
-        raise Exception("Failed to acquire token", result)
+    """
+    returns an access token for the given config.
+    the msal app and its token cache are shared per app within the process, so repeated calls reuse the cached token.
+    """
+    from .auth import get_token_provider
+    return get_token_provider(config).token()
 
 
 def _get_headers(client):
@@ -41,47 +241,72 @@ def _get_headers(client):
 def create_group(client, group_name):
     try:
         _ = get_group_by_name(client, group_name)
-        print(f"Group={group_name} already exists")
+        log(f"Group={group_name} already exists")
         return
     except:  # noqa
-        print(f"Group={group_name} not found, creating new group")
+        log(f"Group={group_name} not found, creating new group")
         api_url = f"{POWERBI_BASE_URL}/groups"
         body = {"name": group_name}
-        response = requests.post(api_url, headers=_get_headers(client), data=json.dumps(body))
+        response = _request(client, 'POST', api_url, headers=_get_headers(client), data=json.dumps(body))
+        _index_invalidate(client, None, 'groups')
         if response.ok:
-            print("--- created workspace ---")
+            log("--- created workspace ---")
         else:
             raise Exception(f"--- create workspace failed: {response.content} ---")
 
 
-def get_groups(client):
+def iter_groups(client, filter=None, page_size=DEFAULT_PAGE_SIZE):
     """
-    returns a list of groups available to the client
+    yields the groups available to the client, fetching them lazily in pages of page_size.
+    `filter` is an OData $filter expression evaluated by the service, e.g. "startswith(name,'GTM')".
     """
-    api_url = f"{POWERBI_BASE_URL}/groups"
-    response = requests.get(api_url, headers=_get_headers(client))
-    if response.status_code == 200:
-        groups = response.json()
-        return groups['value']
+    params = {'$filter': filter} if filter else None
+    return _iter_pages(client, f"{POWERBI_BASE_URL}/groups", params, page_size)
+
+
+def get_groups(client, filter=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    returns a list of groups available to the client, optionally narrowed by an OData $filter expression
+    """
+    groups = list(iter_groups(client, filter, page_size))
+    if filter:
+        _index_add(client, None, 'groups', groups)
     else:
-        raise Exception(response.content)
+        _index_store(client, None, 'groups', groups)
+    return groups
+
+
+def find_group(client, group_name):
+    """
+    returns the group object with the given name, or None.
+    the name is matched by the service, so only the matching row is transferred.
+    """
+    group = _index_lookup(client, None, 'groups', group_name)
+    if group is not None:
+        return group
+    params = {'$filter': f"name eq {_odata_quote(group_name)}", '$top': 1}
+    group = next(_iter_pages(client, f"{POWERBI_BASE_URL}/groups", params), None)
+    if group is not None:
+        _index_add(client, None, 'groups', [group])
+    return group
 
 
 def get_group_by_name(client, group_name):
     """
     return the group object for the given group name
     """
-    for group in get_groups(client):
-        if group['name'] == group_name:
-            return group
-    raise Exception(f"Group={group_name} not found")
+    group = find_group(client, group_name)
+    if group is None:
+        raise Exception(f"Group={group_name} not found")
+    return group
 
 
 def set_group_to_large_semantic_model(client, group_id):
     url = f"{POWERBI_BASE_URL}/groups/{group_id}"
-    res = requests.patch(url, headers=_get_headers(client), data=json.dumps({"defaultDatasetStorageFormat": "Large"}))
+    res = _request(client, 'PATCH', url, headers=_get_headers(client), data=json.dumps({"defaultDatasetStorageFormat": "Large"}))
+    _index_invalidate(client, None, 'groups')
     if res.ok:
-        print("--- workspace set to use large semantic models successfully ---")
+        log("--- workspace set to use large semantic models successfully ---")
     else:
         raise Exception("Failed to update workspace to large models: ", res.content)
 
@@ -92,11 +317,12 @@ def get_datasets_in_group(client, group_id, retries=0, interval=1):
     """
     api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/datasets"
     for i in range(retries + 1):
-        response = requests.get(api_url, headers=_get_headers(client))
+        response = _request(client, 'GET', api_url, headers=_get_headers(client))
         if response.status_code == 200:
-            datasets = response.json()
-            return datasets['value']
-        print(f"==== request failed sleeping {interval}s ====")
+            datasets = _all_values(client, response.json())
+            _index_store(client, group_id, 'datasets', datasets)
+            return datasets
+        log(f"==== request failed sleeping {interval}s ====")
         time.sleep(interval)
 
     raise ValueError(response.content)
@@ -106,12 +332,15 @@ def get_dataset_by_name(client, group_id, dataset_name, retries=0, interval=1):
     """
     returns the dataset object for the given dataset name in the given group
     """
+    dataset = _index_lookup(client, group_id, 'datasets', dataset_name)
+    if dataset is not None:
+        return dataset
     for i in range(retries + 1):
         datasets = get_datasets_in_group(client, group_id)
         for ds in datasets:
             if ds['name'] == dataset_name:
                 return ds
-        print(f"==== request failed sleeping {interval}s ====")
+        log(f"==== request failed sleeping {interval}s ====")
         time.sleep(interval)
     raise ValueError(f"dataset '{dataset_name}' not found in group {group_id}")
 
@@ -119,9 +348,9 @@ def get_dataset_by_name(client, group_id, dataset_name, retries=0, interval=1):
 def takeover_dataset_in_group(client, group_id, dataset_id):
     api_url = F"{POWERBI_BASE_URL}/groups/{group_id}/datasets/{dataset_id}/Default.TakeOver"
     body = {}
-    response = requests.post(api_url, headers=_get_headers(client), data=json.dumps(body))
+    response = _request(client, 'POST', api_url, headers=_get_headers(client), data=json.dumps(body))
     if response.ok:
-        print("--- dataset taken over ---")
+        log("--- dataset taken over ---")
     else:
         raise Exception(f"--- dataset takeover failed: {response.content} ---")
 
@@ -132,11 +361,12 @@ def get_reports_in_group(client, group_id, retries=0, interval=1):
     """
     api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/reports"
     for i in range(retries + 1):
-        response = requests.get(api_url, headers=_get_headers(client))
+        response = _request(client, 'GET', api_url, headers=_get_headers(client))
         if response.status_code == 200:
-            reports = response.json()
-            return reports['value']
-        print(f"==== request failed sleeping {interval}s ====")
+            reports = _all_values(client, response.json())
+            _index_store(client, group_id, 'reports', reports)
+            return reports
+        log(f"==== request failed sleeping {interval}s ====")
         time.sleep(interval)
 
     raise ValueError(response.content)
@@ -146,13 +376,16 @@ def get_report_by_name(client, group_id, report_name, retries=0, interval=1):
     """
     returns the report object for the given report name in the given group
     """
+    report = _index_lookup(client, group_id, 'reports', report_name)
+    if report is not None:
+        return report
     for i in range(retries + 1):
         # if the report is uploaded immediately before this step, it doesn't show up immediately. you'd have to wait and retry until it shows up.
         reports = get_reports_in_group(client, group_id, retries=5, interval=10)
         for report in reports:
             if report['name'] == report_name:
                 return report
-        print(f"==== report not found. sleeping {interval}s ====")
+        log(f"==== report not found. sleeping {interval}s ====")
         time.sleep(interval)
 
     raise ValueError(f"'{report_name}' not found in '{group_id}'")
@@ -163,89 +396,175 @@ def get_dashboards_in_group(client, group_id):
     returns a list of dashboards in the given group
     """
     api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/dashboards/"
-    response = requests.get(api_url, headers=_get_headers(client))
+    response = _request(client, 'GET', api_url, headers=_get_headers(client))
     if response.status_code == 200:
-        dashboards = response.json()
-        return dashboards['value']
+        dashboards = _all_values(client, response.json())
+        _index_store(client, group_id, 'dashboards', dashboards)
+        return dashboards
     else:
         raise Exception(response.content)
 
 
-def get_page_urls_for_report(client, group_id, report_id):
-    pages_url = f"https://api.powerbi.com/v1.0/myorg/groups/{group_id}/reports/{report_id}/pages"
-    response = requests.get(pages_url, headers=_get_headers(client))
-    pages = response.json().get('value', [])
+def get_dashboard_by_name(client, group_id, dashboard_name):
+    """
+    returns the dashboard object for the given dashboard name in the given group
+    """
+    dashboard = _index_lookup(client, group_id, 'dashboards', dashboard_name)
+    if dashboard is not None:
+        return dashboard
+    for dashboard in get_dashboards_in_group(client, group_id):
+        if dashboard.get('displayName', dashboard.get('name')) == dashboard_name:
+            return dashboard
+    raise ValueError(f"dashboard '{dashboard_name}' not found in group {group_id}")
 
-    output = []
-    for page in pages:
-        page_id = page['name']
-        display_name = page['displayName']
-        url = f"https://app.powerbi.com/groups/{group_id}/reports/{report_id}/{page_id}?experience=power-bi"
 
-        # You can replace this with a lookup or metadata if you have descriptions stored elsewhere
-        description = "No description available"  # Placeholder
-    
-        output.append({
-            "page_name": display_name,
-            "page_id": page_id,
-            "page_url": url,
-            # "description": description
-        })
-    return output
+def _page_urls(group_id, report_id, pages, web_url=None):
+    """
+    returns [{'page_name', 'page_id', 'page_url'}] for the given pages of a report, in report order
+    """
+    base = web_url or f"https://app.powerbi.com/groups/{group_id}/reports/{report_id}"
+    return [{
+        "page_name": page['displayName'],
+        "page_id": page['name'],
+        "page_url": f"{base.rstrip('/')}/{page['name']}?experience=power-bi",
+    } for page in sorted(pages, key=lambda p: p.get('order', 0))]
 
 
-def upload_report_group(client, group, remote_report_name, local_pbix_file_path):
+def get_pages_for_report(client, group_id, report_id):
     """
-    upload the given local pbix report file into the workspace(group)
+    returns the pages of the given report as listed by the service
     """
-    headers = {
-        "Authorization": f"Bearer {client['auth_token']}",
-        "Content-Type": "multipart/form-data"
-    }
-    import_url = f"{POWERBI_BASE_URL}/groups/{group['id']}/imports?datasetDisplayName={remote_report_name}&nameConflict=Abort"
+    pages_url = f"{POWERBI_BASE_URL}/groups/{group_id}/reports/{report_id}/pages"
+    response = _request(client, 'GET', pages_url, headers=_get_headers(client))
+    if response.status_code != 200:
+        raise Exception(response.content)
+    return _all_values(client, response.json())
+
+
+def get_page_urls_for_report(client, group_id, report_id, web_url=None):
+    """
+    returns [{'page_name', 'page_id', 'page_url'}] for the pages of the given report.
+    the urls start from the report's webUrl when given. see get_page_urls_for_groups for many reports at once.
+    """
+    return _page_urls(group_id, report_id, get_pages_for_report(client, group_id, report_id), web_url)
+
+
+def _open_pbix(local_pbix_file_path):
+    """
+    helper function that opens the given pbix path, or passes through an already open file object
+    (e.g. a PbixTemplate stream) without closing it afterwards
+    """
+    if hasattr(local_pbix_file_path, 'read'):
+        return contextlib.nullcontext(local_pbix_file_path)
+    return open(local_pbix_file_path, 'rb')
+
+
+def upload_report_group(client, group, remote_report_name, local_pbix_file_path, progress=None, name_conflict='Abort',
+                        **upload_options):
+    """
+    upload the given local pbix report file (a path or an open file object) into the workspace(group).
+    the file is streamed; files over the inline import limit are uploaded in blocks to a temporary
+    location first. progress(sent, total) is called as bytes go out, see bi_publishing.uploads.post_import
+    for the other options. name_conflict='CreateOrOverwrite' replaces an existing report of the same name
+    and keeps its id.
+    """
+    from .uploads import post_import
+    import_url = f"{POWERBI_BASE_URL}/groups/{group['id']}/imports?datasetDisplayName={remote_report_name}&nameConflict={name_conflict}"
     file_name = "GTM Suite - Automatic Data Enhancement Report.pbix"
-    files = {
-        'file': (file_name, open(local_pbix_file_path, 'rb'), 'application/octet-stream')
-    }
-    response = requests.post(import_url, headers=headers, files=files)
+    with _open_pbix(local_pbix_file_path) as f:
+        response = post_import(client, group['id'], import_url, file_name, f, progress=progress, **upload_options)
+    _index_invalidate(client, group['id'], 'reports')
+    _index_invalidate(client, group['id'], 'datasets')
     if response.ok:
-        print("--- upload report complete ---")
+        log("--- upload report complete ---")
         return response.json()
     else:
         raise Exception(f"Upload failed: {response.content}")
 
 
-def upload_datasest_to_group(client, group_id, remote_dataset_name, local_pbix_file_path):
+def upload_datasest_to_group(client, group_id, remote_dataset_name, local_pbix_file_path, progress=None,
+                             name_conflict=None, **upload_options):
     """
-    upload the given local pbix dataset file into the powerbi service account workspace(group_id)
+    upload the given local pbix dataset file (a path or an open file object) into the powerbi service account workspace(group_id).
+    streams the file like upload_report_group. name_conflict='CreateOrOverwrite' replaces an existing dataset
+    of the same name and keeps its id.
     """
-    headers = {
-        "Authorization": f"Bearer {client['auth_token']}",
-        "Content-Type": "multipart/form-data"
-    }
+    from .uploads import post_import
     import_url = f"{POWERBI_BASE_URL}/groups/{group_id}/imports?datasetDisplayName={remote_dataset_name}&skipReport=true"
-    file_name = local_pbix_file_path.split("/")[-1] if '/' in local_pbix_file_path else local_pbix_file_path
-    files = {
-        'file': (file_name, open(local_pbix_file_path, 'rb'), 'application/octet-stream')
-    }
-    response = requests.post(import_url, headers=headers, files=files)
+    if name_conflict:
+        import_url += f"&nameConflict={name_conflict}"
+    with _open_pbix(local_pbix_file_path) as f:
+        file_name = os.path.basename(getattr(f, 'name', None) or 'dataset.pbix')
+        response = post_import(client, group_id, import_url, file_name, f, progress=progress, **upload_options)
+    _index_invalidate(client, group_id, 'datasets')
     if response.ok:
         return response.json()
     else:
         raise Exception("upload failed: ", response.content)
 
 
+class ImportNotFound(Exception):
+    """
+    the service doesn't know the given import (yet)
+    """
+
+
+def get_import_in_group(client, group_id, import_id):
+    """
+    returns the import object for the given import id in the given group
+    """
+    api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/imports/{import_id}"
+    response = _request(client, 'GET', api_url, headers=_get_headers(client))
+    if response.ok:
+        return response.json()
+    if response.status_code == 404:
+        raise ImportNotFound(f"--- import {import_id} not found: {response.content} ---")
+    raise Exception(f"--- failed to get import {import_id}: {response.content} ---")
+
+
+def wait_for_import(client, group_id, import_id, timeout=600, initial_interval=0.5, max_interval=10,
+                    max_not_found=5):
+    """
+    poll the given import until it succeeds and return the import object.
+    the created datasets and reports are in import['datasets'] and import['reports'].
+    polls with exponential backoff and jitter; raises if the import fails or timeout seconds pass.
+    the import can 404 for a moment right after the upload returns, so up to max_not_found 404s in a row
+    are polled through; any other error is raised straight away.
+    """
+    deadline = time.monotonic() + timeout
+    not_found = 0
+    for interval in _backoff_intervals(initial_interval, max_interval):
+        try:
+            imp = get_import_in_group(client, group_id, import_id)
+            not_found = 0
+        except ImportNotFound:
+            not_found += 1
+            if not_found > max_not_found:
+                raise
+            imp = {'importState': 'NotFound'}
+
+        state = imp.get('importState')
+        if state == 'Succeeded':
+            log(f"--- import {import_id} succeeded ---")
+            return imp
+        if state == 'Failed':
+            raise Exception(f"--- import {import_id} failed: {imp} ---")
+        if time.monotonic() + interval > deadline:
+            raise TimeoutError(f"import {import_id} did not finish in {timeout}s, last state: {state}")
+        time.sleep(interval)
+
+
 def rebind_report_to_dataset_in_group(client, report_id, group_id, dataset_id):
     """
     rebind the given report to the given dataset in the given group
     """
     api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/reports/{report_id}/Rebind"
-    print(f"--- rebind report: {report_id} to dataset: {dataset_id} ---")
-    print(f"--- rebind url: {api_url} ---")
+    log(f"--- rebind report: {report_id} to dataset: {dataset_id} ---")
+    log(f"--- rebind url: {api_url} ---")
     body = {'datasetId': dataset_id}
-    response = requests.post(api_url, headers=_get_headers(client), data=json.dumps(body))
+    response = _request(client, 'POST', api_url, headers=_get_headers(client), data=json.dumps(body))
     if response.ok:
-        print("--- rebind successful ---")
+        log("--- rebind successful ---")
     else:
         raise Exception(f"--- rebind failed: {response.content} ---")
 
@@ -259,31 +578,38 @@ def update_report_content_in_group(client, group_id, src_report_id, target_repor
           },
           "sourceType": "ExistingReport"
     }
-    response = requests.post(api_url, headers=_get_headers(client), data=json.dumps(body))
+    response = _request(client, 'POST', api_url, headers=_get_headers(client), data=json.dumps(body))
     if response.ok:
-        print("--- report content updated ---")
+        log("--- report content updated ---")
     else:
         raise Exception(f"--- report content update failed: {response.content} ---")
 
 
-def refresh_dataset_in_group(client, group_id, datasetId):
+def refresh_dataset_in_group(client, group_id, datasetId, wait=False, timeout=3600, **options):
     """
-    refresh the dataset in the given group
+    refresh the dataset in the given group and return the refresh request id.
+    options (objects, commit_mode, max_parallelism, retry_count, ...) make it an enhanced refresh, see
+    bi_publishing.refresh.refresh_payload. with wait the refresh is polled until it finishes and its
+    history entry is returned instead.
     """
+    from .refresh import refresh_payload, wait_for_refresh
     api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/datasets/{datasetId}/refreshes"
-    payload = {
-        # "notifyOption": "MailOnFailure",
-        # "retryCount": 3
-    }
-    payload_json = json.dumps(payload)
-    response = requests.post(api_url, headers=_get_headers(client), data=payload_json)
+    payload_json = json.dumps(refresh_payload(**options))
+    response = _request(client, 'POST', api_url, headers=_get_headers(client), data=payload_json)
     if response.status_code == 202:
-        print("--- Dataset refresh request accepted. ---")
+        log("--- Dataset refresh request accepted. ---")
     else:
-        print("Failed to refresh dataset. Status code:", response.status_code)
-        print("Response:", response.text)
+        log("Failed to refresh dataset. Status code:", response.status_code)
+        log("Response:", response.text)
         raise Exception(response.text)
 
+    # enhanced refreshes point to the new refresh in Location, the others return its id in RequestId
+    location = response.headers.get('Location')
+    request_id = location.rstrip('/').rsplit('/', 1)[-1] if location else response.headers.get('RequestId')
+    if wait:
+        return wait_for_refresh(client, group_id, datasetId, request_id, timeout=timeout)
+    return request_id
+
 
 def delete_dataset_in_group(client, group_id, dataset_id):
     """
@@ -292,9 +618,10 @@ def delete_dataset_in_group(client, group_id, dataset_id):
     delete_url = f"{POWERBI_BASE_URL}/groups/{group_id}/datasets/{dataset_id}"
     headers = _get_headers(client)
     del headers['Content-Type']
-    response = requests.delete(delete_url, headers=headers)
+    response = _request(client, 'DELETE', delete_url, headers=headers)
+    _index_invalidate(client, group_id, 'datasets')
     if response.ok:
-        print("delete successful")
+        log("delete successful")
     else:
         raise ValueError(f"Failed to delete. result= {response.content}")
 
@@ -306,9 +633,10 @@ def delete_dashboard_in_group(client, group_id, dashboard_id):
     api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/dashboards/{dashboard_id}"
     headers = _get_headers(client)
     del headers['Content-Type']
-    response = requests.delete(api_url, headers=headers)
+    response = _request(client, 'DELETE', api_url, headers=headers)
+    _index_invalidate(client, group_id, 'dashboards')
     if response.ok:
-        print("delete successful")
+        log("delete successful")
     else:
         raise ValueError(f"Failed to delete. result= {response.content}")
 
@@ -320,43 +648,24 @@ def delete_report_in_group(client, group_id, report_id):
     delete_url = f"{POWERBI_BASE_URL}/groups/{group_id}/reports/{report_id}"
     headers = _get_headers(client)
     del headers['Content-Type']
-    response = requests.delete(delete_url, headers=headers)
+    response = _request(client, 'DELETE', delete_url, headers=headers)
+    _index_invalidate(client, group_id, 'reports')
     if response.ok:
-        print("delete successful")
+        log("delete successful")
     else:
         raise ValueError(f"Failed to delete. result= {response.content}")
 
 
-def remove_everything_in_group(client, group_id, prefix):
+def remove_everything_in_group(client, group_id, prefix, max_workers=8):
     """
-    delete all reports, datasets and dashboards in the given group that start with the given prefix
+    delete all reports, datasets and dashboards in the given group that start with the given prefix.
+    deletes run concurrently and failures don't stop the run; returns the summary from
+    bi_publishing.cleanup.bulk_delete_in_group, which also supports regex and predicate filters.
     """
-    # datasets are semantic models
-    datasets = get_datasets_in_group(client, group_id)
-    print("number of datasets found: ", len(datasets))
-    for dataset in datasets:
-        if dataset['name'].startswith(prefix):
-            print('-' * 100)
-            print(f"deleting dataset: {dataset['name']}")
-            delete_dataset_in_group(client, group_id, dataset['id'])
-
-    # dashboards are dummy reports that get created when you upload a semantic model
-    dashboards = get_dashboards_in_group(client, group_id)
-    print("number of dashboards found: ", len(dashboards))
-    for dashboard in dashboards:
-        if dashboard['name'].startswith(prefix):
-            print('-' * 100)
-            print(f"deleting dashboard: {dashboard['name']}")
-            delete_dashboard_in_group(client, group_id, dashboard['id'])
-
-    # reports are the final report UI that we use/present
-    reports = get_reports_in_group(client, group_id)
-    print("number of reports found: ", len(reports))
-    for report in reports:
-        if report['name'].startswith(prefix):
-            print('-' * 100)
-            print(f"deleting report: {report['name']}")
-            delete_report_in_group(client, group_id, report['id'])
+    from .cleanup import bulk_delete_in_group
+    summary = bulk_delete_in_group(client, group_id, prefix=prefix, max_workers=max_workers)
+    log(f"--- deleted {len(summary['deleted'])} items, {len(summary['failed'])} failed ---")
+    return summary
 
 
 def clone_report_in_group(client, source_group_id, target_group_id, report_name, report_id, target_dataset_id):
@@ -370,15 +679,16 @@ def clone_report_in_group(client, source_group_id, target_group_id, report_name,
         "targetWorkspaceId": target_group_id,
         "targetModelId": target_dataset_id
     }
-    export_response = requests.post(clone_url, headers=export_headers, data=json.dumps(data))
+    export_response = _request(client, 'POST', clone_url, headers=export_headers, data=json.dumps(data))
+    _index_invalidate(client, target_group_id, 'reports')
     if export_response.ok:
         return export_response.json()
     raise Exception("Clone report failed: ", export_response.content)
 
 
-def update_dataset_params(client, db_name, dw_conn, group_id, dataset_id):
+def _dataset_params_details(db_name, dw_conn):
     """
-    update the dataset parameters in the given group
+    helper function that builds the UpdateParameters body for the given data warehouse connection
     """
     db_type = "INVALID"
     if dw_conn['type'] == 'postgres':
@@ -410,59 +720,78 @@ def update_dataset_params(client, db_name, dw_conn, group_id, dataset_id):
         details['updateDetails'].append({"name": 'file_server_data_lake', "newValue": file_server_data_lake})
         details['updateDetails'].append({"name": 'file_folder_data_lake', "newValue": file_folder_data_lake})
 
+    return details
+
+
+def update_dataset_params(client, db_name, dw_conn, group_id, dataset_id):
+    """
+    update the dataset parameters in the given group
+    """
+    details = _dataset_params_details(db_name, dw_conn)
     update_params_url = f"{POWERBI_BASE_URL}/groups/{group_id}/datasets/{dataset_id}/Default.UpdateParameters"
-    res = requests.post(update_params_url, headers=_get_headers(client), data=json.dumps(details))
+    res = _request(client, 'POST', update_params_url, headers=_get_headers(client), data=json.dumps(details))
     if res.ok:
-        print("--- params updated ---")
+        log("--- params updated ---")
     else:
         raise Exception("Failed to update params: ", res.content)
 
 
-def update_dataset_credentials(client, dw_conn, group_id, dataset_id):
+def get_dataset_parameters(client, group_id, dataset_id):
+    """
+    returns the parameters of the given dataset as {name: current value}
+    """
+    api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/datasets/{dataset_id}/parameters"
+    response = _request(client, 'GET', api_url, headers=_get_headers(client))
+    if response.ok:
+        return {param['name']: param.get('currentValue') for param in response.json()['value']}
+    raise Exception(f"--- failed to get parameters: {response.content} ---")
+
+
+def _credentials_update(datasource, dw_conn):
+    """
+    helper function that builds the credentials PATCH body for the given datasource
     """
-    update the dataset credentials in the given group
-    """
-    url = f"{POWERBI_BASE_URL}/groups/{group_id}/datasets/{dataset_id}/datasources"
-    print('--- getting datasources for: ', url)
-    res = requests.get(url, headers=_get_headers(client))
-    datasources = res.json()['value']
-
-    for datasource in datasources:
-        if datasource['datasourceType'] in ['PostgreSql', 'Sql']:
-            username = dw_conn['username']
-            password = dw_conn['password']
-
-            credentials_update = {
-                "credentialDetails": {
-                    "credentialType": 'Basic',
-                    "credentials": json.dumps({"credentialData": [{"name": "username", "value": username}, {"name": "password", "value": password}]}),
-                    "encryptedConnection": 'Encrypted',
-                    "encryptionAlgorithm": "None",
-                    "privacyLevel": "Organizational",
-                    "useEndUserOAuth2Credentials": "False"
-                }
+    if datasource['datasourceType'] in ['PostgreSql', 'Sql']:
+        username = dw_conn['username']
+        password = dw_conn['password']
+
+        credentials_update = {
+            "credentialDetails": {
+                "credentialType": 'Basic',
+                "credentials": json.dumps({"credentialData": [{"name": "username", "value": username}, {"name": "password", "value": password}]}),
+                "encryptedConnection": 'Encrypted',
+                "encryptionAlgorithm": "None",
+                "privacyLevel": "Organizational",
+                "useEndUserOAuth2Credentials": "False"
             }
-        elif datasource['datasourceType'] == 'AzureDataLakeStorage':
-            sas_token = dw_conn['AZURE_STORAGE_SAS_TOKEN']
-            credentials_update = {
-                "credentialDetails": {
-                    "credentialType": 'SAS',
-                    "credentials": json.dumps({"credentialData": [{"name": "token", "value": sas_token}]}),
-                    "encryptedConnection": 'Encrypted',
-                    "encryptionAlgorithm": "None",
-                    "privacyLevel": "Organizational",
-                    "useEndUserOAuth2Credentials": "False"
-                }
+        }
+    elif datasource['datasourceType'] == 'AzureDataLakeStorage':
+        sas_token = dw_conn['AZURE_STORAGE_SAS_TOKEN']
+        credentials_update = {
+            "credentialDetails": {
+                "credentialType": 'SAS',
+                "credentials": json.dumps({"credentialData": [{"name": "token", "value": sas_token}]}),
+                "encryptedConnection": 'Encrypted',
+                "encryptionAlgorithm": "None",
+                "privacyLevel": "Organizational",
+                "useEndUserOAuth2Credentials": "False"
             }
-        else:
-            raise Exception("======= UNKOWN DATASOURCE FOUND =========", datasource)
+        }
+    else:
+        raise Exception("======= UNKOWN DATASOURCE FOUND =========", datasource)
+    return credentials_update
 
-        url = f"{POWERBI_BASE_URL}/gateways/{datasource['gatewayId']}/datasources/{datasource['datasourceId']}"
-        res = requests.patch(url, headers=_get_headers(client), data=json.dumps(credentials_update))
-        if res.ok:
-            print("--- credentials updated successfully ---")
-        else:
-            raise Exception("Failed to update credentials: ", res.content)
+
+def update_dataset_credentials(client, dw_conn, group_id, dataset_id):
+    """
+    update the dataset credentials in the given group.
+    use update_credentials to update many datasets at once, each shared datasource is then patched only once.
+    """
+    from .credentials import update_credentials
+    result = update_credentials(client, dw_conn, [(group_id, dataset_id)])
+    if result['failed']:
+        raise Exception("Failed to update credentials: ", [item['error'] for item in result['failed']])
+    log("--- credentials updated successfully ---")
 
 
 def get_users_in_group(client, group_id):
@@ -471,7 +800,7 @@ def get_users_in_group(client, group_id):
     """
     api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/users"
     headers = _get_headers(client)
-    response = requests.get(api_url, headers=headers)
+    response = _request(client, 'GET', api_url, headers=headers)
     if response.ok:
         return response.json()['value']
     else:
@@ -489,9 +818,9 @@ def add_user_to_group(client, group_id, email_id, user_type):
         "groupUserAccessRight": user_type  # "Admin"
     }
 
-    response = requests.post(api_url, headers=headers, data=json.dumps(data))
+    response = _request(client, 'POST', api_url, headers=headers, data=json.dumps(data))
     if response.ok:
-        print(f'--- {email_id} added to group {group_id} as {user_type}')
+        log(f'--- {email_id} added to group {group_id} as {user_type}')
     else:
         raise Exception(f"--- failed to add user {email_id} {response.content} ---")
 
@@ -505,22 +834,62 @@ def add_usergroup_to_group(client, usergroup_id, usergroup_type, target_group_id
 
     headers = _get_headers(client)
     API_URL = f'https://api.powerbi.com/v1.0/myorg/groups/{target_group_id}/users'
-    response = requests.post(API_URL, headers=headers, json=payload)
+    response = _request(client, 'POST', API_URL, headers=headers, json=payload)
     if response.ok:
-        print(f'--- {usergroup_id} added to group {target_group_id} as {usergroup_type}')
+        log(f'--- {usergroup_id} added to group {target_group_id} as {usergroup_type}')
     else:
         raise Exception(f"--- failed to add user {usergroup_id} {response.content} ---")
 
 
-def get_client(pbi_workspace_conn, scope_overrides=None):
+def update_user_in_group(client, group_id, identifier, access_right, principal_type='User'):
     """
-    returns a client object that can be used to interact with the PowerBI service
+    change the access right of the given user (email) or security group (object id) in the given group
     """
-    config = _get_config(pbi_workspace_conn, scope_overrides)
-    token = get_auth_token(config)
-    client = {
-        'auth_token': token,
+    api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/users"
+    data = {
+        "identifier": identifier,
+        "groupUserAccessRight": access_right,
+        "principalType": principal_type
     }
+    if principal_type == 'User':
+        data["emailAddress"] = identifier
+    response = _request(client, 'PUT', api_url, headers=_get_headers(client), data=json.dumps(data))
+    if response.ok:
+        log(f'--- {identifier} in group {group_id} set to {access_right}')
+    else:
+        raise Exception(f"--- failed to update user {identifier} {response.content} ---")
+
+
+def delete_user_from_group(client, group_id, identifier):
+    """
+    remove the given user (email) or security group / service principal (object id) from the given group
+    """
+    api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/users/{quote(identifier, safe='')}"
+    response = _request(client, 'DELETE', api_url, headers=_get_headers(client))
+    if response.ok:
+        log(f'--- {identifier} removed from group {group_id}')
+    else:
+        raise Exception(f"--- failed to remove user {identifier} {response.content} ---")
+
+
+def get_client(pbi_workspace_conn, scope_overrides=None, pool_connections=DEFAULT_POOL_CONNECTIONS,
+               pool_maxsize=DEFAULT_POOL_MAXSIZE, session=None, index_ttl=DEFAULT_INDEX_TTL,
+               rate_limiter=None, retry_policy=DEFAULT_RETRY_POLICY, token_cache_path=None, token_cache=None,
+               background_refresh=False):
+    """
+    returns a client object that can be used to interact with the PowerBI service.
+    all calls made with the client reuse the same pooled connections.
+    the token is refreshed before it expires; with token_cache_path it is also shared with other processes.
+    """
+    from .auth import get_token_provider
+    config = _get_config(pbi_workspace_conn, scope_overrides)
+    provider = get_token_provider(config, cache_path=token_cache_path, cache=token_cache)
+    token = provider.token()
+    if background_refresh:
+        provider.start_background_refresh()
+    client = PowerBIClient(token, pool_connections=pool_connections, pool_maxsize=pool_maxsize, session=session,
+                           index_ttl=index_ttl, rate_limiter=rate_limiter, retry_policy=retry_policy,
+                           token_provider=provider)
     return client
 
 
@@ -542,28 +911,37 @@ def _get_config(pbi_workspace_conn, scope_overrides=None):
     return config
 
 
-def download_file_from_integration_hub(tag, filename, local_file_name):
-    print(f"--- downloading: {filename}")
+def download_file_from_integration_hub(tag, filename, local_file_name, cache=None, client=None):
+    """
+    download the given file of the given integration hub tag to local_file_name, streaming it to disk.
+    with an ArtifactCache the file is only downloaded once per tag and then copied from the cache.
+    with a client the download goes through its session, rate limiter, retry policy and hooks.
+    """
+    from .artifacts import integration_hub_url, stream_to_file
+    log(f"--- downloading: {filename}")
+    if cache is not None:
+        cache.copy_to(tag, filename, local_file_name)
+        return
 
-    encoded_file = urllib.parse.quote(filename)
-    url = f"https://github.com/cienai/IntegrationHub/raw/{tag}/powerbi/"
-    url = url + encoded_file
-    print("--- Downloading from: ", url)
-    r = requests.get(url, allow_redirects=True)
-    open(local_file_name, 'wb').write(r.content)
+    url = integration_hub_url(tag, filename)
+    log("--- Downloading from: ", url)
+    stream_to_file(url, local_file_name, client)
 
 
 def get_capcities(client):
-    api_url = f"{POWERBI_BASE_URL}/capacities"
-    response = requests.get(api_url, headers=_get_headers(client))
-    if response.status_code == 200:
-        capacities = response.json()
-        return capacities['value']
-    else:
-        raise Exception(response.content)
+    """
+    returns a list of capacities available to the client.
+    the capacities endpoint doesn't take $filter or $top, so every page is read and continuation links followed.
+    """
+    capacities = list(_iter_pages(client, f"{POWERBI_BASE_URL}/capacities"))
+    _index_store(client, None, 'capacities', capacities)
+    return capacities
 
 
 def get_capacity_by_name(client, capacity_name):
+    capacity = _index_lookup(client, None, 'capacities', capacity_name)
+    if capacity is not None:
+        return capacity
     capacities = get_capcities(client)
     for capacity in capacities:
         if capacity['displayName'] == capacity_name:
@@ -576,40 +954,17 @@ def add_group_to_capacity(client, group_id, capacity_id):
     Add the given group/workspace to the given capacity
     """
     api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/AssignToCapacity"
-    print(f"--- adding group: {group_id} to capacity: {capacity_id} ---")
-    print(f"--- add url: {api_url} ---")
+    log(f"--- adding group: {group_id} to capacity: {capacity_id} ---")
+    log(f"--- add url: {api_url} ---")
     body = {'capacityId': capacity_id}
-    response = requests.post(api_url, headers=_get_headers(client), data=json.dumps(body))
+    response = _request(client, 'POST', api_url, headers=_get_headers(client), data=json.dumps(body))
+    _index_invalidate(client, None, 'groups')
     if response.ok:
-        print("--- add successful ---")
+        log("--- add successful ---")
     else:
         raise Exception(f"--- add failed: {response.content} ---")
 
 
-def disconnect_pbix(pbix_path):
-    """
-    Remove the Connections file from the given PBIX file
-    """
-    # files_to_remove = ['SecurityBindings', 'Connections']
-    files_to_remove = ['Connections']
-    # files_to_remove = ['SecurityBindings']
-    # Create a temporary zip file
-    temp_zip_path = pbix_path + '.temp'
-
-    with zipfile.ZipFile(pbix_path, 'r') as zip_read:
-        with zipfile.ZipFile(temp_zip_path, 'w') as zip_write:
-            # Iterate over items in the original zip file
-            for item in zip_read.infolist():
-                if item.filename not in files_to_remove:
-                    # Copy file to the new zip archive if it's not in the removal list
-                    zip_write.writestr(item, zip_read.read(item.filename))
-
-    # Replace the original zip file with the new one
-    os.remove(pbix_path)
-    os.rename(temp_zip_path, pbix_path)
-
-
-
 def delete_group(client, group_id):
     """
     delete the group/workspace with the given group_id
@@ -617,44 +972,61 @@ def delete_group(client, group_id):
     delete_url = f"{POWERBI_BASE_URL}/groups/{group_id}"
     headers = _get_headers(client)
     del headers['Content-Type']
-    response = requests.delete(delete_url, headers=headers)
+    response = _request(client, 'DELETE', delete_url, headers=headers)
+    _index_invalidate(client, None, 'groups')
+    _index_invalidate(client, group_id)
     if response.ok:
-        print("--- delete group successful ---")
+        log("--- delete group successful ---")
     else:
         raise Exception(f"--- delete group failed: {response.content} ---")
 
 
-def connect_pbix(pbix_path, group_id, dataset_id):
-    """
-    Connect the given PBIX file to the given group and dataset
-    Warning: this uses undocumented code and may break in the future
-    """
-    connection_string = f"Data Source=pbiazure://api.powerbi.com;Initial Catalog={group_id};Identity Provider=\"https://login.microsoftonline.com/common, https://analysis.windows.net/powerbi/api, 7f67af8a-fedc-4b08-8b4e-37c4d127b6cf\";Integrated Security=ClaimsToken"
-    content = {
-        "Version": 3,
-        "Connections": [
-            {
-                "Name": "EntityDataSource",
-                "ConnectionString": connection_string,
-                "ConnectionType": "pbiServiceLive",
-                "PbiServiceModelId": 617430,
-                "PbiModelVirtualServerName": "sobe_wowvirtualserver",
-                "PbiModelDatabaseName": dataset_id
-            }
-        ]
-    }
-    content = json.dumps(content)
-    temp_zip_path = pbix_path + '.temp'
-
-    # Create a temporary ZIP file
-    with zipfile.ZipFile(temp_zip_path, 'w') as zip_write:
-        # Read from the original ZIP file
-        with zipfile.ZipFile(pbix_path, 'r') as zip_read:
-            # Copy existing files to the temporary ZIP file
-            for item in zip_read.infolist():
-                zip_write.writestr(item, zip_read.read(item.filename))
-            # Write the new Connections file
-            zip_write.writestr('Connections', content)
-
-    # Replace the original ZIP file with the new one
-    os.replace(temp_zip_path, pbix_path)
+# names provided by submodules, imported on first access (see __getattr__) so that the command line and
+# PBIX-only jobs start without loading msal, requests and the publishing machinery they don't use
+_LAZY_NAMES = {
+    'TokenProvider': 'auth',
+    'get_token_provider': 'auth',
+    'PbixTemplate': 'pbix',
+    'connect_pbix': 'pbix',
+    'disconnect_pbix': 'pbix',
+    'bulk_delete_in_group': 'cleanup',
+    'ArtifactCache': 'artifacts',
+    'integration_hub_url': 'artifacts',
+    'stream_to_file': 'artifacts',
+    'publish_workspace': 'pipeline',
+    'run_dag': 'pipeline',
+    'PublishState': 'incremental',
+    'WorkspaceSpec': 'spec',
+    'refresh_datasets': 'refresh',
+    'refresh_payload': 'refresh',
+    'wait_for_refresh': 'refresh',
+    'sync_group_membership': 'membership',
+    'sync_groups_membership': 'membership',
+    'update_credentials': 'credentials',
+    'post_import': 'uploads',
+    'place_groups': 'placement',
+    'PublishJournal': 'journal',
+    'InventorySnapshot': 'inventory',
+    'refresh_inventory': 'inventory',
+    'PageCache': 'pages',
+    'get_page_urls_for_group': 'pages',
+    'get_page_urls_for_groups': 'pages',
+}
+_SUBMODULES = frozenset(['aio', 'artifacts', 'auth', 'cleanup', 'cli', 'credentials', 'incremental', 'inventory',
+                         'journal', 'membership', 'mockserver', 'pages', 'pbix', 'pipeline', 'placement', 'refresh',
+                         'spec', 'uploads'])
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    module = _LAZY_NAMES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES) | _SUBMODULES)
@@ -0,0 +1,692 @@
+"""
+asyncio counterparts of the bi_publishing api, built on httpx.
+
+install with the `async` extra:
+
+    pip install "bi_publishing[async] @ git+https://github.com/cienai/cien-bi-publishing.git@main"
+
+every function takes an AsyncPowerBIClient (see `get_client`) instead of the sync client and
+has the same arguments as its sync counterpart, except that download_file_from_integration_hub
+takes the client as its first argument like every other coroutine. `run_bounded` drives many
+workspaces at once with a cap on how many are in flight.
+"""
+import asyncio
+import json
+import time
+import urllib.parse
+
+import httpx
+
+from . import (
+    DEFAULT_PAGE_SIZE,
+    POWERBI_BASE_URL,
+    ImportNotFound,
+    _backoff_intervals,
+    _dataset_params_details,
+    _get_config,
+    _get_headers,
+    _odata_quote,
+    get_token_provider,
+)
+from .artifacts import CHUNK_SIZE, integration_hub_url
+from .cleanup import item_name
+from .credentials import DEFAULT_MAX_WORKERS, _datasource_summary, _Payloads, dedupe_datasources
+from .instrument import log, track_request
+from .refresh import refresh_payload
+from .throttle import DEFAULT_RETRY_POLICY
+from .uploads import (
+    BLOB_API_VERSION,
+    DEFAULT_BLOCK_SIZE,
+    DEFAULT_BLOCK_WORKERS,
+    INLINE_IMPORT_LIMIT,
+    MultipartStream,
+    UploadInterrupted,
+    _block_id,
+    _stream_size,
+)
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+# bytes read from a pbix per step of an inline upload
+DEFAULT_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class AsyncPowerBIClient(dict):
+    """
+    async client used to interact with the PowerBI service.
+    it holds the auth token and an httpx.AsyncClient that every api call goes through.
+    http2 requires the `h2` package (`pip install httpx[http2]`).
+    `rate_limiter`, `retry_policy` and `token_provider` work as on the sync client and can be shared with it.
+    """
+
+    def __init__(self, auth_token, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS, http2=False, http_client=None,
+                 rate_limiter=None, retry_policy=DEFAULT_RETRY_POLICY, token_provider=None):
+        super().__init__(auth_token=auth_token)
+        self.token_provider = token_provider
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        if http_client is None:
+            limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+            http_client = httpx.AsyncClient(limits=limits, http2=http2, timeout=httpx.Timeout(60.0, connect=10.0))
+        self.http = http_client
+
+    def __getitem__(self, key):
+        if key == 'auth_token' and self.token_provider is not None:
+            return self.token_provider.token()
+        return super().__getitem__(key)
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+async def get_client(pbi_workspace_conn, scope_overrides=None, token_cache_path=None, **kwargs):
+    """
+    returns an async client object that can be used to interact with the PowerBI service.
+    the token is refreshed from a background thread so requests never block on Azure AD.
+    """
+    config = _get_config(pbi_workspace_conn, scope_overrides)
+    provider = get_token_provider(config, cache_path=token_cache_path)
+    token = await asyncio.to_thread(provider.token)
+    provider.start_background_refresh()
+    return AsyncPowerBIClient(token, token_provider=provider, **kwargs)
+
+
+async def _request(client, method, url, **kwargs):
+    """
+    send a request through the client's httpx connection pool,
+    applying the client's rate limiter and retry policy like the sync client
+    """
+    event = track_request(method, url, kwargs.get('content', kwargs.get('json')))
+    attempt = 0
+    while True:
+        if client.rate_limiter is not None and url.startswith(POWERBI_BASE_URL):
+            await client.rate_limiter.acquire_async(method, url)
+        try:
+            response = await client.http.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            if not client.retry_policy.should_retry(method, attempt, error=e):
+                if event is not None:
+                    event.finish(error=e)
+                raise
+            delay = client.retry_policy.delay(attempt)
+            reason = type(e).__name__
+        else:
+            if response.status_code < 400 or not client.retry_policy.should_retry(method, attempt, response.status_code):
+                if event is not None:
+                    event.finish(response)
+                return response
+            delay = client.retry_policy.delay(attempt, response.headers)
+            reason = response.status_code
+        log(f"==== {method} {url} failed ({reason}), retrying in {delay:.1f}s ====")
+        await asyncio.sleep(delay)
+        attempt += 1
+        if event is not None:
+            event.retries = attempt
+
+
+async def run_bounded(func, items, concurrency=10, return_exceptions=True):
+    """
+    await func(item) for every item with at most `concurrency` calls running at once.
+    returns the results in the same order as items; failures are returned as exceptions
+    unless return_exceptions is False.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run(item):
+        async with semaphore:
+            return await func(item)
+
+    return await asyncio.gather(*(_run(item) for item in items), return_exceptions=return_exceptions)
+
+
+async def create_group(client, group_name):
+    try:
+        _ = await get_group_by_name(client, group_name)
+        log(f"Group={group_name} already exists")
+        return
+    except Exception:
+        log(f"Group={group_name} not found, creating new group")
+        api_url = f"{POWERBI_BASE_URL}/groups"
+        body = {"name": group_name}
+        response = await _request(client, 'POST', api_url, headers=_get_headers(client), content=json.dumps(body))
+        if response.is_success:
+            log("--- created workspace ---")
+        else:
+            raise Exception(f"--- create workspace failed: {response.content} ---")
+
+
+async def _iter_pages(client, api_url, params=None, page_size=None):
+    """
+    async generator over the items of the given collection url, see bi_publishing._iter_pages
+    """
+    skip = 0
+    while True:
+        query = dict(params or {})
+        if page_size:
+            query['$top'] = page_size
+            if skip:
+                query['$skip'] = skip
+        url = api_url
+        count = 0
+        while url:
+            response = await _request(client, 'GET', url, headers=_get_headers(client), params=query)
+            if response.status_code != 200:
+                raise Exception(response.content)
+            body = response.json()
+            items = body.get('value', [])
+            count += len(items)
+            for item in items:
+                yield item
+            url, query = body.get('@odata.nextLink'), None
+        if not page_size or count < page_size:
+            return
+        skip += count
+
+
+def iter_groups(client, filter=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    async generator over the groups available to the client, fetched lazily in pages of page_size
+    """
+    params = {'$filter': filter} if filter else None
+    return _iter_pages(client, f"{POWERBI_BASE_URL}/groups", params, page_size)
+
+
+async def get_groups(client, filter=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    returns a list of groups available to the client, optionally narrowed by an OData $filter expression
+    """
+    return [group async for group in iter_groups(client, filter, page_size)]
+
+
+async def find_group(client, group_name):
+    """
+    returns the group object with the given name, or None, fetching only the matching row
+    """
+    params = {'$filter': f"name eq {_odata_quote(group_name)}", '$top': 1}
+    async for group in _iter_pages(client, f"{POWERBI_BASE_URL}/groups", params):
+        return group
+    return None
+
+
+async def get_group_by_name(client, group_name):
+    """
+    return the group object for the given group name
+    """
+    group = await find_group(client, group_name)
+    if group is None:
+        raise Exception(f"Group={group_name} not found")
+    return group
+
+
+async def set_group_to_large_semantic_model(client, group_id):
+    url = f"{POWERBI_BASE_URL}/groups/{group_id}"
+    body = {"defaultDatasetStorageFormat": "Large"}
+    res = await _request(client, 'PATCH', url, headers=_get_headers(client), content=json.dumps(body))
+    if res.is_success:
+        log("--- workspace set to use large semantic models successfully ---")
+    else:
+        raise Exception("Failed to update workspace to large models: ", res.content)
+
+
+async def _get_collection(client, url, retries=0, interval=1):
+    """
+    helper function that returns the 'value' list of the given collection url with retries
+    """
+    for i in range(retries + 1):
+        response = await _request(client, 'GET', url, headers=_get_headers(client))
+        if response.status_code == 200:
+            body = response.json()
+            items = list(body.get('value', []))
+            if body.get('@odata.nextLink'):
+                items.extend([item async for item in _iter_pages(client, body['@odata.nextLink'])])
+            return items
+        log(f"==== request failed sleeping {interval}s ====")
+        await asyncio.sleep(interval)
+
+    raise ValueError(response.content)
+
+
+async def get_datasets_in_group(client, group_id, retries=0, interval=1):
+    """
+    returns a list of datasets in the given group
+    """
+    return await _get_collection(client, f"{POWERBI_BASE_URL}/groups/{group_id}/datasets", retries, interval)
+
+
+async def get_dataset_by_name(client, group_id, dataset_name, retries=0, interval=1):
+    """
+    returns the dataset object for the given dataset name in the given group
+    """
+    for i in range(retries + 1):
+        for ds in await get_datasets_in_group(client, group_id):
+            if ds['name'] == dataset_name:
+                return ds
+        log(f"==== dataset not found. sleeping {interval}s ====")
+        await asyncio.sleep(interval)
+    raise ValueError(f"dataset '{dataset_name}' not found in group {group_id}")
+
+
+async def get_reports_in_group(client, group_id, retries=0, interval=1):
+    """
+    returns a list of reports in the given group
+    """
+    return await _get_collection(client, f"{POWERBI_BASE_URL}/groups/{group_id}/reports", retries, interval)
+
+
+async def get_report_by_name(client, group_id, report_name, retries=0, interval=1):
+    """
+    returns the report object for the given report name in the given group
+    """
+    for i in range(retries + 1):
+        for report in await get_reports_in_group(client, group_id):
+            if report['name'] == report_name:
+                return report
+        log(f"==== report not found. sleeping {interval}s ====")
+        await asyncio.sleep(interval)
+    raise ValueError(f"'{report_name}' not found in '{group_id}'")
+
+
+async def get_dashboards_in_group(client, group_id):
+    """
+    returns a list of dashboards in the given group
+    """
+    return await _get_collection(client, f"{POWERBI_BASE_URL}/groups/{group_id}/dashboards")
+
+
+class AsyncMultipartStream:
+    """
+    async iterable multipart/form-data body over a MultipartStream. the file is read in chunks on a worker
+    thread so a large pbix doesn't block the event loop, and iterating again starts over, so retries can resend it.
+    """
+
+    def __init__(self, f, file_name, progress=None, chunk_size=DEFAULT_UPLOAD_CHUNK_SIZE):
+        self.body = MultipartStream(f, file_name, progress=progress)
+        self.chunk_size = chunk_size
+
+    @property
+    def content_type(self):
+        return self.body.content_type
+
+    def __len__(self):
+        return len(self.body)
+
+    async def __aiter__(self):
+        self.body.seek(0)
+        while True:
+            chunk = await asyncio.to_thread(self.body.read, self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def _create_temporary_upload_location(client, group_id):
+    api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/imports/createTemporaryUploadLocation"
+    response = await _request(client, 'POST', api_url, headers=_get_headers(client), content=json.dumps({}))
+    if response.is_success:
+        return response.json()
+    raise Exception(f"--- failed to create temporary upload location: {response.content} ---")
+
+
+async def _upload_to_temporary_location(client, group_id, f, block_size=DEFAULT_BLOCK_SIZE,
+                                        concurrency=DEFAULT_BLOCK_WORKERS):
+    """
+    push the given seekable file object to a temporary upload location in blocks, at most `concurrency` at once,
+    and commit them. returns the blob url to import from, see bi_publishing.uploads.upload_to_temporary_location
+    """
+    upload_url = (await _create_temporary_upload_location(client, group_id))['url']
+    size = _stream_size(f)
+    block_ids = [_block_id(i) for i in range(max(1, -(-size // block_size)))]
+    read_lock = asyncio.Lock()
+
+    def _read(index):
+        f.seek(index * block_size)
+        return f.read(min(block_size, size - index * block_size))
+
+    async def _put_block(index):
+        async with read_lock:
+            data = await asyncio.to_thread(_read, index)
+        block_url = f"{upload_url}&comp=block&blockid={urllib.parse.quote(block_ids[index], safe='')}"
+        response = await _request(client, 'PUT', block_url, content=data, headers={'x-ms-version': BLOB_API_VERSION})
+        if not response.is_success:
+            raise Exception(f"block {index} failed: {response.status_code} {response.content}")
+
+    try:
+        await run_bounded(_put_block, range(len(block_ids)), concurrency=concurrency, return_exceptions=False)
+    except Exception as e:  # noqa
+        raise UploadInterrupted(f"--- large file upload interrupted: {e} ---", upload_url) from e
+
+    block_list = ''.join(f"<Latest>{block_id}</Latest>" for block_id in block_ids)
+    body = f'<?xml version="1.0" encoding="utf-8"?><BlockList>{block_list}</BlockList>'
+    response = await _request(client, 'PUT', f"{upload_url}&comp=blocklist", content=body.encode(),
+                              headers={'x-ms-version': BLOB_API_VERSION, 'Content-Type': 'application/xml'})
+    if not response.is_success:
+        raise UploadInterrupted(f"--- committing blocks failed: {response.content} ---", upload_url)
+    return upload_url
+
+
+async def _upload_pbix(client, group_id, import_url, file_name, local_pbix_file_path,
+                       large_file_threshold=INLINE_IMPORT_LIMIT, block_size=DEFAULT_BLOCK_SIZE,
+                       concurrency=DEFAULT_BLOCK_WORKERS):
+    """
+    helper function that posts the given pbix file to the given imports url without blocking the event loop.
+    files up to large_file_threshold are streamed inline, larger ones go through a temporary upload location.
+    """
+    with open(local_pbix_file_path, 'rb') as f:
+        if _stream_size(f) > large_file_threshold:
+            blob_url = await _upload_to_temporary_location(client, group_id, f, block_size, concurrency)
+            return await _request(client, 'POST', import_url, headers=_get_headers(client),
+                                  content=json.dumps({'fileUrl': blob_url}))
+        body = AsyncMultipartStream(f, file_name)
+        headers = {
+            "Authorization": f"Bearer {client['auth_token']}",
+            "Content-Type": body.content_type,
+            "Content-Length": str(len(body)),
+        }
+        return await _request(client, 'POST', import_url, headers=headers, content=body)
+
+
+async def upload_report_group(client, group, remote_report_name, local_pbix_file_path, **upload_options):
+    """
+    upload the given local pbix report file into the workspace(group).
+    upload_options (large_file_threshold, block_size, concurrency) go to the upload, see _upload_pbix
+    """
+    import_url = f"{POWERBI_BASE_URL}/groups/{group['id']}/imports?datasetDisplayName={remote_report_name}&nameConflict=Abort"
+    file_name = "GTM Suite - Automatic Data Enhancement Report.pbix"
+    response = await _upload_pbix(client, group['id'], import_url, file_name, local_pbix_file_path, **upload_options)
+    if response.is_success:
+        log("--- upload report complete ---")
+        return response.json()
+    else:
+        raise Exception(f"Upload failed: {response.content}")
+
+
+async def upload_datasest_to_group(client, group_id, remote_dataset_name, local_pbix_file_path, **upload_options):
+    """
+    upload the given local pbix dataset file into the powerbi service account workspace(group_id),
+    see upload_report_group for upload_options
+    """
+    import_url = f"{POWERBI_BASE_URL}/groups/{group_id}/imports?datasetDisplayName={remote_dataset_name}&skipReport=true"
+    file_name = local_pbix_file_path.split("/")[-1] if '/' in local_pbix_file_path else local_pbix_file_path
+    response = await _upload_pbix(client, group_id, import_url, file_name, local_pbix_file_path, **upload_options)
+    if response.is_success:
+        return response.json()
+    else:
+        raise Exception("upload failed: ", response.content)
+
+
+async def get_import_in_group(client, group_id, import_id):
+    """
+    returns the import object for the given import id in the given group
+    """
+    api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/imports/{import_id}"
+    response = await _request(client, 'GET', api_url, headers=_get_headers(client))
+    if response.is_success:
+        return response.json()
+    if response.status_code == 404:
+        raise ImportNotFound(f"--- import {import_id} not found: {response.content} ---")
+    raise Exception(f"--- failed to get import {import_id}: {response.content} ---")
+
+
+async def wait_for_import(client, group_id, import_id, timeout=600, initial_interval=0.5, max_interval=10,
+                          max_not_found=5):
+    """
+    poll the given import until it succeeds and return the import object, see bi_publishing.wait_for_import
+    """
+    deadline = time.monotonic() + timeout
+    not_found = 0
+    for interval in _backoff_intervals(initial_interval, max_interval):
+        try:
+            imp = await get_import_in_group(client, group_id, import_id)
+            not_found = 0
+        except ImportNotFound:
+            not_found += 1
+            if not_found > max_not_found:
+                raise
+            imp = {'importState': 'NotFound'}
+
+        state = imp.get('importState')
+        if state == 'Succeeded':
+            return imp
+        if state == 'Failed':
+            raise Exception(f"--- import {import_id} failed: {imp} ---")
+        if time.monotonic() + interval > deadline:
+            raise TimeoutError(f"import {import_id} did not finish in {timeout}s, last state: {state}")
+        await asyncio.sleep(interval)
+
+
+async def rebind_report_to_dataset_in_group(client, report_id, group_id, dataset_id):
+    """
+    rebind the given report to the given dataset in the given group
+    """
+    api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/reports/{report_id}/Rebind"
+    log(f"--- rebind report: {report_id} to dataset: {dataset_id} ---")
+    body = {'datasetId': dataset_id}
+    response = await _request(client, 'POST', api_url, headers=_get_headers(client), content=json.dumps(body))
+    if response.is_success:
+        log("--- rebind successful ---")
+    else:
+        raise Exception(f"--- rebind failed: {response.content} ---")
+
+
+async def refresh_dataset_in_group(client, group_id, datasetId, **options):
+    """
+    refresh the dataset in the given group and return the refresh request id, see the sync version for options
+    """
+    api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/datasets/{datasetId}/refreshes"
+    payload = refresh_payload(**options)
+    response = await _request(client, 'POST', api_url, headers=_get_headers(client), content=json.dumps(payload))
+    if response.status_code == 202:
+        log("--- Dataset refresh request accepted. ---")
+    else:
+        log("Failed to refresh dataset. Status code:", response.status_code)
+        raise Exception(response.text)
+    location = response.headers.get('Location')
+    return location.rstrip('/').rsplit('/', 1)[-1] if location else response.headers.get('RequestId')
+
+
+async def _delete(client, url):
+    """
+    helper function that deletes the object at the given url
+    """
+    headers = _get_headers(client)
+    del headers['Content-Type']
+    response = await _request(client, 'DELETE', url, headers=headers)
+    if response.is_success:
+        log("delete successful")
+    else:
+        raise ValueError(f"Failed to delete. result= {response.content}")
+
+
+async def delete_dataset_in_group(client, group_id, dataset_id):
+    """
+    delete the dataset in the given group
+    """
+    await _delete(client, f"{POWERBI_BASE_URL}/groups/{group_id}/datasets/{dataset_id}")
+
+
+async def delete_dashboard_in_group(client, group_id, dashboard_id):
+    """
+    delete the dashboard in the given group
+    """
+    await _delete(client, f"{POWERBI_BASE_URL}/groups/{group_id}/dashboards/{dashboard_id}")
+
+
+async def delete_report_in_group(client, group_id, report_id):
+    """
+    delete the report in the given group
+    """
+    await _delete(client, f"{POWERBI_BASE_URL}/groups/{group_id}/reports/{report_id}")
+
+
+async def remove_everything_in_group(client, group_id, prefix):
+    """
+    delete all reports, datasets and dashboards in the given group that start with the given prefix
+    """
+    datasets, dashboards, reports = await asyncio.gather(
+        get_datasets_in_group(client, group_id),
+        get_dashboards_in_group(client, group_id),
+        get_reports_in_group(client, group_id),
+    )
+    # same order as the sync version: dependents first, then the datasets they use
+    for items, delete in ((reports, delete_report_in_group),
+                          (dashboards, delete_dashboard_in_group),
+                          (datasets, delete_dataset_in_group)):
+        await asyncio.gather(*(delete(client, group_id, item['id']) for item in items
+                               if (item_name(item) or '').startswith(prefix)))
+
+
+async def update_dataset_params(client, db_name, dw_conn, group_id, dataset_id):
+    """
+    update the dataset parameters in the given group
+    """
+    details = _dataset_params_details(db_name, dw_conn)
+    update_params_url = f"{POWERBI_BASE_URL}/groups/{group_id}/datasets/{dataset_id}/Default.UpdateParameters"
+    res = await _request(client, 'POST', update_params_url, headers=_get_headers(client), content=json.dumps(details))
+    if res.is_success:
+        log("--- params updated ---")
+    else:
+        raise Exception("Failed to update params: ", res.content)
+
+
+async def update_credentials(client, dw_conn, targets, concurrency=DEFAULT_MAX_WORKERS):
+    """
+    update the credentials of every datasource used by the (group_id, dataset_id) pairs in targets with dw_conn.
+    each unique gateway datasource is patched once, see bi_publishing.credentials.update_credentials for the result.
+    """
+    targets = list(dict.fromkeys(targets))
+
+    async def _list(target):
+        group_id, dataset_id = target
+        return await _get_collection(client, f"{POWERBI_BASE_URL}/groups/{group_id}/datasets/{dataset_id}/datasources")
+
+    listings = []
+    result = {'updated': [], 'failed': [], 'skipped': []}
+    for (group_id, dataset_id), datasources in zip(targets, await run_bounded(_list, targets, concurrency)):
+        if isinstance(datasources, Exception):
+            log(f"--- listing datasources of dataset {dataset_id} failed: {datasources} ---")
+            result['failed'].append({'group_id': group_id, 'dataset_id': dataset_id, 'error': str(datasources)})
+        else:
+            listings.append(((group_id, dataset_id), datasources))
+    payloads = _Payloads(dw_conn)
+
+    async def _patch(item):
+        (gateway_id, datasource_id), entry = item
+        summary = _datasource_summary((gateway_id, datasource_id), entry)
+        if gateway_id is None or datasource_id is None:
+            return 'skipped', summary
+        url = f"{POWERBI_BASE_URL}/gateways/{gateway_id}/datasources/{datasource_id}"
+        try:
+            res = await _request(client, 'PATCH', url, headers=_get_headers(client),
+                                 content=payloads.get(entry['datasource']))
+            if not res.is_success:
+                raise Exception(f"--- failed to update credentials of datasource {datasource_id}: {res.content} ---")
+        except Exception as e:  # noqa
+            log(f"--- credentials of datasource {datasource_id} not updated: {e} ---")
+            return 'failed', dict(summary, error=str(e))
+        return 'updated', summary
+
+    unique = dedupe_datasources(listings)
+    for outcome, summary in await run_bounded(_patch, list(unique.items()), concurrency, return_exceptions=False):
+        result[outcome].append(summary)
+    log(f"--- credentials updated for {len(result['updated'])} datasource(s) of {len(targets)} dataset(s) ---")
+    return result
+
+
+async def update_dataset_credentials(client, dw_conn, group_id, dataset_id):
+    """
+    update the dataset credentials in the given group.
+    use update_credentials to update many datasets at once, each shared datasource is then patched only once.
+    """
+    result = await update_credentials(client, dw_conn, [(group_id, dataset_id)])
+    if result['failed']:
+        raise Exception("Failed to update credentials: ", [item['error'] for item in result['failed']])
+    log("--- credentials updated successfully ---")
+
+
+async def get_users_in_group(client, group_id):
+    """
+    returns a list of users in the given group
+    """
+    return await _get_collection(client, f"{POWERBI_BASE_URL}/groups/{group_id}/users")
+
+
+async def add_user_to_group(client, group_id, email_id, user_type):
+    """
+    add the given user to the given group
+    """
+    api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/users"
+    data = {"emailAddress": email_id, "groupUserAccessRight": user_type}
+    response = await _request(client, 'POST', api_url, headers=_get_headers(client), content=json.dumps(data))
+    if response.is_success:
+        log(f'--- {email_id} added to group {group_id} as {user_type}')
+    else:
+        raise Exception(f"--- failed to add user {email_id} {response.content} ---")
+
+
+async def add_usergroup_to_group(client, usergroup_id, usergroup_type, target_group_id):
+    payload = {
+        "identifier": usergroup_id,  # this has to be the id not the email of the group
+        "groupUserAccessRight": usergroup_type,
+        "principalType": "Group"
+    }
+    api_url = f"{POWERBI_BASE_URL}/groups/{target_group_id}/users"
+    response = await _request(client, 'POST', api_url, headers=_get_headers(client), content=json.dumps(payload))
+    if response.is_success:
+        log(f'--- {usergroup_id} added to group {target_group_id} as {usergroup_type}')
+    else:
+        raise Exception(f"--- failed to add user {usergroup_id} {response.content} ---")
+
+
+async def get_capcities(client):
+    return await _get_collection(client, f"{POWERBI_BASE_URL}/capacities")
+
+
+async def get_capacity_by_name(client, capacity_name):
+    for capacity in await get_capcities(client):
+        if capacity['displayName'] == capacity_name:
+            return capacity
+    raise ValueError(f"capacity: {capacity_name} not found")
+
+
+async def add_group_to_capacity(client, group_id, capacity_id):
+    """
+    Add the given group/workspace to the given capacity
+    """
+    api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/AssignToCapacity"
+    body = {'capacityId': capacity_id}
+    response = await _request(client, 'POST', api_url, headers=_get_headers(client), content=json.dumps(body))
+    if response.is_success:
+        log(f"--- added group: {group_id} to capacity: {capacity_id} ---")
+    else:
+        raise Exception(f"--- add failed: {response.content} ---")
+
+
+async def download_file_from_integration_hub(client, tag, filename, local_file_name, cache=None):
+    """
+    stream the given file from the integration hub to local_file_name.
+    unlike the sync version the client comes first, as in every other coroutine here. with an ArtifactCache
+    the file is copied from the cache, downloading it once per tag. file writes run in a worker thread
+    so the event loop keeps serving other requests.
+    """
+    log(f"--- downloading: {filename}")
+    if cache is not None:
+        await asyncio.to_thread(cache.copy_to, tag, filename, local_file_name)
+        return
+
+    url = integration_hub_url(tag, filename)
+    log("--- Downloading from: ", url)
+    async with client.http.stream('GET', url, follow_redirects=True) as r:
+        r.raise_for_status()
+        f = await asyncio.to_thread(open, local_file_name, 'wb')
+        try:
+            async for chunk in r.aiter_bytes(CHUNK_SIZE):
+                await asyncio.to_thread(f.write, chunk)
+        finally:
+            await asyncio.to_thread(f.close)
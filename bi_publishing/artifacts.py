@@ -0,0 +1,245 @@
+"""
+local cache for files downloaded from the integration hub.
+
+tags are immutable, so a (tag, filename) pair always has the same content. downloads are streamed
+to disk in chunks while being hashed, stored once per content hash under `blobs/` and referenced
+from `refs/`, and moved into place with an atomic rename so concurrent processes never see a
+partial file. the least recently used blobs are evicted once the cache grows past `max_bytes`,
+except blobs that are being returned or copied at the time.
+"""
+import concurrent.futures
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import urllib.parse
+
+from . import _request
+from .instrument import log
+
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+CHUNK_SIZE = 1024 * 1024
+INTEGRATION_HUB_URL = "https://github.com/cienai/IntegrationHub/raw/{tag}/powerbi/{filename}"
+
+
+def integration_hub_url(tag, filename):
+    return INTEGRATION_HUB_URL.format(tag=tag, filename=urllib.parse.quote(filename))
+
+
+def stream_to_file(url, local_file_name, client=None):
+    """
+    download the given url to local_file_name in chunks, returns (sha256 hex digest, size)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with _request(client, 'GET', url, allow_redirects=True, stream=True) as r:
+        if not r.ok:
+            raise Exception(f"--- download failed: {r.status_code} {url} ---")
+        with open(local_file_name, 'wb') as f:
+            for chunk in r.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    """
+    content addressed cache of integration hub files keyed by (tag, filename)
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, verify=False, client=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.verify = verify
+        self.client = client
+        self._blobs = os.path.join(cache_dir, 'blobs')
+        self._refs = os.path.join(cache_dir, 'refs')
+        os.makedirs(self._blobs, exist_ok=True)
+        os.makedirs(self._refs, exist_ok=True)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        # sha256 -> number of callers using the blob, pinned blobs are never evicted
+        self._pins = {}
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _ref_path(self, tag, filename):
+        key = hashlib.sha256(f"{tag}\0{filename}".encode()).hexdigest()
+        return os.path.join(self._refs, key + '.json')
+
+    def _blob_path(self, sha256):
+        return os.path.join(self._blobs, sha256)
+
+    def _key_lock(self, tag, filename):
+        with self._lock:
+            return self._key_locks.setdefault((tag, filename), threading.Lock())
+
+    def _pin(self, sha256):
+        with self._lock:
+            self._pins[sha256] = self._pins.get(sha256, 0) + 1
+
+    def _unpin(self, sha256):
+        with self._lock:
+            self._pins[sha256] -= 1
+            if not self._pins[sha256]:
+                del self._pins[sha256]
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _lookup_pinned(self, tag, filename):
+        """
+        returns (path, sha256) of the cached blob for (tag, filename) pinned against eviction, or (None, None)
+        """
+        try:
+            with open(self._ref_path(tag, filename)) as f:
+                ref = json.load(f)
+        except (OSError, ValueError):
+            return None, None
+
+        sha256 = ref['sha256']
+        path = self._blob_path(sha256)
+        # pinned before checking, so a blob that passes the checks can't be evicted until it is unpinned
+        self._pin(sha256)
+        try:
+            if os.path.getsize(path) != ref['size']:
+                path = None
+            elif self.verify and _file_sha256(path) != sha256:
+                log(f"--- cached {filename}@{tag} is corrupt, downloading again ---")
+                os.remove(path)
+                path = None
+        except OSError:
+            path = None
+        if path is None:
+            self._unpin(sha256)
+            return None, None
+        # mtime marks the blob as recently used for eviction
+        os.utime(path)
+        return path, sha256
+
+    def lookup(self, tag, filename):
+        """
+        returns the cached blob path for (tag, filename), or None if it isn't cached or fails its integrity check
+        """
+        path, sha256 = self._lookup_pinned(tag, filename)
+        if path is not None:
+            self._unpin(sha256)
+        return path
+
+    def _fetch_pinned(self, tag, filename):
+        """
+        returns (path, sha256) of the cached file for (tag, filename), downloading it first on a miss.
+        the blob stays pinned against eviction until the caller unpins it.
+        """
+        with self._key_lock(tag, filename):
+            path, sha256 = self._lookup_pinned(tag, filename)
+            if path is not None:
+                self._count('hits')
+                return path, sha256
+
+            self._count('misses')
+            url = integration_hub_url(tag, filename)
+            log("--- Downloading from: ", url)
+            fd, temp_path = tempfile.mkstemp(dir=self._blobs, suffix='.part')
+            os.close(fd)
+            try:
+                sha256, size = stream_to_file(url, temp_path, self.client)
+                path = self._blob_path(sha256)
+                # moved into place and pinned in one step, so evict can't remove it in between
+                with self._lock:
+                    os.replace(temp_path, path)
+                    self._pins[sha256] = self._pins.get(sha256, 0) + 1
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+            ref_path = self._ref_path(tag, filename)
+            with open(ref_path + '.part', 'w') as f:
+                json.dump({'tag': tag, 'filename': filename, 'sha256': sha256, 'size': size}, f)
+            os.replace(ref_path + '.part', ref_path)
+            return path, sha256
+
+    def _fetch(self, tag, filename):
+        path, sha256 = self._fetch_pinned(tag, filename)
+        try:
+            self.evict()
+        finally:
+            self._unpin(sha256)
+        return path, sha256
+
+    def fetch(self, tag, filename):
+        """
+        returns the path of the cached file for (tag, filename), downloading it first on a miss.
+        the returned blob survives this call's eviction even when it alone is larger than max_bytes, but a later
+        fetch may evict it; use copy_to to take a copy that is safe from concurrent fetches.
+        """
+        return self._fetch(tag, filename)[0]
+
+    def sha256(self, tag, filename):
+        """
+        returns the sha256 hex digest of the file for (tag, filename), downloading it first on a miss
+        """
+        return self._fetch(tag, filename)[1]
+
+    def copy_to(self, tag, filename, local_file_name):
+        """
+        put a private copy of the cached file at local_file_name, safe to rewrite in place
+        """
+        path, sha256 = self._fetch_pinned(tag, filename)
+        try:
+            shutil.copyfile(path, local_file_name)
+        finally:
+            self._unpin(sha256)
+        self.evict()
+        return local_file_name
+
+    def prefetch(self, tag, filenames, max_workers=4):
+        """
+        fetch the given files concurrently, e.g. every dataset and report of a DATASET_REPORT_MAPPING
+        """
+        filenames = list(dict.fromkeys(filenames))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return dict(zip(filenames, pool.map(lambda f: self.fetch(tag, f), filenames)))
+
+    def size(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self._blobs) if entry.is_file())
+
+    def evict(self):
+        """
+        remove the least recently used blobs until the cache fits in max_bytes, skipping blobs in use
+        """
+        with self._lock:
+            blobs = [entry for entry in os.scandir(self._blobs) if entry.is_file() and not entry.name.endswith('.part')]
+            total = sum(entry.stat().st_size for entry in blobs)
+            for entry in sorted(blobs, key=lambda e: e.stat().st_mtime):
+                if total <= self.max_bytes:
+                    break
+                if entry.name in self._pins:
+                    continue
+                total -= entry.stat().st_size
+                os.remove(entry.path)
+                self.stats['evictions'] += 1
+            # refs to evicted blobs fail the size check in lookup and are overwritten on the next fetch
+
+
+def mapping_files(mapping):
+    """
+    returns every dataset and report file named in a DATASET_REPORT_MAPPING
+    """
+    files = []
+    for dset, reports in mapping.items():
+        files.append(dset)
+        files.extend(reports)
+    return files
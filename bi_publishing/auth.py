@@ -0,0 +1,156 @@
+"""
+token acquisition for the PowerBI clients.
+
+a TokenProvider owns one msal.ConfidentialClientApplication and its token cache, hands out the
+current access token and refreshes it before it expires, either when it is read or from a
+background thread. providers are shared per app/scope within a process (see get_token_provider),
+and a file backed cache lets separate processes reuse each other's tokens.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from .instrument import log
+
+try:
+    import fcntl
+except ImportError:  # not available on windows, the cache file is then used without locking
+    fcntl = None
+
+DEFAULT_REFRESH_MARGIN = 300
+
+
+class _FileLock:
+    """
+    advisory lock on a side file so processes sharing a cache file don't interleave reads and writes
+    """
+
+    def __init__(self, path, exclusive):
+        self.path = path
+        self.exclusive = exclusive
+        self._f = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._f = open(self.path, 'a')
+            fcntl.flock(self._f, fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH)
+        return self
+
+    def __exit__(self, *exc):
+        if self._f is not None:
+            fcntl.flock(self._f, fcntl.LOCK_UN)
+            self._f.close()
+
+
+class TokenProvider:
+    """
+    returns a valid access token for the given config, refreshing it `refresh_margin` seconds
+    before it expires. msal treats tokens within 5 minutes of expiry as stale, so margins above
+    300 only make the refresh checks more frequent.
+    the token cache is kept in memory, in `cache_path` if given, or in the given msal cache object.
+    """
+
+    def __init__(self, config, cache_path=None, cache=None, refresh_margin=DEFAULT_REFRESH_MARGIN):
+        import msal  # only needed once a token is requested, keeps it out of the package import
+
+        self.config = config
+        self.cache_path = cache_path
+        self.cache = cache if cache is not None else msal.SerializableTokenCache()
+        self.refresh_margin = refresh_margin
+        self.app = msal.ConfidentialClientApplication(
+            config["client_id"], authority=config["authority"],
+            client_credential=config["secret"], token_cache=self.cache)
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0
+        self._refresher = None
+
+    def _load_cache(self):
+        if self.cache_path and os.path.exists(self.cache_path):
+            with _FileLock(self.cache_path + '.lock', exclusive=False):
+                with open(self.cache_path) as f:
+                    self.cache.deserialize(f.read())
+
+    def _save_cache(self):
+        if self.cache_path and self.cache.has_state_changed:
+            with _FileLock(self.cache_path + '.lock', exclusive=True):
+                temp_path = self.cache_path + '.temp'
+                with open(temp_path, 'w') as f:
+                    f.write(self.cache.serialize())
+                os.chmod(temp_path, 0o600)
+                os.replace(temp_path, self.cache_path)
+            self.cache.has_state_changed = False
+
+    def _acquire(self):
+        self._load_cache()
+        # msal looks in the token cache before it asks Azure AD
+        result = self.app.acquire_token_for_client(scopes=self.config["scope"])
+        if result.get('token_source') == 'identity_provider':
+            log("--- new token from Azure AD ---")
+
+        if "access_token" not in result:
+            log(result.get("error"))
+            log(result.get("error_description"))
+            log(result.get("correlation_id"))
+            raise Exception("Failed to acquire token", result)
+
+        self._save_cache()
+        self._token = result['access_token']
+        self._expires_at = time.monotonic() + int(result.get('expires_in', 3600))
+
+    def expires_in(self):
+        """
+        returns the number of seconds until the current token expires
+        """
+        return self._expires_at - time.monotonic()
+
+    def token(self):
+        """
+        returns the current access token, refreshing it first if it expires within refresh_margin
+        """
+        if self._token is None or self.expires_in() <= self.refresh_margin:
+            with self._lock:
+                if self._token is None or self.expires_in() <= self.refresh_margin:
+                    self._acquire()
+        return self._token
+
+    def start_background_refresh(self):
+        """
+        refresh the token from a daemon thread shortly before it expires, so callers never wait on Azure AD
+        """
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name="bi_publishing-token-refresh", daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                self.token()
+                wait = self.expires_in() - self.refresh_margin
+            except Exception as e:  # noqa
+                log(f"--- background token refresh failed, retrying: {e} ---")
+                wait = 30
+            time.sleep(min(600, max(5, wait)))
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_token_provider(config, cache_path=None, cache=None, refresh_margin=DEFAULT_REFRESH_MARGIN):
+    """
+    returns the process wide TokenProvider for the given app and scope, creating it on first use
+    """
+    # providers are told apart by a hash of the secret, so the secret itself isn't kept in the registry
+    secret = hashlib.sha256(str(config["secret"]).encode()).hexdigest()
+    key = (config["authority"], config["client_id"], secret, tuple(config["scope"]),
+           cache_path, id(cache) if cache is not None else None)
+    with _providers_lock:
+        provider = _providers.get(key)
+        if provider is None:
+            provider = TokenProvider(config, cache_path=cache_path, cache=cache, refresh_margin=refresh_margin)
+            _providers[key] = provider
+        return provider
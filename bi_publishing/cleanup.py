@@ -0,0 +1,111 @@
+"""
+bulk deletion of workspace content.
+
+the three collections are listed concurrently, the items to delete are picked by prefix, regex or
+predicate, and the deletes run in a bounded thread pool. reports and dashboards are deleted before
+the datasets they depend on, and a failed delete is recorded in the summary instead of stopping the run.
+"""
+import concurrent.futures
+import re
+
+from . import (
+    delete_dashboard_in_group,
+    delete_dataset_in_group,
+    delete_report_in_group,
+    get_dashboards_in_group,
+    get_datasets_in_group,
+    get_reports_in_group,
+)
+from .instrument import log
+
+DEFAULT_MAX_WORKERS = 8
+
+# dependents first, so deleting a dataset never races the deletes of its reports and dashboards
+DELETE_ORDER = ['reports', 'dashboards', 'datasets']
+
+_LISTERS = {
+    'datasets': get_datasets_in_group,
+    'dashboards': get_dashboards_in_group,
+    'reports': get_reports_in_group,
+}
+
+_DELETERS = {
+    'datasets': delete_dataset_in_group,
+    'dashboards': delete_dashboard_in_group,
+    'reports': delete_report_in_group,
+}
+
+
+def item_name(item):
+    # dashboards are named by displayName, everything else by name
+    return item.get('name', item.get('displayName'))
+
+
+def _matcher(prefix=None, pattern=None, predicate=None):
+    """
+    helper function that combines the given filters into one (kind, item) -> bool function
+    """
+    regex = re.compile(pattern) if isinstance(pattern, str) else pattern
+
+    def _match(kind, item):
+        name = item_name(item) or ''
+        if prefix is not None and not name.startswith(prefix):
+            return False
+        if regex is not None and not regex.search(name):
+            return False
+        if predicate is not None and not predicate(kind, item):
+            return False
+        return True
+
+    return _match
+
+
+def list_group_content(client, group_id, kinds=DELETE_ORDER):
+    """
+    returns {kind: [items]} for the given kinds, listing them concurrently
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(kinds)) as pool:
+        futures = {kind: pool.submit(_LISTERS[kind], client, group_id) for kind in kinds}
+        return {kind: future.result() for kind, future in futures.items()}
+
+
+def plan_cleanup(client, group_id, prefix=None, pattern=None, predicate=None, kinds=DELETE_ORDER):
+    """
+    returns {kind: [items to delete]} for the given group, in delete order.
+    items are selected when their name starts with prefix, matches the regex pattern and
+    predicate(kind, item) is true; filters that are not given are ignored.
+    """
+    match = _matcher(prefix, pattern, predicate)
+    content = list_group_content(client, group_id, kinds)
+    return {kind: [item for item in content[kind] if match(kind, item)] for kind in DELETE_ORDER if kind in content}
+
+
+def bulk_delete_in_group(client, group_id, prefix=None, pattern=None, predicate=None, kinds=DELETE_ORDER,
+                         max_workers=DEFAULT_MAX_WORKERS, dry_run=False):
+    """
+    delete the matching reports, dashboards and datasets in the given group (see plan_cleanup).
+    returns {'deleted': [...], 'failed': [...]} where each entry has kind, id, name (and error for failures).
+    with dry_run nothing is deleted and every planned item is reported under 'planned'.
+    """
+    plan = plan_cleanup(client, group_id, prefix, pattern, predicate, kinds)
+    log("--- items to delete: " + ", ".join(f"{kind}={len(items)}" for kind, items in plan.items()) + " ---")
+    summary = {'deleted': [], 'failed': []}
+    if dry_run:
+        summary['planned'] = [{'kind': kind, 'id': item['id'], 'name': item_name(item)}
+                              for kind, items in plan.items() for item in items]
+        return summary
+
+    def _delete(kind, item):
+        entry = {'kind': kind, 'id': item['id'], 'name': item_name(item)}
+        try:
+            _DELETERS[kind](client, group_id, item['id'])
+        except Exception as e:  # noqa
+            log(f"--- failed to delete {kind} {entry['name']}: {e} ---")
+            return dict(entry, error=str(e))
+        return entry
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for kind, items in plan.items():
+            for result in pool.map(lambda item: _delete(kind, item), items):
+                summary['failed' if 'error' in result else 'deleted'].append(result)
+    return summary
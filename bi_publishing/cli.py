@@ -0,0 +1,291 @@
+"""
+the bi-publishing command line.
+
+    bi-publishing publish workspace.json --artifact-cache ~/.cache/bi --state state.json
+    bi-publishing cleanup "GTM - Acme" --prefix "[old]"
+    bi-publishing refresh "GTM - Acme" --dataset "Dataset - Sales Performance"
+    bi-publishing prepare-pbix report.pbix --group-id <id> --dataset-id <id>
+    bi-publishing sync-users "GTM - Acme" --user admin@test.com=Admin --group <object id>=Member
+    bi-publishing inventory inventory.json --find "Sales Performance"
+    bi-publishing page-urls "GTM - Acme" "GTM - Globex" --cache pages.json > pages.jsonl
+
+the service principal is read from BI_PUBLISHING_TENANT_ID, BI_PUBLISHING_CLIENT_ID and
+BI_PUBLISHING_CLIENT_SECRET (or the matching options). set BI_PUBLISHING_TOKEN_CACHE to a file to
+share the access token between jobs. results are printed as json; the exit status is 1 when
+anything failed. each command imports only what it uses, so short jobs start quickly.
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def _client(args):
+    from . import get_client
+    conn = {'TENANT_ID': args.tenant_id, 'CLIENT_ID': args.client_id, 'CLIENT_SECRET': args.client_secret}
+    missing = [name for name, value in conn.items() if not value]
+    if missing:
+        raise SystemExit(f"missing service principal settings: {', '.join(missing)} "
+                         f"(set BI_PUBLISHING_{missing[0]} or pass --{missing[0].lower().replace('_', '-')})")
+    return get_client(conn, token_cache_path=args.token_cache)
+
+
+def _group(client, name):
+    from . import find_group
+    group = find_group(client, name)
+    if group is None:
+        raise SystemExit(f"workspace {name} not found")
+    return group
+
+
+def _load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _print(result):
+    print(json.dumps(result, indent=2, default=str))
+
+
+def _members(values, principal_type):
+    members = []
+    for value in values or ():
+        identifier, _, access = value.rpartition('=')
+        if not identifier or not access:
+            raise SystemExit(f"expected IDENTIFIER=ACCESS, got {value}")
+        members.append((identifier, access, principal_type))
+    return members
+
+
+def publish(args):
+    from .artifacts import ArtifactCache
+    from .spec import WorkspaceSpec, apply, plan
+
+    data = _load_json(args.spec)
+    if args.dw_conn:
+        data['dw_conn'] = _load_json(args.dw_conn)
+    spec = WorkspaceSpec.from_dict(data)
+    client = _client(args)
+    cache = ArtifactCache(args.artifact_cache, client=client) if args.artifact_cache else None
+    changes = plan(client, spec, artifact_cache=cache, state=args.state, check_parameters=args.check_parameters,
+                   max_workers=args.max_workers)
+    print(changes, file=sys.stderr)
+    if args.plan:
+        return 0
+    if not changes:
+        _print({'workspace': {'id': changes.group['id'], 'name': changes.group['name']}, 'operations': [],
+                'published': {}, 'failed': {}})
+        return 0
+    os.makedirs(args.work_dir, exist_ok=True)
+    try:
+        results = apply(client, changes, max_workers=args.max_workers, work_dir=args.work_dir,
+                        refresh=not args.no_refresh, journal=args.journal)
+    except Exception as e:  # noqa
+        _print({'failed': getattr(e, 'failed_steps', None) or {'apply': str(e)}})
+        return 1
+    published = {}
+    for dset, result in (results.get('publish') or {}).items():
+        published[dset] = {
+            'dataset_id': result['dataset']['id'],
+            'skipped': result['skipped'],
+            'reports': {report: {'id': obj['id'], 'skipped': report in result['skipped_reports']}
+                        for report, obj in result['reports'].items()},
+        }
+    _print({'workspace': {'id': results['group']['id'], 'name': results['group']['name']},
+            'operations': sorted(name for name in results if name not in ('group', 'publish')),
+            'published': published, 'failed': {}})
+    return 0
+
+
+def cleanup(args):
+    from .cleanup import bulk_delete_in_group
+
+    if not (args.prefix or args.pattern or args.all):
+        raise SystemExit("cleanup needs --prefix or --pattern, or --all to delete everything in the workspace "
+                         "(try --dry-run first)")
+    client = _client(args)
+    summary = bulk_delete_in_group(client, _group(client, args.workspace)['id'], prefix=args.prefix,
+                                   pattern=args.pattern, max_workers=args.max_workers, dry_run=args.dry_run)
+    _print(summary)
+    return 1 if summary['failed'] else 0
+
+
+def refresh(args):
+    from . import get_datasets_in_group, refresh_dataset_in_group
+    from .refresh import refresh_datasets
+
+    client = _client(args)
+    group = _group(client, args.workspace)
+    datasets = [d for d in get_datasets_in_group(client, group['id']) if d.get('isRefreshable', True)]
+    if args.dataset:
+        names = set(args.dataset)
+        datasets = [d for d in datasets if d['name'] in names]
+        unknown = names - {d['name'] for d in datasets}
+        if unknown:
+            raise SystemExit(f"datasets not found in {args.workspace}: {', '.join(sorted(unknown))}")
+
+    options = {'refresh_type': args.type} if args.type else {}
+    if args.no_wait:
+        _print([{'dataset_id': d['id'], 'request_id': refresh_dataset_in_group(client, group['id'], d['id'], **options)}
+                for d in datasets])
+        return 0
+    results = refresh_datasets(client, [(group['id'], d['id']) for d in datasets],
+                               max_per_capacity=args.max_per_capacity, timeout=args.timeout, **options)
+    _print(results)
+    return 1 if any('error' in entry for entry in results) else 0
+
+
+def prepare_pbix(args):
+    from .pbix import connect_pbix, disconnect_pbix
+
+    if bool(args.group_id) != bool(args.dataset_id):
+        raise SystemExit("--group-id and --dataset-id go together")
+    if args.output and len(args.files) > 1:
+        raise SystemExit("--output needs a single file")
+    for path in args.files:
+        if args.group_id:
+            connect_pbix(path, args.group_id, args.dataset_id, output=args.output)
+        else:
+            disconnect_pbix(path, output=args.output)
+    return 0
+
+
+def sync_users(args):
+    from .membership import sync_groups_membership
+
+    desired = _members(args.user, 'User') + _members(args.group, 'Group') + _members(args.app, 'App')
+    client = _client(args)
+    groups = [_group(client, name) for name in args.workspaces]
+    summaries = sync_groups_membership(client, [group['id'] for group in groups], desired, remove=args.remove,
+                                       max_workers=args.max_workers, dry_run=args.dry_run)
+    _print({group['name']: summaries[group['id']] for group in groups})
+    return 1 if any(summary['failed'] for summary in summaries.values()) else 0
+
+
+def inventory(args):
+    from .inventory import KINDS, NAME_KEYS, InventorySnapshot, refresh_inventory
+
+    snapshot = InventorySnapshot(args.snapshot)
+    summary = {}
+    if not args.offline:
+        summary = refresh_inventory(_client(args), snapshot, full=args.full, admin=not args.no_admin,
+                                    max_workers=args.max_workers)
+    if args.find:
+        summary['found'] = [{'kind': kind, 'workspace': workspace['name'], 'workspace_id': workspace['id'],
+                             'id': item['id'], 'name': item[NAME_KEYS[kind]]}
+                            for kind in KINDS for workspace, item in snapshot.find(kind, name=args.find)]
+    _print(summary)
+    return 1 if summary.get('failed') else 0
+
+
+def page_urls(args):
+    from .pages import PageCache, get_page_urls_for_groups
+
+    client = _client(args)
+    snapshot = None
+    if args.inventory:
+        from .inventory import InventorySnapshot
+        snapshot = InventorySnapshot(args.inventory)
+        group_ids = [w['id'] for w in snapshot.workspaces() if not args.workspaces or w['name'] in args.workspaces]
+    else:
+        group_ids = [_group(client, name)['id'] for name in args.workspaces]
+    cache = PageCache(args.cache) if args.cache else None
+    failed = False
+    # one json line per report as soon as it is known
+    for result in get_page_urls_for_groups(client, group_ids, cache=cache, snapshot=snapshot,
+                                           max_workers=args.max_workers):
+        failed = failed or 'error' in result
+        print(json.dumps(result), flush=True)
+    return 1 if failed else 0
+
+
+def build_parser():
+    env = os.environ.get
+    parser = argparse.ArgumentParser(prog='bi-publishing', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-v', '--verbose', action='store_true', help="print progress messages")
+    parser.add_argument('--tenant-id', default=env('BI_PUBLISHING_TENANT_ID'))
+    parser.add_argument('--client-id', default=env('BI_PUBLISHING_CLIENT_ID'))
+    parser.add_argument('--client-secret', default=env('BI_PUBLISHING_CLIENT_SECRET'))
+    parser.add_argument('--token-cache', default=env('BI_PUBLISHING_TOKEN_CACHE'),
+                        help="file the access token is cached in and shared between jobs")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('publish', help="bring a workspace in line with a json WorkspaceSpec")
+    p.add_argument('spec', help="json file with the WorkspaceSpec fields")
+    p.add_argument('--dw-conn', help="json file with the data warehouse connection, overrides the spec's")
+    p.add_argument('--artifact-cache', help="directory integration hub files are cached in")
+    p.add_argument('--state', help="PublishState file, unchanged datasets and reports are skipped")
+    p.add_argument('--journal', help="journal file, an interrupted publish resumes from it when run again")
+    p.add_argument('--work-dir', default='.')
+    p.add_argument('--max-workers', type=int, default=4)
+    p.add_argument('--check-parameters', action='store_true', help="also compare the parameters of deployed datasets")
+    p.add_argument('--no-refresh', action='store_true')
+    p.add_argument('--plan', action='store_true', help="only print the planned changes")
+    p.set_defaults(func=publish)
+
+    p = commands.add_parser('cleanup', help="delete matching reports, dashboards and datasets in a workspace",
+                            description="delete the reports, dashboards and datasets of a workspace whose names match "
+                                        "--prefix or --pattern. run with --dry-run first to see what would go.")
+    p.add_argument('workspace')
+    p.add_argument('--prefix', help="delete items whose name starts with this")
+    p.add_argument('--pattern', help="regular expression matched against item names")
+    p.add_argument('--all', action='store_true', help="delete every item in the workspace, needed without a filter")
+    p.add_argument('--max-workers', type=int, default=8)
+    p.add_argument('--dry-run', action='store_true', help="only print what would be deleted")
+    p.set_defaults(func=cleanup)
+
+    p = commands.add_parser('refresh', help="refresh the datasets of a workspace")
+    p.add_argument('workspace')
+    p.add_argument('--dataset', action='append', help="dataset name, repeat for several (default: all)")
+    p.add_argument('--type', help="refresh type, e.g. Full or Calculate")
+    p.add_argument('--max-per-capacity', type=int, default=2)
+    p.add_argument('--timeout', type=float, default=3600)
+    p.add_argument('--no-wait', action='store_true', help="submit the refreshes and print their request ids")
+    p.set_defaults(func=refresh)
+
+    p = commands.add_parser('prepare-pbix', help="disconnect pbix files, or connect them to a dataset")
+    p.add_argument('files', nargs='+')
+    p.add_argument('--group-id')
+    p.add_argument('--dataset-id')
+    p.add_argument('--output', help="write the result here instead of rewriting the file in place")
+    p.set_defaults(func=prepare_pbix)
+
+    p = commands.add_parser('sync-users', help="make workspace members match the given users and groups")
+    p.add_argument('workspaces', nargs='+')
+    p.add_argument('--user', action='append', metavar='EMAIL=ACCESS')
+    p.add_argument('--group', action='append', metavar='OBJECT_ID=ACCESS')
+    p.add_argument('--app', action='append', metavar='OBJECT_ID=ACCESS')
+    p.add_argument('--remove', action='store_true', help="also remove members that aren't listed")
+    p.add_argument('--max-workers', type=int, default=8)
+    p.add_argument('--dry-run', action='store_true')
+    p.set_defaults(func=sync_users)
+
+    p = commands.add_parser('inventory', help="update a local snapshot of every workspace and its contents")
+    p.add_argument('snapshot', help="json file the snapshot is kept in, only changed workspaces are scanned again")
+    p.add_argument('--full', action='store_true', help="scan every workspace again")
+    p.add_argument('--no-admin', action='store_true', help="list workspaces one by one instead of the admin scan")
+    p.add_argument('--offline', action='store_true', help="don't update the snapshot, only query it")
+    p.add_argument('--find', metavar='NAME', help="print the datasets, reports and dashboards with this name")
+    p.add_argument('--max-workers', type=int, default=8)
+    p.set_defaults(func=inventory)
+
+    p = commands.add_parser('page-urls', help="print the page urls of every report as json lines")
+    p.add_argument('workspaces', nargs='*', help="workspace names (default with --inventory: every workspace)")
+    p.add_argument('--inventory', help="inventory snapshot to take the workspaces and reports from")
+    p.add_argument('--cache', help="json file of fetched pages, unchanged reports aren't fetched again")
+    p.add_argument('--max-workers', type=int, default=8)
+    p.set_defaults(func=page_urls)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.verbose:
+        from .instrument import set_verbose
+        set_verbose(True)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+batched datasource credential updates.
+
+datasets that connect to the same database share one gateway datasource, so updating credentials
+dataset by dataset patches the same datasource over and over. here the datasources of all given
+datasets are listed concurrently, deduplicated by (gatewayId, datasourceId), and each unique
+datasource is patched once, in parallel, with the credential body serialised once per datasource type.
+"""
+import concurrent.futures
+import json
+import threading
+
+from . import POWERBI_BASE_URL, _credentials_update, _get_headers, _request
+from .instrument import log
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def get_datasources(client, group_id, dataset_id):
+    """
+    returns the datasources of the given dataset
+    """
+    url = f"{POWERBI_BASE_URL}/groups/{group_id}/datasets/{dataset_id}/datasources"
+    response = _request(client, 'GET', url, headers=_get_headers(client))
+    if response.ok:
+        return response.json()['value']
+    raise Exception(f"--- failed to get datasources of dataset {dataset_id}: {response.content} ---")
+
+
+class _Payloads:
+    """
+    serialised credential bodies, built once per datasource type
+    """
+
+    def __init__(self, dw_conn):
+        self.dw_conn = dw_conn
+        self._bodies = {}
+        self._lock = threading.Lock()
+
+    def get(self, datasource):
+        kind = datasource['datasourceType']
+        with self._lock:
+            if kind not in self._bodies:
+                self._bodies[kind] = json.dumps(_credentials_update(datasource, self.dw_conn))
+            return self._bodies[kind]
+
+
+def patch_datasource_credentials(client, gateway_id, datasource_id, body):
+    """
+    PATCH the given serialised credential body onto a gateway datasource
+    """
+    url = f"{POWERBI_BASE_URL}/gateways/{gateway_id}/datasources/{datasource_id}"
+    response = _request(client, 'PATCH', url, headers=_get_headers(client), data=body)
+    if not response.ok:
+        raise Exception(f"--- failed to update credentials of datasource {datasource_id}: {response.content} ---")
+
+
+def dedupe_datasources(listings):
+    """
+    returns {(gatewayId, datasourceId): {'datasource', 'datasets'}} for the given
+    [((group_id, dataset_id), datasources)], where 'datasets' are the targets using that datasource
+    """
+    unique = {}
+    for target, datasources in listings:
+        for datasource in datasources:
+            key = (datasource.get('gatewayId'), datasource.get('datasourceId'))
+            entry = unique.setdefault(key, {'datasource': datasource, 'datasets': []})
+            entry['datasets'].append(target)
+    return unique
+
+
+def _datasource_summary(key, entry):
+    gateway_id, datasource_id = key
+    return {'gateway_id': gateway_id, 'datasource_id': datasource_id,
+            'datasource_type': entry['datasource'].get('datasourceType'), 'datasets': entry['datasets']}
+
+
+def collect_datasources(client, targets, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    list the datasources of every (group_id, dataset_id) in targets concurrently.
+    returns ({(gatewayId, datasourceId): {'datasource', 'datasets'}}, [failed listings]) where 'datasets'
+    are the targets using that datasource.
+    """
+    targets = list(dict.fromkeys(targets))
+    listings = []
+    failed = []
+
+    def _list(target):
+        try:
+            return target, get_datasources(client, *target), None
+        except Exception as e:  # noqa
+            return target, None, e
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for (group_id, dataset_id), datasources, error in pool.map(_list, targets):
+            if error is not None:
+                log(f"--- listing datasources of dataset {dataset_id} failed: {error} ---")
+                failed.append({'group_id': group_id, 'dataset_id': dataset_id, 'error': str(error)})
+                continue
+            listings.append(((group_id, dataset_id), datasources))
+    return dedupe_datasources(listings), failed
+
+
+def update_credentials(client, dw_conn, targets, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    update the credentials of every datasource used by the (group_id, dataset_id) pairs in targets with dw_conn.
+    each unique gateway datasource is patched once, however many datasets use it.
+    returns {'updated': [...], 'failed': [...], 'skipped': [...]} with one entry per datasource
+    (gateway_id, datasource_id, datasource_type, datasets, and error for failures); datasets whose datasources
+    couldn't be listed are in 'failed' with their group_id and dataset_id. datasources without a gateway
+    (which can't be patched) are skipped.
+    """
+    targets = list(dict.fromkeys(targets))
+    unique, failed = collect_datasources(client, targets, max_workers=max_workers)
+    payloads = _Payloads(dw_conn)
+    result = {'updated': [], 'failed': failed, 'skipped': []}
+
+    def _patch(item):
+        (gateway_id, datasource_id), entry = item
+        summary = _datasource_summary((gateway_id, datasource_id), entry)
+        if gateway_id is None or datasource_id is None:
+            return 'skipped', summary
+        try:
+            patch_datasource_credentials(client, gateway_id, datasource_id, payloads.get(entry['datasource']))
+        except Exception as e:  # noqa
+            log(f"--- credentials of datasource {datasource_id} not updated: {e} ---")
+            return 'failed', dict(summary, error=str(e))
+        return 'updated', summary
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for outcome, summary in pool.map(_patch, unique.items()):
+            result[outcome].append(summary)
+    log(f"--- credentials updated for {len(result['updated'])} datasource(s) of {len(targets)} dataset(s) ---")
+    return result
@@ -0,0 +1,99 @@
+"""
+state for incremental publishes.
+
+every dataset and report deployed by publish_workspace is recorded with a fingerprint of what was
+deployed: the hash of the source PBIX plus the ids and settings it was deployed with. on the next
+run an artifact whose fingerprint still matches, and whose object still exists in the workspace,
+is left alone; changed artifacts are re-imported over the existing object so their ids stay the same.
+"""
+import hashlib
+import json
+import os
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    """
+    returns the sha256 hex digest of the given file. for files held in an ArtifactCache use
+    ArtifactCache.sha256, which knows the digest without reading the file again.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(*parts):
+    """
+    returns a stable hash of the given json serialisable parts
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def dataset_key(group_id, dataset_file):
+    return f"{group_id}/{dataset_file}"
+
+
+def report_key(group_id, dataset_file, report_file):
+    return f"{group_id}/{dataset_file}/{report_file}"
+
+
+def dataset_fingerprint(source_sha256, group_id, remote_name):
+    return fingerprint(source_sha256, group_id, remote_name)
+
+
+def report_fingerprint(source_sha256, group_id, dataset_id, remote_name):
+    return fingerprint(source_sha256, group_id, dataset_id, remote_name)
+
+
+def settings_fingerprint(params_details, dw_conn):
+    """
+    returns the fingerprint of the parameter and credential settings a dataset is deployed with
+    """
+    return fingerprint(params_details, dw_conn)
+
+
+class PublishState:
+    """
+    json file of {key: {'fingerprint': ..., 'id': ..., ...}} for the artifacts deployed so far.
+    writes are atomic, so an interrupted run leaves the last complete state behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            self._entries = {}
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def unchanged(self, key, fp):
+        """
+        returns the recorded entry if it was deployed with the given fingerprint, otherwise None
+        """
+        entry = self.get(key)
+        return entry if entry is not None and entry.get('fingerprint') == fp else None
+
+    def _save(self):
+        temp_path = self.path + '.temp'
+        with open(temp_path, 'w') as f:
+            json.dump(self._entries, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def record(self, key, fp, **fields):
+        with self._lock:
+            self._entries[key] = dict(fields, fingerprint=fp)
+            self._save()
+
+    def forget(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
@@ -0,0 +1,98 @@
+"""
+in-client name -> object index for groups, datasets, reports, dashboards and capacities.
+
+every list call made through a PowerBIClient stores its result here, so the *_by_name helpers can
+answer from memory instead of re-listing the whole collection. entries expire after `ttl` seconds
+and the collections this library changes (create, upload, delete, ...) are invalidated explicitly.
+"""
+import time
+import threading
+
+DEFAULT_TTL = 300
+
+# the attribute holding the display name of each kind of object
+NAME_KEYS = {
+    'groups': 'name',
+    'datasets': 'name',
+    'reports': 'name',
+    'dashboards': 'displayName',
+    'capacities': 'displayName',
+}
+
+
+class MetadataIndex:
+    """
+    thread safe cache of collections keyed by (group_id, kind) with a name lookup per collection.
+    tenant wide collections (groups, capacities) use group_id=None.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._collections = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+
+    def store(self, group_id, kind, items):
+        """
+        replace the cached collection for (group_id, kind) with the given list of objects
+        """
+        name_key = NAME_KEYS.get(kind, 'name')
+        by_name = {}
+        for item in items:
+            name = item.get(name_key, item.get('name'))
+            if name is not None:
+                by_name.setdefault(name, item)
+        with self._lock:
+            self._collections[(group_id, kind)] = (time.monotonic(), by_name)
+            self._stats['stores'] += 1
+
+    def add(self, group_id, kind, items):
+        """
+        merge the given objects into the cached collection for (group_id, kind), e.g. the rows of a
+        filtered list call. a collection that doesn't exist yet is started with just these objects.
+        """
+        name_key = NAME_KEYS.get(kind, 'name')
+        with self._lock:
+            created, by_name = self._collections.get((group_id, kind), (time.monotonic(), {}))
+            by_name = dict(by_name)
+            for item in items:
+                name = item.get(name_key, item.get('name'))
+                if name is not None:
+                    by_name[name] = item
+            self._collections[(group_id, kind)] = (created, by_name)
+            self._stats['stores'] += 1
+
+    def lookup(self, group_id, kind, name):
+        """
+        returns the cached object with the given name, or None if it is unknown or expired
+        """
+        with self._lock:
+            entry = self._collections.get((group_id, kind))
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._collections[(group_id, kind)]
+                entry = None
+            item = entry[1].get(name) if entry is not None else None
+            self._stats['hits' if item is not None else 'misses'] += 1
+            return item
+
+    def invalidate(self, group_id=None, kind=None):
+        """
+        drop cached collections. with no arguments everything is dropped,
+        with only group_id every collection of that group is dropped.
+        """
+        with self._lock:
+            if group_id is None and kind is None:
+                keys = list(self._collections)
+            else:
+                keys = [k for k in self._collections
+                        if (group_id is None or k[0] == group_id) and (kind is None or k[1] == kind)]
+            for key in keys:
+                del self._collections[key]
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        """
+        returns the hit/miss counters and the number of cached collections
+        """
+        with self._lock:
+            return dict(self._stats, collections=len(self._collections))
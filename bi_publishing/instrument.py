@@ -0,0 +1,332 @@
+"""
+instrumentation hooks.
+
+every HTTP call made by the clients is reported to the registered hooks with its endpoint template,
+method, status, bytes, retries and latency; pipeline steps are reported as spans and progress
+messages as log events. hooks ship for the logging module, prometheus_client, OpenTelemetry and an
+in-memory summary. progress messages are only printed when verbose output is switched on
+(set_verbose(True) or BI_PUBLISHING_VERBOSE=1).
+"""
+import contextlib
+import os
+import re
+import threading
+import time
+import urllib.parse
+
+_GUID = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+_POWERBI_API = re.compile(r'^https://api\.powerbi\.com/v1\.0/myorg')
+
+_verbose = os.environ.get('BI_PUBLISHING_VERBOSE', '').lower() in ('1', 'true', 'yes')
+_hooks = ()
+_hooks_lock = threading.Lock()
+
+
+def set_verbose(verbose=True):
+    """
+    print progress messages to stdout (off by default)
+    """
+    global _verbose
+    _verbose = verbose
+
+
+def add_hook(hook):
+    global _hooks
+    with _hooks_lock:
+        _hooks = _hooks + (hook,)
+    return hook
+
+
+def remove_hook(hook):
+    global _hooks
+    with _hooks_lock:
+        _hooks = tuple(h for h in _hooks if h is not hook)
+
+
+def log(*args):
+    """
+    report a progress message: printed when verbose, and passed to the hooks
+    """
+    if not _verbose and not _hooks:
+        return
+    message = ' '.join(str(arg) for arg in args)
+    if _verbose:
+        print(message)
+    for hook in _hooks:
+        hook.on_log(message)
+
+
+def endpoint_template(url):
+    """
+    returns the url with ids replaced by {id} and the query removed, e.g. 'groups/{id}/imports'.
+    urls outside the PowerBI api (blob storage, downloads) are reduced to their host.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if not _POWERBI_API.match(url):
+        return parts.netloc
+    path = _POWERBI_API.sub('', urllib.parse.urlunsplit(parts._replace(query='', fragment='')))
+    segments = ['{id}' if _GUID.fullmatch(segment) or segment.isdigit() else segment
+                for segment in path.strip('/').split('/')]
+    return '/'.join(segments)
+
+
+def _body_size(body):
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, bytearray, str)):
+        return len(body)
+    try:
+        return len(body)
+    except TypeError:
+        return None
+
+
+class RequestEvent:
+    """
+    one logical api call, including its retries
+    """
+
+    def __init__(self, method, url, body=None):
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint_template(url)
+        self.bytes_sent = _body_size(body)
+        self.bytes_received = None
+        self.status = None
+        self.retries = 0
+        self.error = None
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.seconds = None
+
+    def finish(self, response=None, error=None):
+        self.seconds = time.perf_counter() - self._started
+        self.error = error
+        if response is not None:
+            self.status = response.status_code
+            length = response.headers.get('Content-Length')
+            self.bytes_received = int(length) if length and length.isdigit() else None
+        for hook in _hooks:
+            hook.on_request(self)
+
+    def as_dict(self):
+        return {
+            'method': self.method, 'endpoint': self.endpoint, 'status': self.status, 'retries': self.retries,
+            'seconds': self.seconds, 'bytes_sent': self.bytes_sent, 'bytes_received': self.bytes_received,
+            'error': repr(self.error) if self.error is not None else None,
+        }
+
+
+def track_request(method, url, body=None):
+    """
+    returns a RequestEvent for the given call, or None when no hooks are registered
+    """
+    return RequestEvent(method, url, body) if _hooks else None
+
+
+class Span:
+    """
+    a timed unit of work such as a pipeline step
+    """
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.seconds = None
+        self.error = None
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    time the enclosed block and report it to the hooks as a span
+    """
+    if not _hooks:
+        yield None
+        return
+    s = Span(name, attributes)
+    hooks = _hooks
+    for hook in hooks:
+        hook.on_span_start(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = e
+        raise
+    finally:
+        s.seconds = time.perf_counter() - s._started
+        for hook in reversed(hooks):
+            hook.on_span_end(s)
+
+
+class Hook:
+    """
+    base class for hooks; override the events you need
+    """
+
+    def on_request(self, event):
+        pass
+
+    def on_span_start(self, span):
+        pass
+
+    def on_span_end(self, span):
+        pass
+
+    def on_log(self, message):
+        pass
+
+
+class LoggingHook(Hook):
+    """
+    sends calls (DEBUG), spans and progress messages (INFO) to a logging.Logger
+    """
+
+    def __init__(self, logger=None):
+        if logger is None:
+            import logging
+            logger = logging.getLogger('bi_publishing')
+        self.logger = logger
+
+    def on_request(self, event):
+        self.logger.debug("%s %s -> %s in %.3fs (%d retries)", event.method, event.endpoint, event.status or event.error,
+                          event.seconds, event.retries, extra={'bi_publishing': event.as_dict()})
+
+    def on_span_end(self, span):
+        outcome = 'failed' if span.error is not None else 'done'
+        self.logger.info("%s %s in %.3fs", span.name, outcome, span.seconds, extra={'bi_publishing': span.attributes})
+
+    def on_log(self, message):
+        self.logger.info(message)
+
+
+class StatsHook(Hook):
+    """
+    in-memory totals per endpoint and per span name, for finding the slow phases of a run
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.spans = {}
+
+    @staticmethod
+    def _add(table, key, seconds, error, **extra):
+        row = table.setdefault(key, {'count': 0, 'errors': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+        row['count'] += 1
+        row['errors'] += error
+        row['seconds'] += seconds
+        row['max_seconds'] = max(row['max_seconds'], seconds)
+        for name, value in extra.items():
+            row[name] = row.get(name, 0) + (value or 0)
+
+    def on_request(self, event):
+        failed = event.error is not None or (event.status or 0) >= 400
+        with self._lock:
+            self._add(self.requests, (event.method, event.endpoint), event.seconds, failed, retries=event.retries,
+                      bytes_sent=event.bytes_sent, bytes_received=event.bytes_received)
+
+    def on_span_end(self, span):
+        with self._lock:
+            self._add(self.spans, span.name, span.seconds, span.error is not None)
+
+    def summary(self):
+        """
+        returns the request and span totals, slowest first
+        """
+        with self._lock:
+            requests = sorted(({'method': k[0], 'endpoint': k[1], **v} for k, v in self.requests.items()),
+                              key=lambda row: -row['seconds'])
+            spans = sorted(({'name': k, **v} for k, v in self.spans.items()), key=lambda row: -row['seconds'])
+        return {'requests': requests, 'spans': spans}
+
+    def report(self):
+        """
+        returns the summary as a plain text table
+        """
+        summary = self.summary()
+        lines = [f"{'calls':>6} {'errors':>6} {'retries':>7} {'total s':>9} {'max s':>8}  endpoint"]
+        for row in summary['requests']:
+            lines.append(f"{row['count']:>6} {row['errors']:>6} {row['retries']:>7} {row['seconds']:>9.2f} "
+                         f"{row['max_seconds']:>8.2f}  {row['method']} {row['endpoint']}")
+        lines.append(f"{'runs':>6} {'errors':>6} {'':>7} {'total s':>9} {'max s':>8}  step")
+        for row in summary['spans']:
+            lines.append(f"{row['count']:>6} {row['errors']:>6} {'':>7} {row['seconds']:>9.2f} "
+                         f"{row['max_seconds']:>8.2f}  {row['name']}")
+        return "\n".join(lines)
+
+
+class PrometheusHook(Hook):
+    """
+    records calls and spans in prometheus_client metrics (pip install prometheus_client)
+    """
+
+    def __init__(self, registry=None, namespace='bi_publishing'):
+        import prometheus_client
+
+        kwargs = {'namespace': namespace}
+        if registry is not None:
+            kwargs['registry'] = registry
+        self.request_seconds = prometheus_client.Histogram(
+            'request_seconds', 'PowerBI api call latency including retries', ['method', 'endpoint', 'status'], **kwargs)
+        self.request_retries = prometheus_client.Counter(
+            'request_retries', 'PowerBI api call retries', ['method', 'endpoint'], **kwargs)
+        self.request_bytes = prometheus_client.Counter(
+            'request_bytes', 'bytes sent and received', ['method', 'endpoint', 'direction'], **kwargs)
+        self.step_seconds = prometheus_client.Histogram(
+            'step_seconds', 'pipeline step duration', ['step', 'outcome'], **kwargs)
+
+    def on_request(self, event):
+        status = str(event.status) if event.status is not None else type(event.error).__name__
+        self.request_seconds.labels(event.method, event.endpoint, status).observe(event.seconds)
+        if event.retries:
+            self.request_retries.labels(event.method, event.endpoint).inc(event.retries)
+        if event.bytes_sent:
+            self.request_bytes.labels(event.method, event.endpoint, 'sent').inc(event.bytes_sent)
+        if event.bytes_received:
+            self.request_bytes.labels(event.method, event.endpoint, 'received').inc(event.bytes_received)
+
+    def on_span_end(self, span):
+        outcome = 'failed' if span.error is not None else 'ok'
+        self.step_seconds.labels(span.name, outcome).observe(span.seconds)
+
+
+class OpenTelemetryHook(Hook):
+    """
+    reports spans and calls as OpenTelemetry spans; calls become children of the step they ran in
+    (pip install opentelemetry-api and configure an sdk/exporter)
+    """
+
+    def __init__(self, tracer=None):
+        from opentelemetry import context, trace
+
+        self._context = context
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer('bi_publishing')
+
+    def on_span_start(self, span):
+        otel_span = self.tracer.start_span(span.name, attributes={k: str(v) for k, v in span.attributes.items()},
+                                           start_time=int(span.start * 1e9))
+        token = self._context.attach(self._trace.set_span_in_context(otel_span))
+        span.otel = (otel_span, token)
+
+    def on_span_end(self, span):
+        otel_span, token = span.otel
+        if span.error is not None:
+            otel_span.record_exception(span.error)
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+        self._context.detach(token)
+        otel_span.end(end_time=int((span.start + span.seconds) * 1e9))
+
+    def on_request(self, event):
+        otel_span = self.tracer.start_span(f"{event.method} {event.endpoint}", start_time=int(event.start * 1e9),
+                                           kind=self._trace.SpanKind.CLIENT)
+        otel_span.set_attribute('http.method', event.method)
+        otel_span.set_attribute('http.retries', event.retries)
+        if event.status is not None:
+            otel_span.set_attribute('http.status_code', event.status)
+        if event.error is not None or (event.status or 0) >= 400:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+        otel_span.end(end_time=int((event.start + event.seconds) * 1e9))
@@ -0,0 +1,283 @@
+"""
+tenant inventory snapshots.
+
+`refresh_inventory` fills an InventorySnapshot with every workspace and its datasets, reports and
+dashboards. with admin rights it uses the workspace scan api: one call lists the workspaces modified
+since the last snapshot (all of them the first time), which are then scanned 100 per getInfo call,
+with the scans polled until their results can be read. without admin rights it falls back to listing
+the workspaces the principal is a member of and their contents, three calls per workspace.
+
+the snapshot keeps only the fields needed to find things (ids, names, the links between reports and
+datasets, modification times) in a json file, so fleet wide questions are answered locally:
+
+    snapshot = InventorySnapshot('inventory.json')
+    refresh_inventory(client, snapshot)
+    for workspace, report in snapshot.find('reports', name='Sales Performance'):
+        ...
+"""
+import concurrent.futures
+import json
+import os
+import threading
+import time
+
+from . import (POWERBI_BASE_URL, _backoff_intervals, _get_headers, _request, get_dashboards_in_group,
+               get_datasets_in_group, get_reports_in_group, iter_groups)
+from .instrument import log
+
+DEFAULT_MAX_WORKERS = 8
+# workspaces per getInfo call, the most the service accepts
+SCAN_BATCH_SIZE = 100
+# the modified workspaces endpoint only looks this far back
+MAX_MODIFIED_SINCE = 30 * 24 * 3600
+
+KINDS = ('datasets', 'reports', 'dashboards')
+
+# the fields kept per object
+WORKSPACE_FIELDS = ('id', 'name', 'type', 'state', 'isOnDedicatedCapacity', 'capacityId')
+ITEM_FIELDS = {
+    'datasets': ('id', 'name', 'configuredBy', 'createdDate', 'isRefreshable', 'targetStorageMode'),
+    'reports': ('id', 'name', 'datasetId', 'reportType', 'createdDateTime', 'modifiedDateTime'),
+    'dashboards': ('id', 'displayName', 'isReadOnly'),
+}
+NAME_KEYS = {'datasets': 'name', 'reports': 'name', 'dashboards': 'displayName'}
+
+
+class AdminAccessDenied(Exception):
+    """
+    the principal isn't allowed to call the admin apis
+    """
+
+
+def _compact(item, fields):
+    return {field: item[field] for field in fields if item.get(field) is not None}
+
+
+def _compact_workspace(workspace):
+    entry = _compact(workspace, WORKSPACE_FIELDS)
+    for kind in KINDS:
+        entry[kind] = [_compact(item, ITEM_FIELDS[kind]) for item in workspace.get(kind) or ()]
+    return entry
+
+
+def _timestamp(seconds):
+    return time.strftime('%Y-%m-%dT%H:%M:%S.0000000Z', time.gmtime(seconds))
+
+
+class InventorySnapshot:
+    """
+    json file of {'scanned_at', 'source', 'workspaces': {id: workspace}} where every workspace holds
+    compact lists of its datasets, reports and dashboards. without a path the snapshot lives in memory.
+    writes are atomic, and lookups by id use an index built when the snapshot changes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {'scanned_at': None, 'source': None, 'workspaces': {}}
+        if path:
+            try:
+                with open(path) as f:
+                    self._data = json.load(f)
+            except FileNotFoundError:
+                pass
+        self._reindex()
+
+    def _reindex(self):
+        self._by_id = {}
+        for workspace in self._data['workspaces'].values():
+            for kind in KINDS:
+                for item in workspace[kind]:
+                    self._by_id[item['id'].lower()] = (kind, workspace, item)
+
+    @property
+    def scanned_at(self):
+        return self._data['scanned_at']
+
+    @property
+    def source(self):
+        return self._data['source']
+
+    def __len__(self):
+        return len(self._data['workspaces'])
+
+    def update(self, workspaces, removed=(), scanned_at=None, source=None):
+        """
+        store the given raw workspaces (from a scan or the group apis) and drop the `removed` ids
+        """
+        with self._lock:
+            current = dict(self._data['workspaces'])
+            for workspace_id in removed:
+                current.pop(workspace_id, None)
+            for workspace in workspaces:
+                current[workspace['id']] = _compact_workspace(workspace)
+            self._data = {'scanned_at': scanned_at, 'source': source, 'workspaces': current}
+            self._reindex()
+            if self.path:
+                temp_path = self.path + '.temp'
+                with open(temp_path, 'w') as f:
+                    json.dump(self._data, f, separators=(',', ':'), sort_keys=True)
+                os.replace(temp_path, self.path)
+
+    def workspaces(self):
+        return list(self._data['workspaces'].values())
+
+    def workspace(self, workspace_id):
+        return self._data['workspaces'].get(workspace_id)
+
+    def locate(self, item_id):
+        """
+        returns (kind, workspace, item) for the dataset, report or dashboard with the given id, or None
+        """
+        return self._by_id.get(item_id.lower())
+
+    def find(self, kind, name=None, predicate=None):
+        """
+        yields (workspace, item) for the objects of the given kind, optionally limited to those with the
+        given name and those the predicate(workspace, item) accepts
+        """
+        name_key = NAME_KEYS[kind]
+        for workspace in self._data['workspaces'].values():
+            for item in workspace[kind]:
+                if name is not None and item.get(name_key) != name:
+                    continue
+                if predicate is not None and not predicate(workspace, item):
+                    continue
+                yield workspace, item
+
+    def reports_for_dataset(self, dataset_id):
+        """
+        returns [(workspace, report)] for the reports bound to the given dataset, in any workspace
+        """
+        dataset_id = dataset_id.lower()
+        return list(self.find('reports', predicate=lambda w, r: (r.get('datasetId') or '').lower() == dataset_id))
+
+    def counts(self):
+        """
+        returns {workspace id: {kind: number of objects}}, e.g. to balance capacities by dataset count
+        """
+        return {workspace_id: {kind: len(workspace[kind]) for kind in KINDS}
+                for workspace_id, workspace in self._data['workspaces'].items()}
+
+
+def _admin_get(client, url, params=None):
+    response = _request(client, 'GET', url, headers=_get_headers(client), params=params)
+    if response.status_code in (401, 403):
+        raise AdminAccessDenied(response.content)
+    if response.status_code != 200:
+        raise Exception(response.content)
+    return response.json()
+
+
+def modified_workspaces(client, modified_since=None, exclude_personal=True):
+    """
+    returns the ids of the workspaces modified since the given epoch time (every workspace without one),
+    including deleted workspaces so they can be dropped from a snapshot
+    """
+    params = {'excludePersonalWorkspaces': str(exclude_personal)}
+    if modified_since is not None:
+        params['modifiedSince'] = _timestamp(modified_since)
+    return [workspace['id'] for workspace in _admin_get(client, f"{POWERBI_BASE_URL}/admin/workspaces/modified", params)]
+
+
+def scan_workspaces(client, workspace_ids, timeout=600):
+    """
+    scan the given workspaces (at most SCAN_BATCH_SIZE) and return the scan result's workspaces
+    """
+    url = f"{POWERBI_BASE_URL}/admin/workspaces"
+    response = _request(client, 'POST', f"{url}/getInfo", headers=_get_headers(client),
+                        data=json.dumps({'workspaces': list(workspace_ids)}))
+    if response.status_code in (401, 403):
+        raise AdminAccessDenied(response.content)
+    if not response.ok:
+        raise Exception(f"--- workspace scan failed: {response.content} ---")
+    scan_id = response.json()['id']
+
+    deadline = time.monotonic() + timeout
+    for interval in _backoff_intervals(initial=1, maximum=15):
+        status = _admin_get(client, f"{url}/scanStatus/{scan_id}")['status']
+        if status == 'Succeeded':
+            break
+        if status == 'Failed':
+            raise Exception(f"--- workspace scan {scan_id} failed ---")
+        if time.monotonic() + interval > deadline:
+            raise TimeoutError(f"workspace scan {scan_id} still {status} after {timeout}s")
+        time.sleep(interval)
+    return _admin_get(client, f"{url}/scanResult/{scan_id}").get('workspaces', [])
+
+
+def _refresh_from_scans(client, snapshot, full, max_workers, timeout):
+    started = time.time()
+    incremental = (not full and snapshot.source == 'admin' and snapshot.scanned_at is not None
+                   and started - snapshot.scanned_at < MAX_MODIFIED_SINCE)
+    workspace_ids = modified_workspaces(client, snapshot.scanned_at if incremental else None)
+    batches = [workspace_ids[i:i + SCAN_BATCH_SIZE] for i in range(0, len(workspace_ids), SCAN_BATCH_SIZE)]
+    log(f"--- scanning {len(workspace_ids)} workspaces in {len(batches)} batches ---")
+
+    scanned, failed = [], []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(scan_workspaces, client, batch, timeout): batch for batch in batches}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                scanned.extend(future.result())
+            except AdminAccessDenied:
+                raise
+            except Exception as e:  # noqa
+                log(f"--- scanning {len(futures[future])} workspaces failed: {e} ---")
+                failed.append({'workspaces': futures[future], 'error': str(e)})
+
+    removed = [w['id'] for w in scanned if w.get('state') in ('Deleted', 'Removing')]
+    current = [w for w in scanned if w.get('state') not in ('Deleted', 'Removing')]
+    if not incremental:
+        listed = set(workspace_ids)
+        removed += [w['id'] for w in snapshot.workspaces() if w['id'] not in listed]
+    # a failed batch keeps the snapshot at the previous scan time, so its workspaces are picked up next time
+    snapshot.update(current, removed=removed, scanned_at=snapshot.scanned_at if failed else started, source='admin')
+    return {'source': 'admin', 'incremental': incremental, 'scanned': len(current), 'removed': len(removed),
+            'failed': failed}
+
+
+def _refresh_from_groups(client, snapshot, max_workers):
+    started = time.time()
+    groups = list(iter_groups(client))
+    log(f"--- listing the contents of {len(groups)} workspaces ---")
+    listers = {'datasets': get_datasets_in_group, 'reports': get_reports_in_group,
+               'dashboards': get_dashboards_in_group}
+
+    def _contents(group, kind):
+        try:
+            return group['id'], kind, listers[kind](client, group['id']), None
+        except Exception as e:  # noqa
+            return group['id'], kind, None, e
+
+    workspaces = {group['id']: dict(group) for group in groups}
+    failed = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for group_id, kind, items, error in pool.map(lambda task: _contents(*task),
+                                                     [(group, kind) for group in groups for kind in KINDS]):
+            if error is not None:
+                log(f"--- listing {kind} in {group_id} failed: {error} ---")
+                failed.setdefault(group_id, {'workspace': group_id, 'error': str(error)})
+            workspaces[group_id][kind] = items or []
+
+    # keep what the snapshot already knew about workspaces that couldn't be listed
+    complete = [w for group_id, w in workspaces.items() if group_id not in failed]
+    removed = [w['id'] for w in snapshot.workspaces() if w['id'] not in workspaces]
+    snapshot.update(complete, removed=removed, scanned_at=started, source='groups')
+    return {'source': 'groups', 'incremental': False, 'scanned': len(complete), 'removed': len(removed),
+            'failed': list(failed.values())}
+
+
+def refresh_inventory(client, snapshot, full=False, admin=True, max_workers=DEFAULT_MAX_WORKERS, timeout=600):
+    """
+    bring the snapshot up to date and return {'source', 'incremental', 'scanned', 'removed', 'failed'}.
+    with admin rights only the workspaces modified since the last admin scan are scanned again, unless
+    full=True or the last scan is older than the modified workspaces api looks back. when the admin apis
+    are denied (or admin=False) every workspace the principal is a member of is listed instead.
+    """
+    if admin:
+        try:
+            return _refresh_from_scans(client, snapshot, full, max_workers, timeout)
+        except AdminAccessDenied as e:
+            log(f"--- admin apis not available ({e}), listing workspaces one by one ---")
+    return _refresh_from_groups(client, snapshot, max_workers)
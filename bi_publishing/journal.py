@@ -0,0 +1,80 @@
+"""
+checkpoint journal for resumable publishes.
+
+publish_workspace appends a line to the journal whenever a dataset or report reaches a milestone
+(uploaded, imported, configured / rebound, refreshed), with the ids involved. when a run with the
+same inputs finds unfinished progress it resumes from there: objects that were already imported are
+reused once the service confirms they still exist, imports that were started are waited on instead
+of uploading the file again, and only the remaining steps run. once a run finishes, the next run
+with the same inputs starts over.
+"""
+import json
+import os
+import threading
+import time
+
+from .incremental import fingerprint
+
+
+def publish_run_key(group_id, mapping, tag, prefix, settings, refresh):
+    """
+    returns the key that ties journal entries to the inputs of one publish
+    """
+    return fingerprint('publish', group_id, mapping, tag, prefix, settings, refresh)
+
+
+class PublishJournal:
+    """
+    append-only json lines file of publish milestones, {'run', 'item', 'event', 'time', **ids} per line.
+    every line is flushed to disk before the step that wrote it returns, and a line torn by a crash is skipped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = []
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        self._entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+
+    def record(self, run, item, event, **fields):
+        entry = dict(fields, run=run, item=item, event=event, time=time.time())
+        with self._lock:
+            self._entries.append(entry)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry, sort_keys=True) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def reset(self, run, item):
+        """
+        forget the progress of the given item, e.g. after its import turned out to have failed
+        """
+        self.record(run, item, 'reset')
+
+    def finish(self, run):
+        """
+        mark the given run as done, so the next run with the same inputs starts over
+        """
+        self.record(run, None, 'finished')
+
+    def progress(self, run, item):
+        """
+        returns {event: latest entry} of the given item since the run last finished or the item was reset
+        """
+        events = {}
+        with self._lock:
+            for entry in self._entries:
+                if entry.get('run') != run:
+                    continue
+                if entry['event'] == 'finished' or (entry['item'] == item and entry['event'] == 'reset'):
+                    events = {}
+                elif entry['item'] == item:
+                    events[entry['event']] = entry
+        return events
@@ -0,0 +1,146 @@
+"""
+workspace membership sync.
+
+the users and security groups a workspace should have are compared with its current members as
+sets keyed by identifier: missing members are added, members with a different access right are
+updated and (optionally) members not in the desired list are removed. changes run concurrently
+through the client's rate limiter, across any number of workspaces at once.
+"""
+import concurrent.futures
+
+from . import (
+    add_user_to_group,
+    add_usergroup_to_group,
+    delete_user_from_group,
+    get_users_in_group,
+    update_user_in_group,
+)
+from .instrument import log
+
+DEFAULT_MAX_WORKERS = 8
+
+# service principals (the caller included) are only removed when protect_types is changed
+DEFAULT_PROTECT_TYPES = ('App',)
+
+
+def normalize_member(member):
+    """
+    returns {'identifier', 'access', 'principal_type'} for a dict with those keys, an (identifier, access)
+    tuple or an (identifier, access, principal_type) tuple. principal_type defaults to 'User'.
+    """
+    if isinstance(member, dict):
+        identifier, access = member['identifier'], member['access']
+        principal_type = member.get('principal_type', 'User')
+    else:
+        identifier, access, principal_type = (tuple(member) + ('User',))[:3]
+    return {'identifier': identifier, 'access': access, 'principal_type': principal_type}
+
+
+def _member_key(identifier):
+    # emails are case insensitive and object ids are compared in lower case too
+    return identifier.lower()
+
+
+def _current_identifier(user):
+    # the identifier the service matches an existing member by
+    return user.get('emailAddress') or user['identifier']
+
+
+def plan_membership(current, desired, remove=True, protect_types=DEFAULT_PROTECT_TYPES):
+    """
+    returns the [{'op': 'add'|'update'|'remove', 'identifier', 'access', 'principal_type'}] that turn the
+    current members (as returned by get_users_in_group) into the desired ones
+    """
+    members = {}
+    for user in current:
+        for identifier in (user.get('identifier'), user.get('emailAddress')):
+            if identifier:
+                members.setdefault(_member_key(identifier), user)
+
+    wanted = {}
+    for member in map(normalize_member, desired):
+        wanted[_member_key(member['identifier'])] = member
+
+    operations = []
+    for key, member in wanted.items():
+        user = members.get(key)
+        if user is None:
+            operations.append(dict(member, op='add'))
+        elif user.get('groupUserAccessRight') != member['access']:
+            # sent with the member's identifier as the service has it, which may differ in case or form
+            operations.append(dict(member, op='update', identifier=_current_identifier(user)))
+
+    if remove:
+        for user in current:
+            keys = {_member_key(i) for i in (user.get('identifier'), user.get('emailAddress')) if i}
+            if keys & wanted.keys() or user.get('principalType') in protect_types:
+                continue
+            operations.append({'op': 'remove', 'identifier': _current_identifier(user),
+                               'access': user.get('groupUserAccessRight'), 'principal_type': user.get('principalType')})
+    return operations
+
+
+def apply_member_operation(client, group_id, operation):
+    """
+    run one operation from plan_membership against the given group
+    """
+    op = operation['op']
+    if op == 'add' and operation['principal_type'] == 'User':
+        add_user_to_group(client, group_id, operation['identifier'], operation['access'])
+    elif op == 'add':
+        add_usergroup_to_group(client, operation['identifier'], operation['access'], group_id)
+    elif op == 'update':
+        update_user_in_group(client, group_id, operation['identifier'], operation['access'], operation['principal_type'])
+    elif op == 'remove':
+        delete_user_from_group(client, group_id, operation['identifier'])
+    else:
+        raise ValueError(f"unknown membership operation {op}")
+
+
+def sync_groups_membership(client, group_ids, desired, remove=True, protect_types=DEFAULT_PROTECT_TYPES,
+                           max_workers=DEFAULT_MAX_WORKERS, dry_run=False):
+    """
+    make the members of every given group match `desired` (see normalize_member).
+    `desired` is either one list applied to all groups or a {group_id: list} dict. with remove=False members
+    are only added and updated, e.g. to onboard an admin across the fleet.
+    members are listed concurrently and every change across all groups runs in one bounded pool.
+    returns {group_id: {'added': [...], 'updated': [...], 'removed': [...], 'failed': [...]}};
+    with dry_run nothing is changed and the changes are listed under 'planned'.
+    """
+    group_ids = list(group_ids)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        current = dict(zip(group_ids, pool.map(lambda group_id: get_users_in_group(client, group_id), group_ids)))
+
+        summaries = {}
+        work = []
+        for group_id in group_ids:
+            wanted = desired[group_id] if isinstance(desired, dict) else desired
+            operations = plan_membership(current[group_id], wanted, remove=remove, protect_types=protect_types)
+            summaries[group_id] = {'added': [], 'updated': [], 'removed': [], 'failed': []}
+            if dry_run:
+                summaries[group_id]['planned'] = operations
+            else:
+                work.extend((group_id, operation) for operation in operations)
+
+        def _run(item):
+            group_id, operation = item
+            try:
+                apply_member_operation(client, group_id, operation)
+            except Exception as e:  # noqa
+                log(f"--- membership {operation['op']} of {operation['identifier']} in {group_id} failed: {e} ---")
+                return group_id, dict(operation, error=str(e))
+            return group_id, operation
+
+        done = {'add': 'added', 'update': 'updated', 'remove': 'removed'}
+        for group_id, result in pool.map(_run, work):
+            summaries[group_id]['failed' if 'error' in result else done[result['op']]].append(result)
+    return summaries
+
+
+def sync_group_membership(client, group_id, desired, remove=True, protect_types=DEFAULT_PROTECT_TYPES,
+                          max_workers=DEFAULT_MAX_WORKERS, dry_run=False):
+    """
+    make the members of the given group match `desired`, see sync_groups_membership
+    """
+    return sync_groups_membership(client, [group_id], desired, remove=remove, protect_types=protect_types,
+                                  max_workers=max_workers, dry_run=dry_run)[group_id]
@@ -0,0 +1,637 @@
+"""
+local stand-in for the PowerBI REST api, for benchmarks and offline runs.
+
+MockPowerBIServer serves the endpoints this library uses from memory: groups, users, capacities,
+imports (with temporary upload locations), datasets, reports, dashboards, parameters, datasources,
+refreshes, pages and the admin workspace scan, plus integration hub downloads. latency, throttling (429 with Retry-After),
+import processing time and the delay before new objects show up in list calls are configurable.
+
+the library builds absolute api.powerbi.com urls, so clients talk to the server through a requests
+session that rewrites every https url to the local server (see MockPowerBIServer.session). request
+bodies are read in chunks and discarded, so large uploads don't grow the server's memory.
+
+    with MockPowerBIServer(latency=0.02) as server:
+        client = server.client()
+        bi_publishing.create_group(client, "test")
+"""
+import calendar
+import http.server
+import json
+import math
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+
+import requests
+
+from . import DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE, PowerBIClient
+from .instrument import endpoint_template
+
+_API_PREFIX = '/api.powerbi.com/v1.0/myorg/'
+_BLOB_PREFIX = '/mockblob.local/uploads/'
+_HUB_PATH = re.compile(r'^/github\.com/cienai/IntegrationHub/raw/(?P<tag>[^/]+)/powerbi/(?P<filename>.+)$')
+_READ_CHUNK_SIZE = 1024 * 1024
+
+
+class _RewriteAdapter(requests.adapters.HTTPAdapter):
+    """
+    transport adapter that sends https://<host>/<path> to <server>/<host>/<path>
+    """
+
+    def __init__(self, server_url, **kwargs):
+        super().__init__(**kwargs)
+        self.server_url = server_url
+
+    def send(self, request, **kwargs):
+        parts = urllib.parse.urlsplit(request.url)
+        if parts.scheme == 'https':
+            query = f"?{parts.query}" if parts.query else ''
+            request.url = f"{self.server_url}/{parts.netloc}{parts.path}{query}"
+        return super().send(request, **kwargs)
+
+
+class _Throttle:
+    """
+    token bucket that answers whether a request may go through now, and if not how long to wait
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+
+class _HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _new_id():
+    return str(uuid.uuid4())
+
+
+def _filter_groups(groups, expression):
+    """
+    evaluates the $filter forms used against groups: name eq '..', startswith(name,'..'), contains(name,'..'),
+    id eq '..', joined with ' or '
+    """
+    matchers = []
+    for clause in re.split(r'\s+or\s+', expression.strip()):
+        m = re.fullmatch(r"(name|id)\s+eq\s+'((?:[^']|'')*)'", clause.strip())
+        if m:
+            key, value = m.group(1), m.group(2).replace("''", "'")
+            matchers.append(lambda g, key=key, value=value: g[key] == value)
+            continue
+        m = re.fullmatch(r"(startswith|contains)\(name,\s*'((?:[^']|'')*)'\)", clause.strip())
+        if m:
+            func, value = m.group(1), m.group(2).replace("''", "'")
+            if func == 'startswith':
+                matchers.append(lambda g, value=value: g['name'].startswith(value))
+            else:
+                matchers.append(lambda g, value=value: value in g['name'])
+            continue
+        raise _HttpError(400, f"unsupported $filter: {clause}")
+    return [g for g in groups if any(match(g) for match in matchers)]
+
+
+class MockPowerBIServer:
+    """
+    in-memory PowerBI service on a local port.
+
+    latency: seconds added to every request
+    import_delay: seconds an import stays in the Publishing state
+    visibility_delay: seconds before new datasets and reports show up in list calls
+    refresh_duration: seconds a refresh stays in progress
+    scan_duration: seconds an admin workspace scan stays running
+    admin: whether the admin apis answer, otherwise they return 401
+    throttle_rate / throttle_burst: requests per second (and burst) before 429s are returned
+    """
+
+    def __init__(self, latency=0.0, import_delay=0.2, visibility_delay=0.0, refresh_duration=0.5,
+                 scan_duration=0.2, admin=True, throttle_rate=None, throttle_burst=None, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.import_delay = import_delay
+        self.visibility_delay = visibility_delay
+        self.refresh_duration = refresh_duration
+        self.scan_duration = scan_duration
+        self.admin = admin
+        self.throttle = _Throttle(throttle_rate, throttle_burst) if throttle_rate else None
+        self.groups = {}
+        self.capacities = {}
+        self.imports = {}
+        self.uploads = {}
+        self.datasources = {}
+        self.scans = {}
+        # id -> time.time() of workspaces deleted, reported by the modified workspaces admin api
+        self.deleted_groups = {}
+        self.files = {}
+        self.calls = {}
+        self.bytes_received = 0
+        self.throttled = 0
+        self._lock = threading.RLock()
+        self._httpd = http.server.ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    # ---- lifecycle
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-powerbi", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def session(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE):
+        """
+        returns a requests session that sends every https request to this server
+        """
+        session = requests.Session()
+        session.mount('https://', _RewriteAdapter(self.url, pool_connections=pool_connections, pool_maxsize=pool_maxsize))
+        return session
+
+    def client(self, **kwargs):
+        """
+        returns a PowerBIClient connected to this server, kwargs go to PowerBIClient
+        """
+        pool = {k: kwargs.pop(k) for k in ('pool_connections', 'pool_maxsize') if k in kwargs}
+        return PowerBIClient('mock-token', session=self.session(**pool), **kwargs)
+
+    def async_client(self, **kwargs):
+        """
+        returns an aio.AsyncPowerBIClient connected to this server, kwargs go to AsyncPowerBIClient
+        """
+        import httpx
+        from .aio import AsyncPowerBIClient
+
+        server_url = self.url
+
+        class _RewriteTransport(httpx.AsyncHTTPTransport):
+            async def handle_async_request(self, request):
+                if request.url.scheme == 'https':
+                    # raw_path keeps the percent encoding and the query
+                    request.url = httpx.URL(f"{server_url}/{request.url.host}{request.url.raw_path.decode()}")
+                return await super().handle_async_request(request)
+
+        return AsyncPowerBIClient('mock-token', http_client=httpx.AsyncClient(transport=_RewriteTransport()), **kwargs)
+
+    # ---- fixtures
+
+    def add_capacity(self, name, sku='A1', region='West Europe', state='Active', access_right='Admin'):
+        capacity = {'id': _new_id().upper(), 'displayName': name, 'sku': sku, 'region': region, 'state': state,
+                    'admins': [], 'capacityUserAccessRight': access_right}
+        with self._lock:
+            self.capacities[capacity['id']] = capacity
+        return capacity
+
+    def add_file(self, tag, filename, path):
+        """
+        serve the file at `path` as the integration hub file (tag, filename)
+        """
+        self.files[(tag, filename)] = path
+
+    def call_counts(self):
+        """
+        returns {(method, endpoint template): number of calls}
+        """
+        with self._lock:
+            return dict(self.calls)
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls = {}
+            self.bytes_received = 0
+            self.throttled = 0
+
+    # ---- request handling
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                server._dispatch(self)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+        return Handler
+
+    def _read_body(self, handler, keep):
+        """
+        read the request body; only small json bodies are kept, uploads are counted and discarded
+        """
+        length = int(handler.headers.get('Content-Length') or 0)
+        kept = []
+        remaining = length
+        while remaining:
+            chunk = handler.rfile.read(min(_READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            if keep:
+                kept.append(chunk)
+        with self._lock:
+            self.bytes_received += length
+        return b''.join(kept)
+
+    def _send(self, handler, status, body=None, headers=None):
+        payload = b'' if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode())
+        handler.send_response(status)
+        if body is not None and not isinstance(body, bytes):
+            handler.send_header('Content-Type', 'application/json')
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.send_header('Content-Length', str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _dispatch(self, handler):
+        parts = urllib.parse.urlsplit(handler.path)
+        path = urllib.parse.unquote(parts.path)
+        query = {k: v[-1] for k, v in urllib.parse.parse_qs(parts.query).items()}
+        method = handler.command
+        uploaded_file = handler.headers.get('Content-Type', '').startswith('multipart/') or path.startswith(_BLOB_PREFIX)
+        body = self._read_body(handler, keep=not uploaded_file)
+
+        with self._lock:
+            key = (method, endpoint_template('https:/' + parts.path))
+            self.calls[key] = self.calls.get(key, 0) + 1
+
+        if self.latency:
+            time.sleep(self.latency)
+        if self.throttle is not None and path.startswith(_API_PREFIX):
+            wait = self.throttle.retry_after()
+            if wait:
+                with self._lock:
+                    self.throttled += 1
+                return self._send(handler, 429, {'error': {'code': 'TooManyRequests'}},
+                                  {'Retry-After': str(max(1, math.ceil(wait)))})
+
+        try:
+            if path.startswith(_API_PREFIX):
+                data = json.loads(body) if body else {}
+                status, result, headers = self._api(method, path[len(_API_PREFIX):].rstrip('/'), query, data,
+                                                    handler.headers)
+            elif path.startswith(_BLOB_PREFIX):
+                status, result, headers = self._blob(method, path[len(_BLOB_PREFIX):], query, handler.headers)
+            elif _HUB_PATH.match(path):
+                return self._download(handler, **_HUB_PATH.match(path).groupdict())
+            else:
+                raise _HttpError(404, f"unknown path {path}")
+        except _HttpError as e:
+            status, result, headers = e.status, {'error': {'code': str(e.status), 'message': e.message}}, None
+        self._send(handler, status, result, headers)
+
+    def _download(self, handler, tag, filename):
+        path = self.files.get((tag, filename))
+        if path is None:
+            return self._send(handler, 404, {'error': 'not found'})
+        with open(path, 'rb') as f:
+            f.seek(0, 2)
+            size = f.tell()
+            f.seek(0)
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'application/octet-stream')
+            handler.send_header('Content-Length', str(size))
+            handler.end_headers()
+            for chunk in iter(lambda: f.read(_READ_CHUNK_SIZE), b''):
+                handler.wfile.write(chunk)
+
+    # ---- api
+
+    def _group(self, group_id):
+        group = self.groups.get(group_id)
+        if group is None:
+            raise _HttpError(404, f"group {group_id} not found")
+        return group
+
+    def _item(self, group, kind, item_id):
+        item = group[kind].get(item_id)
+        if item is None:
+            raise _HttpError(404, f"{kind} {item_id} not found")
+        return item
+
+    @staticmethod
+    def _visible(items):
+        now = time.monotonic()
+        return [{k: v for k, v in item.items() if not k.startswith('_')} for item in items.values()
+                if item.get('_visible_at', 0) <= now]
+
+    def _api(self, method, path, query, data, headers):
+        segments = path.split('/')
+        with self._lock:
+            if segments[0] == 'groups':
+                return self._groups_api(method, segments[1:], query, data)
+            if segments[0] == 'capacities' and method == 'GET':
+                return 200, {'value': list(self.capacities.values())}, None
+            if segments[0] == 'gateways' and len(segments) == 4 and method == 'PATCH':
+                datasource = self.datasources.get((segments[1], segments[3]))
+                if datasource is None:
+                    raise _HttpError(404, "datasource not found")
+                datasource['_credentials'] = data.get('credentialDetails')
+                return 200, None, None
+            if segments[:2] == ['admin', 'workspaces']:
+                return self._admin_api(method, segments[2:], query, data)
+        raise _HttpError(404, f"unknown endpoint {method} {path}")
+
+    def _groups_api(self, method, segments, query, data):
+        if not segments:
+            if method == 'GET':
+                groups = [{k: v for k, v in g.items() if not k.startswith('_') and k not in
+                           ('datasets', 'reports', 'dashboards', 'users')} for g in self.groups.values()]
+                if '$filter' in query:
+                    groups = _filter_groups(groups, query['$filter'])
+                skip = int(query.get('$skip', 0))
+                top = int(query.get('$top', len(groups)))
+                return 200, {'value': groups[skip:skip + top]}, None
+            if method == 'POST':
+                if any(g['name'] == data['name'] for g in self.groups.values()):
+                    raise _HttpError(409, f"group {data['name']} already exists")
+                group = {'id': _new_id(), 'name': data['name'], 'isOnDedicatedCapacity': False,
+                         'datasets': {}, 'reports': {}, 'dashboards': {}, 'users': {}, '_modified_at': time.time()}
+                self.groups[group['id']] = group
+                return 200, {'id': group['id'], 'name': group['name']}, None
+
+        group = self._group(segments[0])
+        rest = segments[1:]
+        if method != 'GET':
+            group['_modified_at'] = time.time()
+        if not rest:
+            if method == 'PATCH':
+                group.update({k: v for k, v in data.items() if k in ('name', 'defaultDatasetStorageFormat')})
+                return 200, None, None
+            if method == 'DELETE':
+                del self.groups[group['id']]
+                self.deleted_groups[group['id']] = time.time()
+                return 200, None, None
+        elif rest == ['AssignToCapacity'] and method == 'POST':
+            capacity_id = data.get('capacityId')
+            if capacity_id not in self.capacities:
+                raise _HttpError(400, f"capacity {capacity_id} not found")
+            group['capacityId'] = capacity_id
+            group['isOnDedicatedCapacity'] = True
+            return 200, None, None
+        elif rest[0] == 'users':
+            return self._users_api(method, group, rest[1:], data)
+        elif rest[0] == 'imports':
+            return self._imports_api(method, group, rest[1:], query, data)
+        elif rest[0] in ('datasets', 'reports', 'dashboards'):
+            kind = rest[0]
+            if len(rest) == 1 and method == 'GET':
+                return 200, {'value': self._visible(group[kind])}, None
+            item = self._item(group, kind, rest[1])
+            if len(rest) == 2 and method == 'DELETE':
+                del group[kind][item['id']]
+                return 200, None, None
+            if kind == 'datasets':
+                return self._dataset_api(method, group, item, rest[2:], query, data)
+            if kind == 'reports':
+                return self._report_api(method, group, item, rest[2:], data)
+        raise _HttpError(404, f"unknown endpoint {method} groups/{'/'.join(segments)}")
+
+    def _admin_api(self, method, rest, query, data):
+        if not self.admin:
+            raise _HttpError(401, "the principal can't use the admin apis")
+        if rest == ['modified'] and method == 'GET':
+            since = 0
+            if 'modifiedSince' in query:
+                since = calendar.timegm(time.strptime(query['modifiedSince'][:19], '%Y-%m-%dT%H:%M:%S'))
+            modified = [g['id'] for g in self.groups.values() if g.get('_modified_at', 0) >= since]
+            modified += [group_id for group_id, deleted_at in self.deleted_groups.items()
+                         if 'modifiedSince' in query and deleted_at >= since]
+            return 200, [{'id': group_id} for group_id in modified], None
+        if rest == ['getInfo'] and method == 'POST':
+            workspace_ids = data.get('workspaces') or []
+            if len(workspace_ids) > 100:
+                raise _HttpError(400, "at most 100 workspaces per scan")
+            scan = {'id': _new_id(), 'workspaces': workspace_ids, '_ready_at': time.monotonic() + self.scan_duration}
+            self.scans[scan['id']] = scan
+            return 202, {'id': scan['id'], 'status': 'NotStarted'}, None
+        if len(rest) == 2 and rest[0] in ('scanStatus', 'scanResult') and method == 'GET':
+            scan = self.scans.get(rest[1])
+            if scan is None:
+                raise _HttpError(404, f"scan {rest[1]} not found")
+            done = time.monotonic() >= scan['_ready_at']
+            if rest[0] == 'scanStatus':
+                return 200, {'id': scan['id'], 'status': 'Succeeded' if done else 'Running'}, None
+            if not done:
+                raise _HttpError(400, f"scan {scan['id']} isn't finished")
+            return 200, {'workspaces': [self._scanned_workspace(group_id) for group_id in scan['workspaces']]}, None
+        raise _HttpError(404, f"unknown endpoint {method} admin/workspaces/{'/'.join(rest)}")
+
+    def _scanned_workspace(self, group_id):
+        group = self.groups.get(group_id)
+        if group is None:
+            return {'id': group_id, 'state': 'Deleted'}
+        workspace = {k: v for k, v in group.items() if not k.startswith('_') and k not in
+                     ('datasets', 'reports', 'dashboards', 'users')}
+        workspace.update(type='Workspace', state='Active')
+        for kind in ('datasets', 'reports', 'dashboards'):
+            workspace[kind] = self._visible(group[kind])
+        for report in workspace['reports']:
+            modified = group['reports'][report['id']]['_modified_at']
+            report['modifiedDateTime'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(modified)) + \
+                f".{int(modified % 1 * 1000):03d}Z"
+        return workspace
+
+    def _users_api(self, method, group, rest, data):
+        if method == 'GET' and not rest:
+            return 200, {'value': list(group['users'].values())}, None
+        if method in ('POST', 'PUT') and not rest:
+            identifier = data.get('identifier') or data.get('emailAddress')
+            if method == 'PUT' and identifier not in group['users']:
+                raise _HttpError(404, f"user {identifier} not in group")
+            group['users'][identifier] = {
+                'identifier': identifier, 'emailAddress': data.get('emailAddress'),
+                'groupUserAccessRight': data['groupUserAccessRight'],
+                'principalType': data.get('principalType', 'User'),
+            }
+            return 200, None, None
+        if method == 'DELETE' and rest:
+            if group['users'].pop(urllib.parse.unquote(rest[0]), None) is None:
+                raise _HttpError(404, "user not in group")
+            return 200, None, None
+        raise _HttpError(404, "unknown users endpoint")
+
+    def _new_dataset(self, group, name):
+        dataset = {'id': _new_id(), 'name': name, 'isRefreshable': True, 'configuredBy': 'mock',
+                   '_visible_at': time.monotonic() + self.visibility_delay, '_refreshes': [],
+                   '_parameters': {'db_name': '', 'db_server_postgres': 'INVALID_HOST',
+                                   'db_server_sql': 'INVALID_HOST', 'db_type': 'PostgresSQL'}}
+        datasource = {'datasourceType': 'PostgreSql', 'gatewayId': _new_id(), 'datasourceId': _new_id(),
+                      'connectionDetails': {'server': 'INVALID_HOST', 'database': ''}}
+        self.datasources[(datasource['gatewayId'], datasource['datasourceId'])] = datasource
+        dataset['_datasources'] = [datasource]
+        group['datasets'][dataset['id']] = dataset
+        return dataset
+
+    def _new_report(self, group, name, dataset_id=None):
+        report = {'id': _new_id(), 'name': name, 'datasetId': dataset_id, 'reportType': 'PowerBIReport',
+                  'webUrl': f"https://app.powerbi.com/groups/{group['id']}/reports/",
+                  '_visible_at': time.monotonic() + self.visibility_delay, '_modified_at': time.time(),
+                  '_pages': [{'name': f"ReportSection{i}", 'displayName': f"Page {i + 1}", 'order': i}
+                             for i in range(3)]}
+        report['webUrl'] += report['id']
+        group['reports'][report['id']] = report
+        return report
+
+    def _imports_api(self, method, group, rest, query, data):
+        if method == 'POST' and rest == ['createTemporaryUploadLocation']:
+            upload_id = _new_id()
+            self.uploads[upload_id] = {'uncommitted': set(), 'committed': False}
+            return 200, {'url': f"https://mockblob.local/uploads/{upload_id}?sv=mock&sig=mock",
+                         'expirationTime': '2099-01-01T00:00:00Z'}, None
+        if method == 'POST' and not rest:
+            if 'fileUrl' in data:
+                upload_id = urllib.parse.urlsplit(data['fileUrl']).path.rsplit('/', 1)[-1]
+                if not self.uploads.get(upload_id, {}).get('committed'):
+                    raise _HttpError(400, "temporary upload location has no committed blob")
+            name = query.get('datasetDisplayName', 'import')
+            conflict = query.get('nameConflict', 'Ignore')
+            report_only = query.get('skipReport') != 'true'
+            kind = 'reports' if report_only else 'datasets'
+            existing = next((item for item in group[kind].values() if item['name'] == name), None)
+            if existing is not None and conflict == 'Abort':
+                raise _HttpError(409, f"{name} already exists")
+            if existing is None and conflict == 'Overwrite':
+                raise _HttpError(404, f"{name} doesn't exist")
+            if existing is not None and conflict in ('Overwrite', 'CreateOrOverwrite'):
+                existing['_visible_at'] = time.monotonic() + self.visibility_delay
+                existing['_modified_at'] = time.time()
+                obj = existing
+            elif report_only:
+                obj = self._new_report(group, name)
+            else:
+                obj = self._new_dataset(group, name)
+            imp = {'id': _new_id(), 'name': name, '_ready_at': time.monotonic() + self.import_delay,
+                   '_kind': kind, '_object_id': obj['id'], '_group_id': group['id']}
+            self.imports[imp['id']] = imp
+            return 202, {'id': imp['id']}, None
+        if method == 'GET' and len(rest) == 1:
+            imp = self.imports.get(rest[0])
+            if imp is None:
+                raise _HttpError(404, f"import {rest[0]} not found")
+            result = {'id': imp['id'], 'name': imp['name'], 'importState': 'Publishing', 'datasets': [], 'reports': []}
+            if time.monotonic() >= imp['_ready_at']:
+                obj = group[imp['_kind']].get(imp['_object_id'])
+                result['importState'] = 'Succeeded' if obj is not None else 'Failed'
+                if obj is not None:
+                    result[imp['_kind']] = [{'id': obj['id'], 'name': obj['name']}]
+            return 200, result, None
+        raise _HttpError(404, "unknown imports endpoint")
+
+    def _dataset_api(self, method, group, dataset, rest, query, data):
+        if rest == ['parameters'] and method == 'GET':
+            return 200, {'value': [{'name': k, 'currentValue': v, 'type': 'Text', 'isRequired': True}
+                                   for k, v in dataset['_parameters'].items()]}, None
+        if rest == ['Default.UpdateParameters'] and method == 'POST':
+            for detail in data.get('updateDetails', []):
+                dataset['_parameters'][detail['name']] = detail['newValue']
+            return 200, None, None
+        if rest == ['Default.TakeOver'] and method == 'POST':
+            dataset['configuredBy'] = 'mock-takeover'
+            return 200, None, None
+        if rest == ['datasources'] and method == 'GET':
+            return 200, {'value': [{k: v for k, v in d.items() if not k.startswith('_')}
+                                   for d in dataset['_datasources']]}, None
+        if rest and rest[0] == 'refreshes':
+            return self._refresh_api(method, group, dataset, rest[1:], query, data)
+        raise _HttpError(404, "unknown dataset endpoint")
+
+    def _refresh_api(self, method, group, dataset, rest, query, data):
+        now = time.monotonic()
+        for refresh in dataset['_refreshes']:
+            if refresh['status'] == 'Unknown' and now >= refresh['_done_at']:
+                refresh['status'] = 'Completed'
+                refresh['endTime'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        if method == 'POST' and not rest:
+            if any(r['status'] == 'Unknown' for r in dataset['_refreshes']):
+                raise _HttpError(400, "a refresh is already in progress")
+            refresh = {'requestId': _new_id(), 'id': len(dataset['_refreshes']) + 1,
+                       'refreshType': 'ViaEnhancedApi' if data else 'ViaApi', 'status': 'Unknown',
+                       'startTime': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                       '_done_at': now + self.refresh_duration}
+            dataset['_refreshes'].insert(0, refresh)
+            location = (f"https://api.powerbi.com/v1.0/myorg/groups/{group['id']}/datasets/{dataset['id']}"
+                        f"/refreshes/{refresh['requestId']}")
+            headers = {'RequestId': refresh['requestId']}
+            if data:
+                headers['Location'] = location
+            return 202, None, headers
+        if method == 'GET':
+            refreshes = [{k: v for k, v in r.items() if not k.startswith('_')} for r in dataset['_refreshes']]
+            if not rest:
+                return 200, {'value': refreshes[:int(query.get('$top', len(refreshes)))]}, None
+            for refresh in refreshes:
+                if refresh['requestId'] == rest[0]:
+                    return 200, refresh, None
+        raise _HttpError(404, "unknown refresh endpoint")
+
+    def _report_api(self, method, group, report, rest, data):
+        if rest == ['Rebind'] and method == 'POST':
+            if data.get('datasetId') not in group['datasets']:
+                raise _HttpError(400, "dataset not found")
+            report['datasetId'] = data['datasetId']
+            return 200, None, None
+        if rest == ['pages'] and method == 'GET':
+            return 200, {'value': report['_pages']}, None
+        if rest == ['UpdateReportContent'] and method == 'POST':
+            return 200, {k: v for k, v in report.items() if not k.startswith('_')}, None
+        if rest == ['Clone'] and method == 'POST':
+            target = self._group(data.get('targetWorkspaceId') or group['id'])
+            clone = self._new_report(target, data['name'], data.get('targetModelId', report['datasetId']))
+            return 200, {k: v for k, v in clone.items() if not k.startswith('_')}, None
+        raise _HttpError(404, "unknown report endpoint")
+
+    def _blob(self, method, path, query, headers):
+        with self._lock:
+            upload = self.uploads.get(path)
+            if upload is None:
+                raise _HttpError(404, "blob not found")
+            comp = query.get('comp')
+            if method == 'PUT' and comp == 'block':
+                upload['uncommitted'].add(query['blockid'])
+                return 201, None, None
+            if method == 'PUT' and comp == 'blocklist':
+                upload['committed'] = True
+                return 201, None, None
+            if method == 'GET' and comp == 'blocklist':
+                names = ''.join(f"<Block><Name>{b}</Name></Block>" for b in sorted(upload['uncommitted']))
+                xml = f'<?xml version="1.0" encoding="utf-8"?><BlockList><UncommittedBlocks>{names}' \
+                      f'</UncommittedBlocks></BlockList>'
+                return 200, xml.encode(), {'Content-Type': 'application/xml'}
+        raise _HttpError(400, "unsupported blob operation")
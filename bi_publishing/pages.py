@@ -0,0 +1,186 @@
+"""
+page urls for every report in many workspaces.
+
+`get_page_urls_for_groups` lists the reports of the given workspaces (or reads them from an
+InventorySnapshot) and fetches their pages concurrently, yielding each report as soon as its pages
+are known, so a navigation index can be written while the rest is still being fetched.
+
+with a PageCache a report is only fetched again when its modification marker changed. the marker
+is the report's modifiedDateTime, which only the admin workspace scan reports: without a snapshot
+caching is ttl only, and a report is fetched again once its cache entry is older than the cache's ttl.
+a republished report keeps its id, so publish_workspace invalidates the entries of the reports it
+imports when it is given the cache.
+"""
+import concurrent.futures
+import json
+import os
+import threading
+import time
+
+from . import _page_urls, get_pages_for_report, get_reports_in_group
+from .instrument import log
+
+DEFAULT_MAX_WORKERS = 8
+# seconds a cached entry without a modification marker is trusted
+DEFAULT_TTL = 24 * 3600
+# report types that have no pages endpoint
+PAGELESS_REPORT_TYPES = frozenset(['PaginatedReport'])
+
+
+def report_marker(report):
+    """
+    returns the value that changes when the given report is modified, or None if the listing has none
+    """
+    return report.get('modifiedDateTime')
+
+
+class PageCache:
+    """
+    json file of {report id: {'marker', 'fetched_at', 'pages'}}. without a path the cache lives in memory.
+    entries are written in batches of `save_every` and when a run finishes; writes are atomic.
+    entries without a marker (reports listed without an inventory snapshot) are trusted for `ttl` seconds
+    or until they are invalidated.
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, save_every=100):
+        self.path = path
+        self.ttl = ttl
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._unsaved = 0
+        if path:
+            try:
+                with open(path) as f:
+                    self._entries = json.load(f)
+            except FileNotFoundError:
+                pass
+
+    def get(self, report_id, marker):
+        """
+        returns the cached pages of the given report if they are still valid for the marker, otherwise None
+        """
+        with self._lock:
+            entry = self._entries.get(report_id)
+        if entry is None or entry['marker'] != marker:
+            return None
+        if marker is None and time.time() - entry['fetched_at'] > self.ttl:
+            return None
+        return entry['pages']
+
+    def put(self, report_id, marker, pages):
+        with self._lock:
+            self._entries[report_id] = {'marker': marker, 'fetched_at': time.time(), 'pages': pages}
+            self._unsaved += 1
+            due = self._unsaved >= self.save_every
+        if due:
+            self.save()
+
+    def invalidate(self, report_id):
+        """
+        drop the cached pages of the given report, e.g. after it was republished
+        """
+        with self._lock:
+            if self._entries.pop(report_id, None) is None:
+                return
+            self._unsaved += 1
+            due = self._unsaved >= self.save_every
+        if due:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            if not self.path or not self._unsaved:
+                return
+            temp_path = self.path + '.temp'
+            with open(temp_path, 'w') as f:
+                json.dump(self._entries, f, separators=(',', ':'), sort_keys=True)
+            os.replace(temp_path, self.path)
+            self._unsaved = 0
+
+
+def _result(group_id, report, pages):
+    return {'group_id': group_id, 'report_id': report['id'], 'report_name': report.get('name'),
+            'pages': _page_urls(group_id, report['id'], pages, report.get('webUrl'))}
+
+
+def get_page_urls_for_groups(client, group_ids, cache=None, snapshot=None, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    yields {'group_id', 'report_id', 'report_name', 'pages': [{'page_name', 'page_id', 'page_url'}]} for every
+    report in the given workspaces, in the order they complete. a report whose pages couldn't be read is
+    yielded with 'error' instead of 'pages', and a workspace whose reports couldn't be listed is yielded as
+    {'group_id', 'error'}. with a snapshot (see bi_publishing.inventory) the reports are taken from it instead
+    of being listed, and with a cache unchanged reports are answered without a request.
+    """
+    group_ids = list(group_ids)
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    pending = {}
+
+    def _fetch(group_id, report):
+        pages = get_pages_for_report(client, group_id, report['id'])
+        if cache is not None:
+            cache.put(report['id'], report_marker(report), pages)
+        return pages
+
+    def _reports(group_id, reports):
+        """
+        returns the results of cached reports and queues the others
+        """
+        results = []
+        for report in reports:
+            if report.get('reportType') in PAGELESS_REPORT_TYPES:
+                continue
+            pages = cache.get(report['id'], report_marker(report)) if cache is not None else None
+            if pages is not None:
+                results.append(_result(group_id, report, pages))
+            else:
+                pending[pool.submit(_fetch, group_id, report)] = ('report', group_id, report)
+        return results
+
+    try:
+        listed = 0
+        if snapshot is not None:
+            for group_id in group_ids:
+                workspace = snapshot.workspace(group_id)
+                if workspace is None:
+                    yield {'group_id': group_id, 'error': f"workspace {group_id} isn't in the inventory snapshot"}
+                    continue
+                listed += len(workspace['reports'])
+                yield from _reports(group_id, workspace['reports'])
+        else:
+            for group_id in group_ids:
+                pending[pool.submit(get_reports_in_group, client, group_id)] = ('group', group_id, None)
+
+        fetched = 0
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                kind, group_id, report = pending.pop(future)
+                error = future.exception()
+                if kind == 'group':
+                    if error is not None:
+                        log(f"--- listing reports in {group_id} failed: {error} ---")
+                        yield {'group_id': group_id, 'error': str(error)}
+                        continue
+                    listed += len(future.result())
+                    yield from _reports(group_id, future.result())
+                elif error is not None:
+                    log(f"--- reading the pages of report {report['id']} failed: {error} ---")
+                    yield {'group_id': group_id, 'report_id': report['id'], 'report_name': report.get('name'),
+                           'error': str(error)}
+                else:
+                    fetched += 1
+                    yield _result(group_id, report, future.result())
+        log(f"--- page urls: {listed} reports, {fetched} fetched ---")
+    finally:
+        # a caller that stops early doesn't wait for the fetches it no longer needs
+        pool.shutdown(wait=True, cancel_futures=True)
+        if cache is not None:
+            cache.save()
+
+
+def get_page_urls_for_group(client, group_id, cache=None, snapshot=None, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    yields the page urls of every report in the given workspace, see get_page_urls_for_groups
+    """
+    return get_page_urls_for_groups(client, [group_id], cache=cache, snapshot=snapshot, max_workers=max_workers)
@@ -0,0 +1,339 @@
+"""
+PBIX archive rewriting.
+
+a PBIX file is a zip archive. connecting or disconnecting a report only changes its `Connections`
+member, so every other member (DataModel is often hundreds of MB) is copied as raw compressed bytes
+instead of being inflated and compressed again. memory use is bounded by the copy chunk size.
+
+for rolling one report out to many workspaces, PbixTemplate prepares the disconnected archive once;
+each connected variant is then that archive's bytes plus a small generated tail (the Connections
+member and a new central directory), written with a plain file copy or streamed straight to upload.
+
+the raw copy and the generated tail use zipfile internals. on a Python whose zipfile lacks them,
+members are recompressed through the public api instead: slower, but the archives are the same.
+"""
+import concurrent.futures
+import copy
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+
+CONNECTIONS_MEMBER = 'Connections'
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+_LOCAL_HEADER_SIZE = 30
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+_FLAG_ENCRYPTED = 0x01
+_FLAG_DATA_DESCRIPTOR = 0x08
+# private zipfile attributes the raw copy and PbixTemplate.tail rely on
+_ZIP_INTERNALS = ('fp', 'start_dir', 'filelist', 'NameToInfo', '_didModify')
+
+
+def _has_zip_internals(zip_file):
+    return hasattr(zipfile, '_strip_extra') and all(hasattr(zip_file, name) for name in _ZIP_INTERNALS)
+
+
+def connections_content(group_id, dataset_id):
+    """
+    returns the Connections member that live-connects a report to the given group and dataset
+    """
+    connection_string = f"Data Source=pbiazure://api.powerbi.com;Initial Catalog={group_id};Identity Provider=\"https://login.microsoftonline.com/common, https://analysis.windows.net/powerbi/api, 7f67af8a-fedc-4b08-8b4e-37c4d127b6cf\";Integrated Security=ClaimsToken"
+    content = {
+        "Version": 3,
+        "Connections": [
+            {
+                "Name": "EntityDataSource",
+                "ConnectionString": connection_string,
+                "ConnectionType": "pbiServiceLive",
+                "PbiServiceModelId": 617430,
+                "PbiModelVirtualServerName": "sobe_wowvirtualserver",
+                "PbiModelDatabaseName": dataset_id
+            }
+        ]
+    }
+    return json.dumps(content)
+
+
+def _member_data_offset(src, info):
+    """
+    returns the offset of the compressed data of the given member in the open source archive
+    """
+    src.seek(info.header_offset)
+    header = src.read(_LOCAL_HEADER_SIZE)
+    if len(header) != _LOCAL_HEADER_SIZE or header[:4] != _LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f"bad local header for {info.filename}")
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    return info.header_offset + _LOCAL_HEADER_SIZE + name_length + extra_length
+
+
+def _copy_raw_member(src, zip_write, info):
+    """
+    append the given member of the open source archive to zip_write without decompressing it.
+    zipfile has no public api for this, so the entry is registered with zip_write the same way
+    ZipFile.writestr does and its central directory record is written on close.
+    """
+    if info.flag_bits & _FLAG_ENCRYPTED:
+        raise ValueError(f"encrypted member {info.filename} can't be copied")
+
+    src.seek(_member_data_offset(src, info))
+
+    new_info = copy.copy(info)
+    # crc and sizes are known, so they go in the local header instead of a trailing data descriptor
+    new_info.flag_bits &= ~_FLAG_DATA_DESCRIPTOR
+    # zip64 sizes are re-added by FileHeader and on close when needed
+    new_info.extra = zipfile._strip_extra(info.extra, (1,))
+
+    zip_write.fp.seek(zip_write.start_dir)
+    new_info.header_offset = zip_write.fp.tell()
+    zip_write.fp.write(new_info.FileHeader())
+
+    remaining = info.compress_size
+    while remaining:
+        chunk = src.read(min(_COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"truncated data for {info.filename}")
+        zip_write.fp.write(chunk)
+        remaining -= len(chunk)
+
+    zip_write.filelist.append(new_info)
+    zip_write.NameToInfo[new_info.filename] = new_info
+    zip_write.start_dir = zip_write.fp.tell()
+    zip_write._didModify = True
+
+
+def _recompress_member(zip_read, zip_write, info):
+    """
+    append the given member to zip_write through the public zipfile api, inflating and compressing it again
+    """
+    new_info = zipfile.ZipInfo(info.filename, info.date_time)
+    new_info.compress_type = info.compress_type
+    new_info.external_attr = info.external_attr
+    new_info.comment = info.comment
+    with zip_read.open(info) as member, \
+            zip_write.open(new_info, 'w', force_zip64=info.file_size >= zipfile.ZIP64_LIMIT) as out:
+        shutil.copyfileobj(member, out, _COPY_CHUNK_SIZE)
+
+
+def _central_directory_offset(zip_read, path):
+    """
+    returns where the central directory of the given open archive starts, i.e. the size of everything before it.
+    the archives measured here are written to seekable files, so their members have no trailing data descriptor.
+    """
+    if hasattr(zip_read, 'start_dir'):
+        return zip_read.start_dir
+    end = 0
+    with open(path, 'rb') as src:
+        for info in zip_read.infolist():
+            end = max(end, _member_data_offset(src, info) + info.compress_size)
+    return end
+
+
+def rewrite_pbix(pbix_path, output=None, remove=(), add=None):
+    """
+    copy the pbix archive without the members named in `remove` and with the members in `add`
+    ({name: str or bytes}) written at the end; members named in `add` replace existing ones.
+    untouched members are copied as raw compressed bytes (recompressed where zipfile lacks the internals for that).
+    `output` may be a path or a writable, seekable file object. by default the file is rewritten in place.
+    """
+    add = add or {}
+    skip = set(remove) | set(add)
+    in_place = output is None or (isinstance(output, (str, os.PathLike)) and os.fspath(output) == os.fspath(pbix_path))
+    target = pbix_path + '.temp' if in_place else output
+
+    try:
+        with zipfile.ZipFile(pbix_path, 'r') as zip_read, open(pbix_path, 'rb') as src:
+            with zipfile.ZipFile(target, 'w') as zip_write:
+                raw = _has_zip_internals(zip_write)
+                for info in zip_read.infolist():
+                    if info.filename in skip:
+                        continue
+                    if raw:
+                        _copy_raw_member(src, zip_write, info)
+                    else:
+                        _recompress_member(zip_read, zip_write, info)
+                for name, content in add.items():
+                    zip_write.writestr(name, content)
+    except BaseException:
+        if in_place and os.path.exists(target):
+            os.remove(target)
+        raise
+
+    if in_place:
+        os.replace(target, pbix_path)
+
+
+def disconnect_pbix(pbix_path, output=None):
+    """
+    Remove the Connections file from the given PBIX file
+    """
+    rewrite_pbix(pbix_path, output, remove=[CONNECTIONS_MEMBER])
+
+
+def connect_pbix(pbix_path, group_id, dataset_id, output=None):
+    """
+    Connect the given PBIX file to the given group and dataset
+    Warning: this uses undocumented code and may break in the future
+    """
+    rewrite_pbix(pbix_path, output, add={CONNECTIONS_MEMBER: connections_content(group_id, dataset_id)})
+
+
+class _OffsetBuffer(io.BytesIO):
+    """
+    in memory buffer that reports positions as if it started `offset` bytes into a file,
+    used to build the tail of an archive whose head already exists on disk
+    """
+
+    def __init__(self, offset):
+        super().__init__()
+        self.offset = offset
+
+    def tell(self):
+        return super().tell() + self.offset
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos -= self.offset
+        return super().seek(pos, whence) + self.offset
+
+
+class PbixStream(io.RawIOBase):
+    """
+    read only file object over the first `head_size` bytes of the file at `path` followed by `tail`.
+    it is what PbixTemplate.open() returns and can be passed to the upload functions in place of a path.
+    with remove the file is deleted when the stream is closed.
+    """
+
+    def __init__(self, path, head_size, tail, name=None, remove=False):
+        super().__init__()
+        self.path = path
+        self.head_size = head_size
+        self.tail = tail
+        self.name = name or os.path.basename(path)
+        self.remove = remove
+        self._f = open(path, 'rb')
+        self._pos = 0
+
+    def __len__(self):
+        return self.head_size + len(self.tail)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += len(self)
+        self._pos = max(0, pos)
+        return self._pos
+
+    def readinto(self, buffer):
+        view = memoryview(buffer)
+        size = 0
+        if self._pos < self.head_size:
+            self._f.seek(self._pos)
+            size = self._f.readinto(view[:min(len(view), self.head_size - self._pos)])
+        else:
+            start = self._pos - self.head_size
+            chunk = self.tail[start:start + len(view)]
+            size = len(chunk)
+            view[:size] = chunk
+        self._pos += size
+        return size
+
+    def close(self):
+        self._f.close()
+        if self.remove and os.path.exists(self.path):
+            os.remove(self.path)
+        super().close()
+
+
+class PbixTemplate:
+    """
+    a pbix prepared once for stamping out copies connected to different groups and datasets.
+    the disconnected archive is written to `base_path` (next to the source by default) and the
+    member layout is read once; every stamp then costs one file copy plus a few KB of generated data.
+    """
+
+    def __init__(self, pbix_path, base_path=None):
+        self.pbix_path = pbix_path
+        self.base_path = base_path or pbix_path + '.base'
+        rewrite_pbix(pbix_path, self.base_path, remove=[CONNECTIONS_MEMBER])
+        with zipfile.ZipFile(self.base_path, 'r') as zip_read:
+            self._infos = zip_read.infolist()
+            # everything before the central directory is shared by all variants
+            self.head_size = _central_directory_offset(zip_read, self.base_path)
+            self._raw = _has_zip_internals(zip_read)
+
+    def tail(self, group_id, dataset_id):
+        """
+        returns the bytes that follow the shared head for the variant connected to the given group and dataset
+        """
+        if not self._raw:
+            raise NotImplementedError("this Python's zipfile can't append to an archive head")
+        buffer = _OffsetBuffer(self.head_size)
+        with zipfile.ZipFile(buffer, 'w') as zip_write:
+            for info in self._infos:
+                zip_write.filelist.append(info)
+                zip_write.NameToInfo[info.filename] = info
+            zip_write.writestr(CONNECTIONS_MEMBER, connections_content(group_id, dataset_id))
+        return buffer.getvalue()
+
+    def stamp(self, group_id, dataset_id, output):
+        """
+        write the variant connected to the given group and dataset to the output path
+        """
+        if not self._raw:
+            rewrite_pbix(self.base_path, output, add={CONNECTIONS_MEMBER: connections_content(group_id, dataset_id)})
+            return output
+        tail = self.tail(group_id, dataset_id)
+        shutil.copyfile(self.base_path, output)
+        with open(output, 'r+b') as f:
+            f.truncate(self.head_size)
+            f.seek(self.head_size)
+            f.write(tail)
+        return output
+
+    def open(self, group_id, dataset_id, name=None):
+        """
+        returns a PbixStream of the variant connected to the given group and dataset without writing it to disk
+        """
+        name = name or os.path.basename(self.pbix_path)
+        if not self._raw:
+            # the variant is written out in full and removed again when the stream is closed
+            fd, path = tempfile.mkstemp(suffix='.pbix', dir=os.path.dirname(self.base_path) or None)
+            os.close(fd)
+            self.stamp(group_id, dataset_id, path)
+            return PbixStream(path, os.path.getsize(path), b'', name=name, remove=True)
+        return PbixStream(self.base_path, self.head_size, self.tail(group_id, dataset_id), name=name)
+
+    def stamp_many(self, targets, max_workers=None, use_processes=False):
+        """
+        stamp every (group_id, dataset_id, output) in targets, in a thread pool or optionally a process pool.
+        returns the output paths in the same order.
+        """
+        pool_cls = concurrent.futures.ProcessPoolExecutor if use_processes else concurrent.futures.ThreadPoolExecutor
+        with pool_cls(max_workers=max_workers) as pool:
+            return list(pool.map(_stamp, [(self, target) for target in targets]))
+
+    def remove(self):
+        """
+        delete the prepared base archive
+        """
+        if os.path.exists(self.base_path):
+            os.remove(self.base_path)
+
+
+def _stamp(args):
+    template, (group_id, dataset_id, output) = args
+    return template.stamp(group_id, dataset_id, output)
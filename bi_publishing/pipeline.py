@@ -0,0 +1,417 @@
+"""
+dependency-aware publish pipeline.
+
+`publish_workspace` turns a DATASET_REPORT_MAPPING into a graph of steps and runs every step whose
+dependencies are done in a thread pool, so reports of different datasets (and the downloads of the
+next files) no longer wait on each other.
+"""
+import os
+import concurrent.futures
+import threading
+
+from . import (
+    PbixTemplate,
+    _dataset_params_details,
+    disconnect_pbix,
+    download_file_from_integration_hub,
+    get_datasets_in_group,
+    get_import_in_group,
+    get_reports_in_group,
+    rebind_report_to_dataset_in_group,
+    refresh_dataset_in_group,
+    update_dataset_credentials,
+    update_dataset_params,
+    upload_datasest_to_group,
+    upload_report_group,
+    wait_for_import,
+)
+from .instrument import log, span
+from .incremental import (
+    PublishState,
+    dataset_fingerprint,
+    dataset_key,
+    file_sha256,
+    report_fingerprint,
+    report_key,
+    settings_fingerprint,
+)
+from .journal import PublishJournal, publish_run_key
+
+DEFAULT_MAX_WORKERS = 4
+
+
+def _run_step(name, func, deps):
+    # steps are named "<kind>:<target>", the span is named by kind so timings aggregate per phase
+    with span(name.split(':', 1)[0], task=name):
+        return func(deps)
+
+
+def run_dag(tasks, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    run the given tasks respecting their dependencies, with at most max_workers running at once.
+    tasks is a dict of name -> (func, [dependency names]); func is called with a dict holding the
+    results of its dependencies. returns a dict of name -> result.
+    if a task fails no new tasks are started and the first error is raised once running tasks finish, with
+    `failed_steps` set to {name: message} of every task that failed (including those of nested run_dag calls).
+    """
+    for name, (_, deps) in tasks.items():
+        for dep in deps:
+            if dep not in tasks:
+                raise ValueError(f"task {name} depends on unknown task {dep}")
+
+    results = {}
+    waiting = {name: set(deps) for name, (_, deps) in tasks.items()}
+    error = None
+    failed = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+
+        def _submit_ready():
+            for name in [n for n, deps in waiting.items() if not deps]:
+                func, deps = tasks[name]
+                del waiting[name]
+                running[pool.submit(_run_step, name, func, {d: results[d] for d in deps})] = name
+
+        _submit_ready()
+        while running:
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:  # noqa
+                    log(f"--- step {name} failed: {e} ---")
+                    failed.update(getattr(e, 'failed_steps', {}))
+                    failed[name] = str(e)
+                    error = error or e
+                    continue
+                for deps in waiting.values():
+                    deps.discard(name)
+            if error is None:
+                _submit_ready()
+
+    if error is not None:
+        error.failed_steps = failed
+        raise error
+    if waiting:
+        raise ValueError(f"dependency cycle between tasks: {sorted(waiting)}")
+    return results
+
+
+def _template_base_path(work_dir, report):
+    # the disconnected copy a report's PbixTemplate stamps from, removed once the publish is over
+    return os.path.join(work_dir, report) + '.base'
+
+
+def _remote_name(prefix, pbix_name):
+    return f"{prefix} {pbix_name}".replace('.pbix', '')
+
+
+def build_publish_tasks(client, group, mapping, tag, db_name, dw_conn, prefix="", work_dir=".", refresh=True,
+                        artifact_cache=None, state=None, journal=None, existing=None, name_conflict=None,
+                        page_cache=None):
+    """
+    returns the task graph used by publish_workspace, see run_dag for the format.
+    resolve steps wait for the upload's import to finish and take the ids from it.
+    per dataset: download -> upload -> resolve -> params -> credentials -> refresh
+    per report:  download -> connect (needs the resolved dataset) -> upload -> resolve -> rebind
+    each report file is downloaded and prepared as a PbixTemplate once, even if several datasets use it.
+
+    with a PublishState each dataset and report first gets a check step that compares its fingerprint with
+    the last deployment. unchanged artifacts skip every step except refresh (reports aren't even downloaded),
+    changed ones are imported over the existing object.
+
+    with a PublishJournal the check steps also pick up the progress of an unfinished run with the same inputs
+    (see bi_publishing.journal): imported objects that still exist and pending imports are reused, and the
+    steps after them run as usual. every milestone reached is appended to the journal.
+
+    datasets in `existing` ({dataset file: dataset object}) are taken as deployed: they are neither imported,
+    configured nor refreshed, and only their reports are published against them.
+    `name_conflict` is passed to every import; it defaults to 'CreateOrOverwrite' when anything is checked, and
+    otherwise datasets use the service default while reports abort on an existing name.
+    with a PageCache (see bi_publishing.pages) the cached pages of every imported report are invalidated.
+    """
+    group_id = group['id']
+    existing = existing if existing is not None else {}
+    tasks = {}
+    report_checks = {}
+    checked = state is not None or journal is not None or bool(existing)
+    name_conflict = name_conflict or ('CreateOrOverwrite' if checked else None)
+    settings = settings_fingerprint(_dataset_params_details(db_name, dw_conn), dw_conn) if checked else None
+    run = publish_run_key(group_id, mapping, tag, prefix, settings, refresh) if journal is not None else None
+    sources = {}
+    deployed = {}
+    locks = {}
+    lock = threading.Lock()
+
+    def _lock_for(name):
+        with lock:
+            return locks.setdefault(name, threading.Lock())
+
+    def _source_sha256(filename, local_path):
+        # hash of the source file; without a cache the file is downloaded here and reused by the download step
+        with _lock_for(filename):
+            if filename not in sources:
+                if artifact_cache is not None:
+                    sources[filename] = (artifact_cache.sha256(tag, filename), None)
+                else:
+                    download_file_from_integration_hub(tag, filename, local_path, client=client)
+                    sources[filename] = (file_sha256(local_path), local_path)
+            return sources[filename][0]
+
+    def _download(filename, local_path):
+        with _lock_for(filename):
+            downloaded = sources.get(filename, (None, None))[1]
+        if downloaded != local_path:
+            download_file_from_integration_hub(tag, filename, local_path, cache=artifact_cache, client=client)
+
+    def _deployed_ids(kind):
+        # one listing per kind for the whole run
+        with _lock_for(kind):
+            if kind not in deployed:
+                items = get_datasets_in_group(client, group_id) if kind == 'datasets' else get_reports_in_group(client, group_id)
+                deployed[kind] = {item['id'] for item in items}
+            return deployed[kind]
+
+    def _unchanged(key, fp, kind, **fields):
+        entry = state.unchanged(key, fp)
+        if entry is None or any(entry.get(k) != v for k, v in fields.items()):
+            return None
+        if entry['id'] not in _deployed_ids(kind):
+            return None
+        log(f"--- {key} is unchanged, skipping ---")
+        return entry
+
+    def _journal(item, event, **fields):
+        if journal is not None:
+            journal.record(run, item, event, **fields)
+
+    def _resume(item, kind, **fields):
+        # the object imported by the unfinished run, if the service still has it
+        progress = journal.progress(run, item)
+        if any(entry.get(k) != v for entry in progress.values() for k, v in fields.items()):
+            journal.reset(run, item)
+            return None, {}
+        if 'imported' in progress:
+            if progress['imported']['id'] in _deployed_ids(kind):
+                log(f"--- resuming {item} from the journal ---")
+                return progress['imported']['id'], progress
+        elif 'uploaded' in progress:
+            import_id = progress['uploaded']['import_id']
+            try:
+                imp = get_import_in_group(client, group_id, import_id)
+                if imp.get('importState') != 'Succeeded':
+                    imp = wait_for_import(client, group_id, import_id)
+            except Exception as e:  # noqa
+                log(f"--- import {import_id} of {item} can't be resumed: {e} ---")
+            else:
+                log(f"--- resuming {item} from import {import_id} ---")
+                object_id = imp[kind][0]['id']
+                journal.record(run, item, 'imported', id=object_id, **fields)
+                return object_id, progress
+        if progress:
+            journal.reset(run, item)
+        return None, {}
+
+    for dset, reports in mapping.items():
+        dset_path = os.path.join(work_dir, dset)
+        remote_dataset_name = _remote_name(prefix, dset)
+        dset_key = dataset_key(group_id, dset)
+
+        def _check_dataset(_, dset=dset, dset_path=dset_path, remote_dataset_name=remote_dataset_name, dset_key=dset_key):
+            result = {'skip': False, 'dataset': None, 'configured': False, 'refreshed': False}
+            if dset in existing:
+                return dict(result, skip=True, dataset=existing[dset], configured=True, refreshed=True)
+            if state is not None:
+                result['fingerprint'] = dataset_fingerprint(_source_sha256(dset, dset_path), group_id,
+                                                            remote_dataset_name)
+                entry = _unchanged(dset_key, result['fingerprint'], 'datasets', settings=settings)
+                if entry is not None:
+                    return dict(result, skip=True, dataset={'id': entry['id'], 'name': remote_dataset_name},
+                                configured=True)
+            if journal is not None:
+                dataset_id, progress = _resume(dset_key, 'datasets')
+                if dataset_id is not None:
+                    return dict(result, skip=True, dataset={'id': dataset_id, 'name': remote_dataset_name},
+                                configured='configured' in progress, refreshed='refreshed' in progress)
+            return result
+
+        def _download_dataset(deps, dset=dset, dset_path=dset_path):
+            if deps.get(f"check:{dset}", {}).get('skip'):
+                return None
+            _download(dset, dset_path)
+            disconnect_pbix(dset_path)
+            return dset_path
+
+        def _upload_dataset(deps, dset=dset, dset_path=dset_path, remote_dataset_name=remote_dataset_name,
+                            dset_key=dset_key):
+            if deps[f"download:{dset}"] is None:
+                return None
+            imp = upload_datasest_to_group(client, group_id, remote_dataset_name, dset_path, name_conflict=name_conflict)
+            _journal(dset_key, 'uploaded', import_id=imp['id'])
+            return imp
+
+        def _resolve_dataset(deps, dset=dset, dset_key=dset_key):
+            if deps[f"upload:{dset}"] is None:
+                return deps[f"check:{dset}"]['dataset']
+            imp = wait_for_import(client, group_id, deps[f"upload:{dset}"]['id'])
+            _journal(dset_key, 'imported', id=imp['datasets'][0]['id'])
+            return imp['datasets'][0]
+
+        def _params(deps, dset=dset):
+            if not deps.get(f"check:{dset}", {}).get('configured'):
+                update_dataset_params(client, db_name, dw_conn, group_id, deps[f"resolve:{dset}"]['id'])
+
+        def _credentials(deps, dset=dset, dset_key=dset_key):
+            if deps.get(f"check:{dset}", {}).get('configured'):
+                return
+            dataset_id = deps[f"resolve:{dset}"]['id']
+            update_dataset_credentials(client, dw_conn, group_id, dataset_id)
+            if state is not None:
+                state.record(dset_key, deps[f"check:{dset}"]['fingerprint'], id=dataset_id, settings=settings)
+            _journal(dset_key, 'configured')
+
+        def _refresh(deps, dset=dset, dset_key=dset_key):
+            if deps.get(f"check:{dset}", {}).get('refreshed'):
+                return
+            request_id = refresh_dataset_in_group(client, group_id, deps[f"resolve:{dset}"]['id'])
+            _journal(dset_key, 'refreshed', request_id=request_id)
+
+        check = [f"check:{dset}"] if checked else []
+        if checked:
+            tasks[f"check:{dset}"] = (_check_dataset, [])
+        tasks[f"download:{dset}"] = (_download_dataset, check)
+        tasks[f"upload:{dset}"] = (_upload_dataset, [f"download:{dset}"])
+        tasks[f"resolve:{dset}"] = (_resolve_dataset, [f"upload:{dset}"] + check)
+        tasks[f"params:{dset}"] = (_params, [f"resolve:{dset}", f"upload:{dset}"] + check)
+        tasks[f"credentials:{dset}"] = (_credentials, [f"resolve:{dset}", f"upload:{dset}", f"params:{dset}"] + check)
+        if refresh:
+            tasks[f"refresh:{dset}"] = (_refresh, [f"resolve:{dset}", f"credentials:{dset}"] + check)
+
+        for report in reports:
+            key = f"{dset}/{report}"
+            # every dataset gets its own connected copy of the report
+            report_path = os.path.join(work_dir, dset.replace('.pbix', ''), report)
+            report_name = _remote_name(prefix, report)
+            rep_key = report_key(group_id, dset, report)
+
+            def _download_report(deps, report=report):
+                checks = report_checks[report]
+                if checks and all(deps[name]['skip'] for name in checks):
+                    return None
+                template_source = os.path.join(work_dir, report)
+                _download(report, template_source)
+                return PbixTemplate(template_source, base_path=_template_base_path(work_dir, report))
+
+            def _check_report(deps, dset=dset, report=report, report_name=report_name, rep_key=rep_key):
+                dataset_id = deps[f"resolve:{dset}"]['id']
+                result = {'skip': False, 'report': None, 'rebound': False}
+                if state is not None:
+                    source_sha256 = _source_sha256(report, os.path.join(work_dir, report))
+                    result['fingerprint'] = report_fingerprint(source_sha256, group_id, dataset_id, report_name)
+                    entry = _unchanged(rep_key, result['fingerprint'], 'reports')
+                    if entry is not None:
+                        return dict(result, skip=True, report={'id': entry['id'], 'name': report_name}, rebound=True)
+                if journal is not None:
+                    # a report connected to a dataset that has since been re-imported is uploaded again
+                    report_id, progress = _resume(rep_key, 'reports', dataset_id=dataset_id)
+                    if report_id is not None:
+                        return dict(result, skip=True, report={'id': report_id, 'name': report_name},
+                                    rebound='rebound' in progress)
+                return result
+
+            def _connect_report(deps, dset=dset, report=report, key=key, report_path=report_path):
+                if deps.get(f"check:{key}", {}).get('skip'):
+                    return None
+                os.makedirs(os.path.dirname(report_path), exist_ok=True)
+                return deps[f"download:{report}"].stamp(group_id, deps[f"resolve:{dset}"]['id'], report_path)
+
+            def _upload_report(deps, dset=dset, key=key, report_name=report_name, rep_key=rep_key):
+                if deps[f"connect:{key}"] is None:
+                    return None
+                imp = upload_report_group(client, group, report_name, deps[f"connect:{key}"],
+                                          name_conflict=name_conflict or 'Abort')
+                _journal(rep_key, 'uploaded', import_id=imp['id'], dataset_id=deps[f"resolve:{dset}"]['id'])
+                return imp
+
+            def _resolve_report(deps, dset=dset, key=key, rep_key=rep_key):
+                if deps[f"upload:{key}"] is None:
+                    return deps[f"check:{key}"]['report']
+                imp = wait_for_import(client, group_id, deps[f"upload:{key}"]['id'])
+                if page_cache is not None:
+                    page_cache.invalidate(imp['reports'][0]['id'])
+                _journal(rep_key, 'imported', id=imp['reports'][0]['id'], dataset_id=deps[f"resolve:{dset}"]['id'])
+                return imp['reports'][0]
+
+            def _rebind(deps, dset=dset, key=key, rep_key=rep_key):
+                if deps.get(f"check:{key}", {}).get('rebound'):
+                    return
+                report_id = deps[f"resolve:{key}"]['id']
+                dataset_id = deps[f"resolve:{dset}"]['id']
+                rebind_report_to_dataset_in_group(client, report_id, group_id, dataset_id)
+                if state is not None:
+                    state.record(rep_key, deps[f"check:{key}"]['fingerprint'], id=report_id)
+                _journal(rep_key, 'rebound', dataset_id=dataset_id)
+
+            check = [f"check:{key}"] if checked else []
+            if f"download:{report}" not in tasks:
+                report_checks[report] = []
+                tasks[f"download:{report}"] = (_download_report, [])
+            if checked:
+                tasks[f"check:{key}"] = (_check_report, [f"resolve:{dset}"])
+                report_checks[report].append(f"check:{key}")
+            tasks[f"connect:{key}"] = (_connect_report, [f"download:{report}", f"resolve:{dset}"] + check)
+            tasks[f"upload:{key}"] = (_upload_report, [f"connect:{key}", f"resolve:{dset}"])
+            tasks[f"resolve:{key}"] = (_resolve_report, [f"upload:{key}", f"resolve:{dset}"] + check)
+            tasks[f"rebind:{key}"] = (_rebind, [f"resolve:{key}", f"resolve:{dset}", f"upload:{key}"] + check)
+
+    # in incremental mode a report is only downloaded once its checks show some copy of it changed
+    for report, checks in report_checks.items():
+        func, _ = tasks[f"download:{report}"]
+        tasks[f"download:{report}"] = (func, checks)
+
+    return tasks
+
+
+def publish_workspace(client, group, mapping, tag, db_name, dw_conn, prefix="", work_dir=".",
+                      max_workers=DEFAULT_MAX_WORKERS, refresh=True, artifact_cache=None, state=None, journal=None,
+                      existing=None, name_conflict=None, page_cache=None):
+    """
+    publish every dataset and report in the given DATASET_REPORT_MAPPING into the workspace(group),
+    running independent steps concurrently. with an ArtifactCache files are downloaded once per tag.
+    with `state` (a PublishState or the path of its file) the publish is incremental: artifacts that
+    haven't changed since the last run are skipped. with `journal` (a PublishJournal or the path of its file)
+    an interrupted publish resumes where it stopped when it is run again with the same arguments.
+    `existing` ({dataset file: dataset object}) names datasets that are already deployed, so only their reports
+    in the mapping are published. `name_conflict` sets how imports treat objects of the same name, see
+    build_publish_tasks. with a PageCache the cached pages of the imported reports are invalidated.
+    returns {dataset file: {'dataset': dataset object, 'reports': {report file: report object}, 'skipped': bool,
+    'skipped_reports': [report files]}}, where skipped objects were unchanged or picked up from the journal.
+    """
+    if state is not None and not isinstance(state, PublishState):
+        state = PublishState(state)
+    if journal is not None and not isinstance(journal, PublishJournal):
+        journal = PublishJournal(journal)
+    tasks = build_publish_tasks(client, group, mapping, tag, db_name, dw_conn, prefix, work_dir, refresh, artifact_cache,
+                                state, journal, existing, name_conflict, page_cache)
+    try:
+        results = run_dag(tasks, max_workers=max_workers)
+    finally:
+        for report in {report for reports in mapping.values() for report in reports}:
+            base_path = _template_base_path(work_dir, report)
+            if os.path.exists(base_path):
+                os.remove(base_path)
+    if journal is not None:
+        settings = settings_fingerprint(_dataset_params_details(db_name, dw_conn), dw_conn)
+        journal.finish(publish_run_key(group['id'], mapping, tag, prefix, settings, refresh))
+
+    output = {}
+    for dset, reports in mapping.items():
+        output[dset] = {
+            'dataset': results[f"resolve:{dset}"],
+            'reports': {report: results[f"resolve:{dset}/{report}"] for report in reports},
+            'skipped': bool(results.get(f"check:{dset}", {}).get('skip')),
+            'skipped_reports': [report for report in reports if results.get(f"check:{dset}/{report}", {}).get('skip')],
+        }
+    return output
@@ -0,0 +1,187 @@
+"""
+capacity placement.
+
+`capacity_inventory` reads the capacities the principal can assign to and which workspaces sit on
+each of them, concurrently. `plan_placement` then picks a capacity for every workspace with a
+pluggable policy, keeping the inventory's load up to date as it goes so a batch is spread out
+instead of landing on the same capacity, and `assign_capacities` applies the result in parallel
+through the client's rate limiter.
+
+a policy is any callable policy(group, candidates) returning one of the candidate capacities
+(or None to leave the workspace where it is); candidates are the inventory entries that passed
+the region and SKU filters. `least_loaded` balances by workspace count, dataset count or a
+caller supplied size per workspace.
+"""
+import concurrent.futures
+
+from . import add_group_to_capacity, get_capcities, get_datasets_in_group, iter_groups
+from .instrument import log
+
+DEFAULT_MAX_WORKERS = 8
+
+# access rights on a capacity that allow assigning workspaces to it
+ASSIGN_RIGHTS = frozenset(['Admin', 'Assign'])
+
+METRICS = ('workspaces', 'datasets', 'size')
+
+
+def _capacity_id(value):
+    return value.lower() if value else None
+
+
+def capacity_inventory(client, count_datasets=False, sizes=None, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    returns {'capacities': {capacity id: entry}, 'groups': {group id: group}, 'loads': {group id: load}}.
+    each capacity entry has id, name, sku, region, state, assignable and its load: the workspaces on it, their
+    dataset count (only listed with count_datasets, one call per workspace) and their total size from
+    `sizes` ({group id: size}, e.g. dataset bytes from a tenant snapshot). the dict is keyed by lower case id.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        capacities_future = pool.submit(get_capcities, client)
+        groups_future = pool.submit(lambda: list(iter_groups(client)))
+        capacities, groups = capacities_future.result(), groups_future.result()
+
+        inventory = {}
+        for capacity in capacities:
+            inventory[_capacity_id(capacity['id'])] = {
+                'id': capacity['id'],
+                'name': capacity.get('displayName'),
+                'sku': capacity.get('sku'),
+                'region': capacity.get('region'),
+                'state': capacity.get('state'),
+                'assignable': capacity.get('state', 'Active') == 'Active'
+                and capacity.get('capacityUserAccessRight', 'Admin') in ASSIGN_RIGHTS,
+                'workspaces': set(),
+                'datasets': 0,
+                'size': 0,
+            }
+
+        dedicated = [g for g in groups if g.get('isOnDedicatedCapacity') and _capacity_id(g.get('capacityId')) in inventory]
+        counts = {}
+        if count_datasets:
+            counts = dict(zip((g['id'] for g in dedicated),
+                              pool.map(lambda g: len(get_datasets_in_group(client, g['id'])), dedicated)))
+
+    loads = {group['id']: {'size': (sizes or {}).get(group['id'], 0)} for group in groups}
+    for group_id, count in counts.items():
+        loads[group_id]['datasets'] = count
+    for group in dedicated:
+        _load(inventory[_capacity_id(group['capacityId'])], group['id'], loads[group['id']])
+    return {'capacities': inventory, 'groups': {group['id']: group for group in groups}, 'loads': loads}
+
+
+def _load(entry, group_id, load):
+    entry['workspaces'].add(group_id)
+    entry['datasets'] += load.get('datasets', 0)
+    entry['size'] += load.get('size', 0)
+
+
+def _unload(entry, group_id, load):
+    entry['workspaces'].discard(group_id)
+    entry['datasets'] -= load.get('datasets', 0)
+    entry['size'] -= load.get('size', 0)
+
+
+def least_loaded(metric='workspaces'):
+    """
+    returns a policy that picks the candidate with the lowest load by `metric` (one of METRICS),
+    breaking ties by workspace count and then name
+    """
+    if metric not in METRICS:
+        raise ValueError(f"unknown metric {metric}, expected one of {METRICS}")
+
+    def _load_of(capacity):
+        return len(capacity['workspaces']) if metric == 'workspaces' else capacity[metric]
+
+    def _policy(group, candidates):
+        if not candidates:
+            return None
+        return min(candidates, key=lambda c: (_load_of(c), len(c['workspaces']), c['name'] or ''))
+    _policy.metric = metric
+    return _policy
+
+
+def _eligible(entry, regions, skus):
+    return entry['assignable'] and (not regions or entry['region'] in regions) and (not skus or entry['sku'] in skus)
+
+
+def plan_placement(client, group_ids, policy=None, regions=None, skus=None, move=False, inventory=None, sizes=None,
+                   max_workers=DEFAULT_MAX_WORKERS):
+    """
+    returns [{'group_id', 'name', 'from', 'to', 'to_name'}] for the given workspaces.
+    candidates are the assignable capacities, limited to `regions` and `skus` when given; the policy
+    (least_loaded() by default) picks one per workspace. workspaces already on a candidate capacity stay
+    unless move=True. with the dataset and size metrics the largest workspaces are placed first.
+    `inventory` (from capacity_inventory) is read when not given and updated with the planned moves.
+    """
+    policy = policy or least_loaded()
+    metric = getattr(policy, 'metric', None)
+    if inventory is None:
+        inventory = capacity_inventory(client, count_datasets=metric == 'datasets', sizes=sizes,
+                                       max_workers=max_workers)
+    capacities, groups, loads = inventory['capacities'], inventory['groups'], inventory['loads']
+    candidates = [entry for entry in capacities.values() if _eligible(entry, regions, skus)]
+    candidate_ids = {entry['id'] for entry in candidates}
+
+    missing = [group_id for group_id in group_ids if group_id not in groups]
+    if missing:
+        raise ValueError(f"workspaces not found: {missing}")
+    if metric == 'datasets':
+        uncounted = [group_id for group_id in group_ids if 'datasets' not in loads[group_id]]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for group_id, count in zip(uncounted, pool.map(lambda g: len(get_datasets_in_group(client, g)), uncounted)):
+                loads[group_id]['datasets'] = count
+
+    assignments = []
+    order = sorted(group_ids, key=lambda g: -loads[g].get(metric, 0)) if metric in ('datasets', 'size') else group_ids
+    for group_id in order:
+        group = groups[group_id]
+        current = capacities.get(_capacity_id(group.get('capacityId'))) if group.get('isOnDedicatedCapacity') else None
+        if current is not None and not move and current['id'] in candidate_ids:
+            continue
+        if current is not None:
+            # judge the workspace's own capacity without its load, so it isn't moved for nothing
+            _unload(current, group_id, loads[group_id])
+        target = policy(group, candidates)
+        if target is None:
+            if current is not None:
+                _load(current, group_id, loads[group_id])
+            continue
+        _load(target, group_id, loads[group_id])
+        if target is not current:
+            assignments.append({'group_id': group_id, 'name': group.get('name'), 'from': current['id'] if current else None,
+                                'to': target['id'], 'to_name': target['name']})
+    return assignments
+
+
+def assign_capacities(client, assignments, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    run the given assignments (see plan_placement) concurrently.
+    returns {'assigned': [...], 'failed': [...]} with the assignments, failed ones with the error
+    """
+    def _assign(assignment):
+        try:
+            add_group_to_capacity(client, assignment['group_id'], assignment['to'])
+        except Exception as e:  # noqa
+            log(f"--- assigning {assignment['group_id']} to capacity {assignment['to']} failed: {e} ---")
+            return 'failed', dict(assignment, error=str(e))
+        return 'assigned', assignment
+
+    result = {'assigned': [], 'failed': []}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for outcome, assignment in pool.map(_assign, assignments):
+            result[outcome].append(assignment)
+    return result
+
+
+def place_groups(client, group_ids, policy=None, regions=None, skus=None, move=False, sizes=None,
+                 max_workers=DEFAULT_MAX_WORKERS, dry_run=False):
+    """
+    plan and assign capacities for the given workspaces, see plan_placement and assign_capacities.
+    with dry_run nothing is assigned and the plan is returned under 'planned'.
+    """
+    assignments = plan_placement(client, group_ids, policy=policy, regions=regions, skus=skus, move=move,
+                                 sizes=sizes, max_workers=max_workers)
+    if dry_run:
+        return {'assigned': [], 'failed': [], 'planned': assignments}
+    return assign_capacities(client, assignments, max_workers=max_workers)
@@ -0,0 +1,195 @@
+"""
+dataset refresh orchestration.
+
+refreshes are submitted as enhanced refreshes when any enhanced option is given (objects, commit
+mode, parallelism, retries), tracked through the refresh history endpoint until they finish, and
+scheduled with a cap on how many run at once on each capacity so a mass publish doesn't queue
+every refresh on the same nodes. polling starts from the dataset's usual refresh duration and
+backs off from there.
+"""
+import concurrent.futures
+import datetime
+import statistics
+import time
+
+from . import (
+    POWERBI_BASE_URL,
+    _backoff_intervals,
+    _get_headers,
+    _request,
+    iter_groups,
+    refresh_dataset_in_group,
+)
+from .instrument import log
+
+DEFAULT_MAX_PER_CAPACITY = 2
+DEFAULT_REFRESH_TIMEOUT = 3600
+
+# statuses of a refresh that is still queued or running
+IN_PROGRESS_STATUSES = frozenset(['Unknown', 'NotStarted', 'InProgress'])
+
+
+def _object_spec(obj):
+    if isinstance(obj, dict):
+        return obj
+    if isinstance(obj, (tuple, list)):
+        table, partition = obj
+        return {'table': table, 'partition': partition}
+    return {'table': obj}
+
+
+def refresh_payload(refresh_type=None, commit_mode=None, max_parallelism=None, retry_count=None, objects=None,
+                    apply_refresh_policy=None, notify_option=None):
+    """
+    returns the body of a refresh request.
+    objects may be table names, (table, partition) tuples or the service's {'table', 'partition'} dicts.
+    any option other than notify_option makes it an enhanced refresh, which the service tracks by request id;
+    notify_option only applies to regular refreshes.
+    """
+    payload = {}
+    if refresh_type is not None:
+        payload['type'] = refresh_type
+    if commit_mode is not None:
+        payload['commitMode'] = commit_mode
+    if max_parallelism is not None:
+        payload['maxParallelism'] = max_parallelism
+    if retry_count is not None:
+        payload['retryCount'] = retry_count
+    if objects:
+        payload['objects'] = [_object_spec(obj) for obj in objects]
+    if apply_refresh_policy is not None:
+        payload['applyRefreshPolicy'] = apply_refresh_policy
+    if notify_option is not None:
+        if payload:
+            raise ValueError("notify_option can't be combined with enhanced refresh options")
+        payload['notifyOption'] = notify_option
+    return payload
+
+
+def get_refresh_history(client, group_id, dataset_id, top=10):
+    """
+    returns the latest `top` refreshes of the given dataset, newest first
+    """
+    api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/datasets/{dataset_id}/refreshes"
+    response = _request(client, 'GET', api_url, headers=_get_headers(client), params={'$top': top})
+    if response.ok:
+        return response.json()['value']
+    raise Exception(f"--- failed to get refresh history: {response.content} ---")
+
+
+def get_refresh_execution(client, group_id, dataset_id, request_id):
+    """
+    returns the execution details (status, objects, messages) of the given enhanced refresh
+    """
+    api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/datasets/{dataset_id}/refreshes/{request_id}"
+    response = _request(client, 'GET', api_url, headers=_get_headers(client))
+    if response.ok:
+        return response.json()
+    raise Exception(f"--- failed to get refresh {request_id}: {response.content} ---")
+
+
+def _parse_time(value):
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def typical_duration(history):
+    """
+    returns the median duration in seconds of the completed refreshes in the given history, or None
+    """
+    durations = []
+    for refresh in history:
+        if refresh.get('status') == 'Completed' and refresh.get('startTime') and refresh.get('endTime'):
+            durations.append((_parse_time(refresh['endTime']) - _parse_time(refresh['startTime'])).total_seconds())
+    return statistics.median(durations) if durations else None
+
+
+def _latest(history, request_id):
+    if request_id is not None:
+        for refresh in history:
+            if refresh.get('requestId') == request_id:
+                return refresh
+        return None
+    return history[0] if history else None
+
+
+def wait_for_refresh(client, group_id, dataset_id, request_id=None, timeout=DEFAULT_REFRESH_TIMEOUT,
+                     initial_interval=None, max_interval=60):
+    """
+    poll the given refresh (the latest one without request_id) until it finishes and return its history entry.
+    the first poll waits about a quarter of the dataset's median refresh time, then the interval backs off
+    up to max_interval. raises if the refresh fails or timeout seconds pass.
+    """
+    deadline = time.monotonic() + timeout
+    history = get_refresh_history(client, group_id, dataset_id)
+    if initial_interval is None:
+        expected = typical_duration(history)
+        initial_interval = min(max_interval, max(2, expected / 4)) if expected else 5
+
+    refresh = _latest(history, request_id)
+    for interval in _backoff_intervals(initial_interval, max_interval):
+        status = refresh.get('status') if refresh is not None else 'NotStarted'
+        if status not in IN_PROGRESS_STATUSES:
+            if status != 'Completed':
+                raise Exception(f"--- refresh of dataset {dataset_id} {status}: {refresh.get('serviceExceptionJson')} ---")
+            log(f"--- refresh of dataset {dataset_id} completed ---")
+            return refresh
+        if time.monotonic() + interval > deadline:
+            raise TimeoutError(f"refresh of dataset {dataset_id} did not finish in {timeout}s, last status: {status}")
+        time.sleep(interval)
+        refresh = _latest(get_refresh_history(client, group_id, dataset_id), request_id)
+
+
+def group_capacities(client, group_ids):
+    """
+    returns {group_id: capacity id} for the given groups, None for groups on shared capacity.
+    groups are read page by page and the listing stops once every requested group is found.
+    """
+    wanted = set(group_ids)
+    capacities = {}
+    for group in iter_groups(client):
+        if group['id'] in wanted:
+            capacities[group['id']] = group.get('capacityId') if group.get('isOnDedicatedCapacity') else None
+            if len(capacities) == len(wanted):
+                break
+    return capacities
+
+
+def refresh_datasets(client, targets, max_per_capacity=DEFAULT_MAX_PER_CAPACITY, capacities=None,
+                     timeout=DEFAULT_REFRESH_TIMEOUT, **options):
+    """
+    refresh every (group_id, dataset_id) in targets and wait for them, running at most max_per_capacity
+    refreshes at once on each capacity (shared capacity counts as one). `capacities` maps group ids to
+    capacity ids and is looked up with group_capacities when not given; options go to refresh_payload.
+    returns one entry per target, in order, with the finished refresh or the error.
+    """
+    targets = list(targets)
+    if capacities is None:
+        capacities = group_capacities(client, {group_id for group_id, _ in targets})
+
+    queues = {}
+    for position, (group_id, dataset_id) in enumerate(targets):
+        queues.setdefault(capacities.get(group_id), []).append(position)
+
+    results = [None] * len(targets)
+
+    def _run(position):
+        group_id, dataset_id = targets[position]
+        entry = {'group_id': group_id, 'dataset_id': dataset_id, 'capacity_id': capacities.get(group_id)}
+        try:
+            request_id = refresh_dataset_in_group(client, group_id, dataset_id, **options)
+            entry['refresh'] = wait_for_refresh(client, group_id, dataset_id, request_id, timeout=timeout)
+        except Exception as e:  # noqa
+            log(f"--- refresh of dataset {dataset_id} in group {group_id} failed: {e} ---")
+            entry['error'] = str(e)
+        results[position] = entry
+
+    # one pool per capacity, so a busy capacity never holds up refreshes on the others
+    pools = [concurrent.futures.ThreadPoolExecutor(max_workers=max_per_capacity) for _ in queues]
+    try:
+        futures = [pool.submit(_run, position) for pool, positions in zip(pools, queues.values())
+                   for position in positions]
+        concurrent.futures.wait(futures)
+    finally:
+        for pool in pools:
+            pool.shutdown()
+    return results
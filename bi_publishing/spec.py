@@ -0,0 +1,266 @@
+"""
+declarative workspace specs.
+
+a WorkspaceSpec describes the desired state of one workspace: its capacity, storage format, users,
+and the datasets and reports published into it. `plan` reads the current state with a handful of
+concurrent list calls and returns the operations needed to reach the spec; `apply` runs them, with
+independent operations in parallel. applying an up to date spec makes no changes.
+"""
+import concurrent.futures
+
+from . import (
+    _dataset_params_details,
+    add_group_to_capacity,
+    create_group,
+    find_group,
+    get_capacity_by_name,
+    get_dataset_parameters,
+    get_datasets_in_group,
+    get_reports_in_group,
+    get_users_in_group,
+    set_group_to_large_semantic_model,
+    update_dataset_params,
+)
+from .incremental import (
+    PublishState,
+    dataset_fingerprint,
+    dataset_key,
+    report_fingerprint,
+    report_key,
+    settings_fingerprint,
+)
+from .membership import apply_member_operation, normalize_member, plan_membership
+from .pipeline import _remote_name, publish_workspace, run_dag
+
+DEFAULT_MAX_WORKERS = 4
+
+
+class WorkspaceSpec:
+    """
+    desired state of a workspace.
+    `datasets` is a DATASET_REPORT_MAPPING published from the integration hub `tag`, with the
+    parameters and credentials of `db_name` and `dw_conn`. `capacity` is a capacity display name,
+    `large_models` switches the workspace to large semantic models and `users` lists the users and
+    security groups that must have access (see membership.normalize_member); users not in the spec are left alone.
+    """
+
+    def __init__(self, name, datasets=None, tag=None, db_name=None, dw_conn=None, prefix="", capacity=None,
+                 large_models=False, users=()):
+        self.name = name
+        self.datasets = dict(datasets or {})
+        self.tag = tag
+        self.db_name = db_name
+        self.dw_conn = dw_conn
+        self.prefix = prefix
+        self.capacity = capacity
+        self.large_models = large_models
+        self.users = [normalize_member(user) for user in users]
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        build a spec from a plain dict, e.g. loaded from a json or yaml file
+        """
+        return cls(**data)
+
+
+class Plan:
+    """
+    the operations that bring a workspace in line with its spec, in the order they are listed.
+    `group` is the existing workspace, or None when the plan creates it.
+    """
+
+    def __init__(self, spec, group, operations, artifact_cache=None, state=None):
+        self.spec = spec
+        self.group = group
+        self.operations = operations
+        self.artifact_cache = artifact_cache
+        self.state = state
+
+    def __bool__(self):
+        return bool(self.operations)
+
+    def __len__(self):
+        return len(self.operations)
+
+    def __str__(self):
+        if not self.operations:
+            return f"workspace {self.spec.name}: up to date"
+        lines = [f"workspace {self.spec.name}: {len(self.operations)} change(s)"]
+        lines.extend(f"  {op['op']} {op['target']}" for op in self.operations)
+        return "\n".join(lines)
+
+
+def _current_state(client, spec, group, max_workers):
+    """
+    helper function that lists everything the plan compares against concurrently
+    """
+    calls = {}
+    if spec.capacity:
+        calls['capacity'] = (get_capacity_by_name, client, spec.capacity)
+    if group is not None:
+        calls['users'] = (get_users_in_group, client, group['id'])
+        if spec.datasets:
+            calls['datasets'] = (get_datasets_in_group, client, group['id'])
+            calls['reports'] = (get_reports_in_group, client, group['id'])
+    if not calls:
+        return {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {name: pool.submit(*call) for name, call in calls.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def _publish_operations(spec, group, current, artifact_cache, state):
+    """
+    helper function that returns the publish operations of the spec.
+    a dataset is published with all its reports when it is missing; with a PublishState and an ArtifactCache
+    also when its source file or settings changed since the last publish. otherwise only its missing (or changed)
+    reports are published against the deployed dataset.
+    """
+    group_id = group['id'] if group is not None else None
+    datasets = {item['name']: item for item in current.get('datasets', [])}
+    reports = {item['name']: item for item in current.get('reports', [])}
+    dataset_ids = {item['id'] for item in datasets.values()}
+    report_ids = {item['id'] for item in reports.values()}
+    incremental = state is not None and artifact_cache is not None
+    settings = None
+    if state is not None and spec.dw_conn is not None:
+        settings = settings_fingerprint(_dataset_params_details(spec.db_name, spec.dw_conn), spec.dw_conn)
+
+    operations = []
+    for dset, report_files in spec.datasets.items():
+        dataset = datasets.get(_remote_name(spec.prefix, dset))
+        reason = None
+        if dataset is None:
+            reason = 'missing'
+        elif incremental:
+            entry = state.get(dataset_key(group_id, dset))
+            fp = dataset_fingerprint(artifact_cache.sha256(spec.tag, dset), group_id,
+                                     _remote_name(spec.prefix, dset))
+            if entry is None or entry['fingerprint'] != fp or entry.get('settings') != settings \
+                    or entry['id'] not in dataset_ids:
+                reason = 'changed'
+        if reason is not None:
+            operations.append({'op': 'publish', 'target': dset, 'reason': reason})
+            continue
+
+        for report in report_files:
+            reason = None
+            if _remote_name(spec.prefix, report) not in reports:
+                reason = 'missing'
+            elif incremental:
+                entry = state.get(report_key(group_id, dset, report))
+                fp = report_fingerprint(artifact_cache.sha256(spec.tag, report), group_id, dataset['id'],
+                                        _remote_name(spec.prefix, report))
+                if entry is None or entry['fingerprint'] != fp or entry['id'] not in report_ids:
+                    reason = 'changed'
+            if reason is not None:
+                operations.append({'op': 'publish_report', 'target': f"{dset}/{report}", 'reason': reason,
+                                   'dataset': dset, 'report': report, 'dataset_id': dataset['id']})
+    return operations
+
+
+def plan(client, spec, artifact_cache=None, state=None, check_parameters=False, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    returns the Plan that brings the workspace in line with the given spec.
+    the workspace is looked up by name with a single filtered call, then the capacity, users, datasets and
+    reports are listed concurrently. with check_parameters the parameters of datasets that are already
+    deployed are read as well and differing ones are updated. `state` (a PublishState or its path) and
+    `artifact_cache` let the plan skip datasets whose files haven't changed since the last apply.
+    """
+    if state is not None and not isinstance(state, PublishState):
+        state = PublishState(state)
+    group = find_group(client, spec.name)
+    current = _current_state(client, spec, group, max_workers)
+    operations = []
+
+    if group is None:
+        operations.append({'op': 'create_group', 'target': spec.name})
+    if spec.capacity:
+        capacity = current['capacity']
+        if group is None or group.get('capacityId', '').lower() != capacity['id'].lower():
+            operations.append({'op': 'assign_capacity', 'target': spec.capacity, 'capacity_id': capacity['id']})
+    if spec.large_models and (group is None or group.get('defaultDatasetStorageFormat') != 'Large'):
+        operations.append({'op': 'set_large_models', 'target': spec.name})
+
+    for change in plan_membership(current.get('users', []), spec.users, remove=False):
+        operations.append(dict(change, op=f"{change['op']}_user", member_op=change['op'], target=change['identifier']))
+
+    publish = _publish_operations(spec, group, current, artifact_cache, state) if spec.datasets else []
+    operations.extend(publish)
+    published = {op['target'] for op in publish if op['op'] == 'publish'}
+
+    if check_parameters and group is not None and spec.dw_conn is not None:
+        wanted = {d['name']: d['newValue'] for d in _dataset_params_details(spec.db_name, spec.dw_conn)['updateDetails']}
+        datasets = {item['name']: item for item in current.get('datasets', [])}
+        deployed = [(dset, datasets[_remote_name(spec.prefix, dset)]) for dset in spec.datasets if dset not in published]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            params = pool.map(lambda d: get_dataset_parameters(client, group['id'], d[1]['id']), deployed)
+            for (dset, dataset), current_params in zip(deployed, params):
+                if any(current_params.get(name) != value for name, value in wanted.items()):
+                    operations.append({'op': 'update_params', 'target': dset, 'dataset_id': dataset['id']})
+
+    return Plan(spec, group, operations, artifact_cache=artifact_cache, state=state)
+
+
+def apply(client, plan, max_workers=DEFAULT_MAX_WORKERS, work_dir=".", refresh=True, journal=None, page_cache=None):
+    """
+    run the operations of the given plan and return {operation: result}.
+    the workspace is created first; capacity, storage format, user and parameter changes then run in
+    parallel, and the datasets and reports to publish go through publish_workspace once capacity and storage
+    format are set. reports published on their own are imported against their deployed dataset, and every import
+    overwrites an object of the same name rather than adding a duplicate.
+    with `journal` an interrupted publish resumes on the next apply, see bi_publishing.journal.
+    with `page_cache` the cached pages of republished reports are invalidated, see bi_publishing.pages.
+    """
+    spec = plan.spec
+    tasks = {}
+
+    def _group(_):
+        if plan.group is not None:
+            return plan.group
+        create_group(client, spec.name)
+        return find_group(client, spec.name)
+
+    tasks['group'] = (_group, [])
+    setup = []
+    to_publish = {}
+    existing = {}
+    for op in plan.operations:
+        name = f"{op['op']}:{op['target']}"
+        if op['op'] == 'create_group':
+            continue
+        elif op['op'] == 'assign_capacity':
+            def _task(deps, op=op):
+                add_group_to_capacity(client, deps['group']['id'], op['capacity_id'])
+            setup.append(name)
+        elif op['op'] == 'set_large_models':
+            def _task(deps):
+                set_group_to_large_semantic_model(client, deps['group']['id'])
+            setup.append(name)
+        elif op['op'] in ('add_user', 'update_user'):
+            def _task(deps, op=op):
+                apply_member_operation(client, deps['group']['id'], dict(op, op=op['member_op']))
+        elif op['op'] == 'update_params':
+            def _task(deps, op=op):
+                update_dataset_params(client, spec.db_name, spec.dw_conn, deps['group']['id'], op['dataset_id'])
+        elif op['op'] == 'publish':
+            to_publish[op['target']] = list(spec.datasets[op['target']])
+            continue
+        elif op['op'] == 'publish_report':
+            to_publish.setdefault(op['dataset'], []).append(op['report'])
+            existing[op['dataset']] = {'id': op['dataset_id'], 'name': _remote_name(spec.prefix, op['dataset'])}
+            continue
+        else:
+            raise ValueError(f"unknown operation {op['op']}")
+        tasks[name] = (_task, ['group'])
+
+    if to_publish:
+        def _publish(deps):
+            return publish_workspace(client, deps['group'], to_publish, spec.tag, spec.db_name, spec.dw_conn,
+                                     prefix=spec.prefix, work_dir=work_dir, max_workers=max_workers, refresh=refresh,
+                                     artifact_cache=plan.artifact_cache, state=plan.state, journal=journal,
+                                     existing=existing, name_conflict='CreateOrOverwrite', page_cache=page_cache)
+        tasks['publish'] = (_publish, ['group'] + setup)
+
+    return run_dag(tasks, max_workers=max_workers)
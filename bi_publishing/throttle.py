@@ -0,0 +1,160 @@
+"""
+rate limiting and retries shared by every request the clients send.
+
+a RateLimiter holds a tenant wide token bucket plus one bucket per endpoint class (read, write,
+import), and can be shared by any number of clients, threads and asyncio tasks. a RetryPolicy
+decides which failed calls are retried and how long to wait, honouring Retry-After on 429/503.
+"""
+import random
+import threading
+import time
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+
+class TokenBucket:
+    """
+    thread safe token bucket refilled at `rate` tokens per second up to `capacity`.
+    callers reserve a token and sleep outside the lock until it is theirs, so waiting callers
+    are served in order and never spin.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        take the given number of tokens and return how many seconds the caller must wait before using them
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            import asyncio
+            await asyncio.sleep(wait)
+        return wait
+
+
+def endpoint_class(method, url):
+    """
+    returns the budget class of a request: 'import' for pbix uploads, 'read' for other GETs, otherwise 'write'
+    """
+    method = method.upper()
+    if method == 'POST' and '/imports' in url:
+        return 'import'
+    if method == 'GET':
+        return 'read'
+    return 'write'
+
+
+class RateLimiter:
+    """
+    tenant wide request budget (`rate` requests per second, bursts up to `burst`) with optional
+    tighter budgets per endpoint class, e.g. class_rates={'import': 0.5, 'write': 5}.
+    """
+
+    def __init__(self, rate=20, burst=None, class_rates=None, class_bursts=None):
+        self.tenant = TokenBucket(rate, burst)
+        class_bursts = class_bursts or {}
+        self.classes = {name: TokenBucket(r, class_bursts.get(name)) for name, r in (class_rates or {}).items()}
+
+    def _buckets(self, method, url):
+        bucket = self.classes.get(endpoint_class(method, url))
+        return [self.tenant] if bucket is None else [bucket, self.tenant]
+
+    def acquire(self, method, url):
+        return sum(bucket.acquire() for bucket in self._buckets(method, url))
+
+    async def acquire_async(self, method, url):
+        waited = 0.0
+        for bucket in self._buckets(method, url):
+            waited += await bucket.acquire_async()
+        return waited
+
+
+_shared_limiters = {}
+_shared_limiters_lock = threading.Lock()
+
+
+def shared_rate_limiter(tenant_id, **kwargs):
+    """
+    returns the process wide RateLimiter for the given tenant, creating it with kwargs on first use
+    """
+    with _shared_limiters_lock:
+        if tenant_id not in _shared_limiters:
+            _shared_limiters[tenant_id] = RateLimiter(**kwargs)
+        return _shared_limiters[tenant_id]
+
+
+def _parse_retry_after(value):
+    """
+    returns the Retry-After header value (seconds or an http date) in seconds, or None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    import email.utils
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    retry throttled (429) calls of any method and transient failures (5xx, connection errors)
+    of idempotent methods, with exponential backoff and jitter. Retry-After wins when present.
+    """
+
+    def __init__(self, max_retries=5, backoff=1.0, max_backoff=60.0,
+                 retry_statuses=(429, 500, 502, 503, 504), max_retry_after=300.0):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_statuses = frozenset(retry_statuses)
+        self.max_retry_after = max_retry_after
+
+    def should_retry(self, method, attempt, status_code=None, error=None):
+        """
+        returns True if a call that failed with the given status (or connection error) should be sent again
+        """
+        if attempt >= self.max_retries:
+            return False
+        if status_code == 429:
+            return True
+        if method.upper() not in IDEMPOTENT_METHODS:
+            return False
+        return error is not None or status_code in self.retry_statuses
+
+    def delay(self, attempt, headers=None):
+        """
+        returns how long to wait before the given retry attempt
+        """
+        retry_after = _parse_retry_after(headers.get('Retry-After')) if headers is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        interval = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return random.uniform(interval / 2, interval)
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+NO_RETRY_POLICY = RetryPolicy(max_retries=0)
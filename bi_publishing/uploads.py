@@ -0,0 +1,205 @@
+"""
+pbix upload transports.
+
+small files are sent inline as a multipart body that is streamed from disk, so memory use doesn't
+grow with the file. files above the inline import limit go through a temporary upload location:
+the file is pushed to blob storage in parallel blocks, the block list is committed and the import
+is then created from the blob url. block uploads can be resumed by passing the same upload_url.
+"""
+import base64
+import concurrent.futures
+import io
+import json
+import os
+import threading
+import urllib.parse
+import uuid
+import xml.etree.ElementTree as ET
+
+from . import POWERBI_BASE_URL, _get_headers, _request
+from .instrument import log
+
+INLINE_IMPORT_LIMIT = 1024 ** 3
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024
+DEFAULT_BLOCK_WORKERS = 4
+BLOB_API_VERSION = "2020-04-08"
+
+
+class UploadInterrupted(Exception):
+    """
+    raised when a block upload fails; pass `upload_url` back in to resume from the missing blocks
+    """
+
+    def __init__(self, message, upload_url):
+        super().__init__(message)
+        self.upload_url = upload_url
+
+
+def _stream_size(f):
+    """
+    returns the number of bytes from the start of the given seekable file object to its end
+    """
+    if hasattr(f, '__len__'):
+        return len(f)
+    position = f.tell()
+    size = f.seek(0, io.SEEK_END)
+    f.seek(position)
+    return size
+
+
+class MultipartStream:
+    """
+    file like multipart/form-data body with a single file field, read from the file in chunks.
+    `progress(sent, total)` is called as the body is read by the http client.
+    """
+
+    def __init__(self, f, file_name, field_name='file', content_type='application/octet-stream', progress=None):
+        self.boundary = uuid.uuid4().hex
+        self._head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{file_name}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode()
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode()
+        self._f = f
+        self._file_size = _stream_size(f)
+        self._pos = 0
+        self.progress = progress
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return len(self._head) + self._file_size + len(self._tail)
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += len(self)
+        self._pos = max(0, min(pos, len(self)))
+        return self._pos
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self) - self._pos
+        chunks = []
+        while size > 0 and self._pos < len(self):
+            file_start = len(self._head)
+            file_end = file_start + self._file_size
+            if self._pos < file_start:
+                chunk = self._head[self._pos:self._pos + size]
+            elif self._pos < file_end:
+                self._f.seek(self._pos - file_start)
+                chunk = self._f.read(min(size, file_end - self._pos))
+                if not chunk:
+                    raise IOError("pbix file ended before its expected size")
+            else:
+                start = self._pos - file_end
+                chunk = self._tail[start:start + size]
+            chunks.append(chunk)
+            self._pos += len(chunk)
+            size -= len(chunk)
+        if self.progress is not None:
+            self.progress(self._pos, len(self))
+        return b''.join(chunks)
+
+
+def create_temporary_upload_location(client, group_id):
+    """
+    returns {'url': ..., 'expirationTime': ...} of a blob the service can import a large pbix from
+    """
+    api_url = f"{POWERBI_BASE_URL}/groups/{group_id}/imports/createTemporaryUploadLocation"
+    response = _request(client, 'POST', api_url, headers=_get_headers(client), data=json.dumps({}))
+    if response.ok:
+        return response.json()
+    raise Exception(f"--- failed to create temporary upload location: {response.content} ---")
+
+
+def _block_id(index):
+    # block ids have to be the same length for every block of a blob
+    return base64.b64encode(f"{index:08d}".encode()).decode()
+
+
+def _uploaded_blocks(client, upload_url):
+    """
+    returns the ids of the blocks already uploaded (but not yet committed) to the given blob url
+    """
+    response = _request(client, 'GET', f"{upload_url}&comp=blocklist&blocklisttype=uncommitted",
+                        headers={'x-ms-version': BLOB_API_VERSION})
+    if not response.ok:
+        return set()
+    return {name.text for name in ET.fromstring(response.content).iter('Name')}
+
+
+def upload_to_temporary_location(client, group_id, f, upload_url=None, block_size=DEFAULT_BLOCK_SIZE,
+                                 max_workers=DEFAULT_BLOCK_WORKERS, progress=None):
+    """
+    push the given seekable file object to a temporary upload location in parallel blocks and commit them.
+    returns the blob url to import from. pass the upload_url of an interrupted upload to only send the missing blocks.
+    """
+    resuming = upload_url is not None
+    if upload_url is None:
+        upload_url = create_temporary_upload_location(client, group_id)['url']
+
+    size = _stream_size(f)
+    block_count = max(1, -(-size // block_size))
+    block_ids = [_block_id(i) for i in range(block_count)]
+    uploaded = _uploaded_blocks(client, upload_url) if resuming else set()
+
+    read_lock = threading.Lock()
+    progress_lock = threading.Lock()
+    sent = [0]
+
+    def _put_block(index):
+        length = min(block_size, size - index * block_size)
+        if block_ids[index] not in uploaded:
+            with read_lock:
+                f.seek(index * block_size)
+                data = f.read(length)
+            block_url = f"{upload_url}&comp=block&blockid={urllib.parse.quote(block_ids[index], safe='')}"
+            response = _request(client, 'PUT', block_url, data=data, headers={'x-ms-version': BLOB_API_VERSION})
+            if not response.ok:
+                raise Exception(f"block {index} failed: {response.status_code} {response.content}")
+        if progress is not None:
+            with progress_lock:
+                sent[0] += length
+                progress(sent[0], size)
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(_put_block, range(block_count)))
+    except Exception as e:  # noqa
+        raise UploadInterrupted(f"--- large file upload interrupted, resume with upload_url: {e} ---", upload_url) from e
+
+    block_list = ''.join(f"<Latest>{block_id}</Latest>" for block_id in block_ids)
+    body = f'<?xml version="1.0" encoding="utf-8"?><BlockList>{block_list}</BlockList>'
+    response = _request(client, 'PUT', f"{upload_url}&comp=blocklist", data=body.encode(),
+                        headers={'x-ms-version': BLOB_API_VERSION, 'Content-Type': 'application/xml'})
+    if not response.ok:
+        raise UploadInterrupted(f"--- committing blocks failed: {response.content} ---", upload_url)
+    log("--- large file uploaded to temporary location ---")
+    return upload_url
+
+
+def post_import(client, group_id, import_url, file_name, f, progress=None, large_file_threshold=INLINE_IMPORT_LIMIT,
+                upload_url=None, block_size=DEFAULT_BLOCK_SIZE, max_workers=DEFAULT_BLOCK_WORKERS):
+    """
+    create an import from the given seekable file object and return the response.
+    files up to large_file_threshold are streamed inline, larger ones go through a temporary upload location.
+    """
+    if upload_url is not None or _stream_size(f) > large_file_threshold:
+        blob_url = upload_to_temporary_location(client, group_id, f, upload_url=upload_url, block_size=block_size,
+                                                max_workers=max_workers, progress=progress)
+        return _request(client, 'POST', import_url, headers=_get_headers(client), data=json.dumps({'fileUrl': blob_url}))
+
+    body = MultipartStream(f, os.path.basename(file_name), progress=progress)
+    headers = {
+        "Authorization": f"Bearer {client['auth_token']}",
+        "Content-Type": body.content_type
+    }
+    return _request(client, 'POST', import_url, headers=headers, data=body)
@@ -11,7 +11,14 @@ setup(
         'bi_publishing'
     ],
     install_requires=[
-        "msal"],
+        "msal>=1.23"],
+    extras_require={
+        "async": ["httpx"],
+        "test": ["pytest"],
+    },
+    entry_points={
+        "console_scripts": ["bi-publishing=bi_publishing.cli:main"],
+    },
     classifiers=[
         'Development Status :: 1 - Planning',
         'Intended Audience :: Science/Research',
@@ -0,0 +1,59 @@
+import json
+import os
+import zipfile
+
+import pytest
+
+import bi_publishing
+from bi_publishing.mockserver import MockPowerBIServer
+
+TAG = 'test'
+MAPPING = {
+    'Dataset - Sales.pbix': ['Management Report.pbix', 'Strategy Report.pbix'],
+}
+DW_CONN = {'type': 'postgres', 'host': 'dw.local', 'username': 'user', 'password': 'secret'}
+
+
+def write_pbix(path, data_model=b'model' * 1000, connections=None):
+    """
+    write a small pbix-like archive, optionally with a Connections member
+    """
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('Version', '1.28')
+        if connections is not None:
+            z.writestr('Connections', connections)
+        z.writestr('DataModel', data_model)
+        z.writestr('Report/Layout', json.dumps({'sections': [{'name': 'ReportSection0'}]}))
+    return path
+
+
+@pytest.fixture
+def server():
+    with MockPowerBIServer(import_delay=0.02, refresh_duration=0.02, scan_duration=0.02) as server:
+        yield server
+
+
+@pytest.fixture
+def client(server):
+    with server.client() as client:
+        yield client
+
+
+@pytest.fixture
+def group(client):
+    bi_publishing.create_group(client, 'test workspace')
+    return bi_publishing.find_group(client, 'test workspace')
+
+
+@pytest.fixture
+def hub(server, tmp_path):
+    """
+    serves the files of MAPPING as the integration hub tag TAG
+    """
+    source = tmp_path / 'hub'
+    source.mkdir()
+    files = list(MAPPING) + [report for reports in MAPPING.values() for report in reports]
+    for i, filename in enumerate(files):
+        server.add_file(TAG, filename, write_pbix(str(source / filename), data_model=os.urandom(2000 + i),
+                                                  connections='{"Version": 3, "Connections": []}'))
+    return files
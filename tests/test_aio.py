@@ -0,0 +1,98 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip('httpx')
+
+from bi_publishing import aio  # noqa: E402
+
+from conftest import DW_CONN, TAG, write_pbix  # noqa: E402
+
+
+def _run(server, func):
+    async def _main():
+        async with server.async_client() as client:
+            return await func(client)
+    return asyncio.run(_main())
+
+
+def test_run_bounded_caps_concurrency():
+    running = []
+    peak = []
+
+    async def _work(item):
+        running.append(item)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(item)
+        if item == 3:
+            raise ValueError(item)
+        return item * 2
+
+    results = asyncio.run(aio.run_bounded(_work, range(10), concurrency=3))
+    assert max(peak) == 3
+    assert results[:3] == [0, 2, 4] and isinstance(results[3], ValueError)
+
+
+@pytest.mark.parametrize('threshold', [aio.INLINE_IMPORT_LIMIT, 1000])
+def test_upload_and_wait_for_import(server, group, tmp_path, threshold):
+    path = write_pbix(str(tmp_path / 'dataset.pbix'), os.urandom(20000))
+
+    async def _publish(client):
+        imp = await aio.upload_datasest_to_group(client, group['id'], 'dataset', path, large_file_threshold=threshold,
+                                                 block_size=4096)
+        return await aio.wait_for_import(client, group['id'], imp['id'], initial_interval=0.01)
+
+    imp = _run(server, _publish)
+
+    assert imp['datasets'][0]['name'] == 'dataset'
+    blocks = server.call_counts().get(('PUT', 'mockblob.local'), 0)
+    # large files go up in blocks plus one block list commit
+    assert blocks == (0 if threshold == aio.INLINE_IMPORT_LIMIT else -(-os.path.getsize(path) // 4096) + 1)
+
+
+def test_wait_for_import_gives_up_on_unknown_import(server, group):
+    with pytest.raises(aio.ImportNotFound):
+        _run(server, lambda client: aio.wait_for_import(client, group['id'], 'missing', initial_interval=0.01,
+                                                        max_not_found=2))
+
+
+def test_update_credentials_dedupes_datasources(server, group):
+    datasets = [server._new_dataset(server.groups[group['id']], f"dataset {i}") for i in range(4)]
+    shared = datasets[0]['_datasources']
+    for dataset in datasets:
+        dataset['_datasources'] = shared
+    server.reset_counters()
+
+    targets = [(group['id'], d['id']) for d in datasets] + [(group['id'], 'missing')]
+    result = _run(server, lambda client: aio.update_credentials(client, DW_CONN, targets))
+
+    assert [len(entry['datasets']) for entry in result['updated']] == [4]
+    assert [entry['dataset_id'] for entry in result['failed']] == ['missing']
+    assert server.call_counts()[('PATCH', 'gateways/{id}/datasources/{id}')] == 1
+
+
+def test_remove_everything_in_group(server, group):
+    content = server.groups[group['id']]
+    for name in ('[tmp] a', 'b'):
+        server._new_report(content, name, server._new_dataset(content, name)['id'])
+    content['dashboards']['d'] = {'id': 'd', 'displayName': None}
+
+    _run(server, lambda client: aio.remove_everything_in_group(client, group['id'], '[tmp]'))
+
+    assert [d['name'] for d in content['datasets'].values()] == ['b']
+    assert [r['name'] for r in content['reports'].values()] == ['b']
+    assert list(content['dashboards']) == ['d']
+
+
+def test_download_file_from_integration_hub(server, tmp_path):
+    source = tmp_path / 'source.pbix'
+    source.write_bytes(os.urandom(3 * 1024 * 1024 + 7))
+    server.add_file(TAG, 'Dataset - Sales.pbix', str(source))
+    target = tmp_path / 'target.pbix'
+
+    _run(server, lambda client: aio.download_file_from_integration_hub(client, TAG, 'Dataset - Sales.pbix',
+                                                                       str(target)))
+
+    assert target.read_bytes() == source.read_bytes()
@@ -0,0 +1,70 @@
+import concurrent.futures
+import os
+
+from bi_publishing.artifacts import ArtifactCache
+
+from conftest import TAG
+
+
+def _add_files(server, tmp_path, count, size=100):
+    files = []
+    for i in range(count):
+        path = tmp_path / f"file{i}.pbix"
+        path.write_bytes(os.urandom(size))
+        server.add_file(TAG, path.name, str(path))
+        files.append(path)
+    return files
+
+
+def test_fetch_hits_and_misses(server, client, tmp_path):
+    source, = _add_files(server, tmp_path, 1)
+    cache = ArtifactCache(str(tmp_path / 'cache'), client=client)
+
+    first = cache.fetch(TAG, source.name)
+    second = cache.fetch(TAG, source.name)
+
+    assert first == second
+    with open(first, 'rb') as f:
+        assert f.read() == source.read_bytes()
+    assert cache.stats == {'hits': 1, 'misses': 1, 'evictions': 0}
+    assert cache.lookup(TAG, 'unknown.pbix') is None
+
+
+def test_fetch_survives_eviction_when_larger_than_the_cache(server, client, tmp_path):
+    source, = _add_files(server, tmp_path, 1)
+    cache = ArtifactCache(str(tmp_path / 'cache'), max_bytes=10, client=client)
+
+    path = cache.fetch(TAG, source.name)
+    assert os.path.exists(path)
+
+    copy = cache.copy_to(TAG, source.name, str(tmp_path / 'copy.pbix'))
+    with open(copy, 'rb') as f:
+        assert f.read() == source.read_bytes()
+
+
+def test_evict_least_recently_used(server, client, tmp_path):
+    files = _add_files(server, tmp_path, 3)
+    cache = ArtifactCache(str(tmp_path / 'cache'), max_bytes=250, client=client)
+
+    for source in files:
+        cache.fetch(TAG, source.name)
+
+    assert cache.stats['evictions'] == 1
+    assert cache.size() <= 250
+    assert cache.lookup(TAG, files[0].name) is None
+    assert all(cache.lookup(TAG, source.name) for source in files[1:])
+
+
+def test_concurrent_copies_under_eviction(server, client, tmp_path):
+    files = _add_files(server, tmp_path, 6)
+    cache = ArtifactCache(str(tmp_path / 'cache'), max_bytes=150, client=client)
+    targets = [(source, str(tmp_path / f"copy{i}.pbix")) for i, source in enumerate(files * 10)]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=12) as pool:
+        copies = list(pool.map(lambda t: cache.copy_to(TAG, t[0].name, t[1]), targets))
+
+    for (source, _), copy in zip(targets, copies):
+        with open(copy, 'rb') as f:
+            assert f.read() == source.read_bytes()
+    assert cache._pins == {}
+    assert cache.size() <= 150
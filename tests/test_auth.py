@@ -0,0 +1,67 @@
+import os
+import stat
+
+import pytest
+
+msal = pytest.importorskip('msal')
+
+from bi_publishing import auth  # noqa: E402
+
+CONFIG = {'authority': 'https://login.microsoftonline.com/tenant', 'client_id': 'client', 'secret': 'hunter2',
+          'scope': ['https://analysis.windows.net/powerbi/api/.default']}
+
+
+class FakeApp:
+    """
+    stands in for msal.ConfidentialClientApplication, handing out numbered tokens
+    """
+    instances = []
+
+    def __init__(self, client_id, authority=None, client_credential=None, token_cache=None):
+        self.token_cache = token_cache
+        self.expires_in = 3600
+        self.calls = 0
+        FakeApp.instances.append(self)
+
+    def acquire_token_for_client(self, scopes):
+        self.calls += 1
+        self.token_cache.has_state_changed = True
+        return {'access_token': f"token {self.calls}", 'expires_in': self.expires_in, 'token_source': 'identity_provider'}
+
+
+@pytest.fixture(autouse=True)
+def fake_msal(monkeypatch):
+    monkeypatch.setattr(msal, 'ConfidentialClientApplication', FakeApp)
+    monkeypatch.setattr(auth, '_providers', {})
+    FakeApp.instances = []
+
+
+def test_token_is_reused_until_it_nears_expiry():
+    provider = auth.TokenProvider(CONFIG, refresh_margin=300)
+    assert provider.token() == provider.token() == 'token 1'
+
+    provider.app.expires_in = 200
+    provider._expires_at = 0
+    assert provider.token() == 'token 2'
+    # a token that expires within the margin is refreshed on every read
+    assert provider.token() == 'token 3'
+
+
+def test_cache_file_is_private(tmp_path):
+    path = str(tmp_path / 'tokens.json')
+    auth.TokenProvider(CONFIG, cache_path=path).token()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_failed_acquire_raises():
+    provider = auth.TokenProvider(CONFIG)
+    provider.app.acquire_token_for_client = lambda scopes: {'error': 'invalid_client'}
+    with pytest.raises(Exception, match='Failed to acquire token'):
+        provider.token()
+
+
+def test_providers_are_shared_per_app_without_keeping_the_secret():
+    provider = auth.get_token_provider(CONFIG)
+    assert auth.get_token_provider(dict(CONFIG)) is provider
+    assert auth.get_token_provider(dict(CONFIG, secret='other')) is not provider
+    assert not any(CONFIG['secret'] in key for key in auth._providers)
@@ -0,0 +1,25 @@
+from bi_publishing.cleanup import bulk_delete_in_group
+
+
+def _names(items):
+    return sorted(item['name'] for item in items)
+
+
+def test_bulk_delete_dry_run_then_delete(server, client, group):
+    content = server.groups[group['id']]
+    for name in ('[tmp] sales', '[tmp] finance', 'sales'):
+        dataset = server._new_dataset(content, name)
+        server._new_report(content, name, dataset['id'])
+
+    planned = bulk_delete_in_group(client, group['id'], prefix='[tmp]', dry_run=True)
+
+    assert planned['deleted'] == []
+    assert [item['kind'] for item in planned['planned']] == ['reports', 'reports', 'datasets', 'datasets']
+    assert _names(planned['planned']) == ['[tmp] finance'] * 2 + ['[tmp] sales'] * 2
+    assert len(content['datasets']) == 3 and len(content['reports']) == 3
+
+    summary = bulk_delete_in_group(client, group['id'], prefix='[tmp]')
+
+    assert summary['failed'] == []
+    assert _names(summary['deleted']) == _names(planned['planned'])
+    assert _names(content['datasets'].values()) == _names(content['reports'].values()) == ['sales']
@@ -0,0 +1,89 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from bi_publishing import cli
+
+from conftest import DW_CONN, MAPPING, TAG
+
+
+@pytest.fixture
+def run(client, monkeypatch, capsys):
+    """
+    runs the command line against the mock service and returns (exit status, parsed output)
+    """
+    monkeypatch.setattr(cli, '_client', lambda args: client)
+
+    def _run(*argv):
+        status = cli.main(list(argv))
+        out = capsys.readouterr().out
+        return status, json.loads(out) if out else None
+
+    return _run
+
+
+def test_commands_import_lazily():
+    code = "import sys, bi_publishing.cli; print(sorted(m for m in sys.modules if m in ('requests', 'msal')))"
+    assert subprocess.check_output([sys.executable, '-c', code], text=True).strip() == '[]'
+
+
+def test_missing_service_principal_settings(monkeypatch):
+    for name in ('TENANT_ID', 'CLIENT_ID', 'CLIENT_SECRET'):
+        monkeypatch.delenv(f"BI_PUBLISHING_{name}", raising=False)
+    with pytest.raises(SystemExit, match='BI_PUBLISHING_TENANT_ID'):
+        cli.main(['cleanup', 'workspace', '--all'])
+
+
+def test_cleanup_needs_a_filter(run):
+    with pytest.raises(SystemExit, match='--prefix or --pattern'):
+        run('cleanup', 'test workspace')
+
+
+def test_cleanup(server, run, group):
+    for name in ('[old] sales', 'sales'):
+        server._new_dataset(server.groups[group['id']], name)
+
+    status, summary = run('cleanup', 'test workspace', '--prefix', '[old]', '--dry-run')
+    assert status == 0 and [item['name'] for item in summary['planned']] == ['[old] sales']
+    assert len(server.groups[group['id']]['datasets']) == 2
+
+    status, summary = run('cleanup', 'test workspace', '--prefix', '[old]')
+    assert status == 0 and [item['name'] for item in summary['deleted']] == ['[old] sales']
+    assert [d['name'] for d in server.groups[group['id']]['datasets'].values()] == ['sales']
+
+
+def test_unknown_workspace(run):
+    with pytest.raises(SystemExit, match='workspace missing not found'):
+        run('refresh', 'missing')
+
+
+def test_publish(server, run, hub, tmp_path):
+    spec = tmp_path / 'workspace.json'
+    spec.write_text(json.dumps({'name': 'cli workspace', 'datasets': MAPPING, 'tag': TAG, 'db_name': 'db',
+                                'dw_conn': DW_CONN}))
+
+    status, result = run('publish', str(spec), '--work-dir', str(tmp_path / 'work'), '--no-refresh')
+    assert status == 0
+    assert result['workspace']['name'] == 'cli workspace'
+    (dataset,) = result['published'].values()
+    assert sorted(dataset['reports']) == sorted(next(iter(MAPPING.values())))
+
+    # nothing left to do the second time round
+    status, result = run('publish', str(spec), '--work-dir', str(tmp_path / 'work'), '--no-refresh')
+    assert status == 0 and result['operations'] == [] and result['published'] == {}
+
+
+def test_refresh_without_waiting(server, run, group):
+    dataset = server._new_dataset(server.groups[group['id']], 'sales')
+
+    status, result = run('refresh', 'test workspace', '--no-wait')
+
+    assert status == 0
+    assert [entry['dataset_id'] for entry in result] == [dataset['id']] and result[0]['request_id']
+
+
+def test_prepare_pbix_options():
+    with pytest.raises(SystemExit, match='go together'):
+        cli.main(['prepare-pbix', 'report.pbix', '--group-id', 'g'])
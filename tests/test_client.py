@@ -0,0 +1,60 @@
+import concurrent.futures
+
+import bi_publishing
+
+
+class RecordingSession:
+    """
+    requests compatible session that answers every call with an empty collection
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.closed = False
+
+    def request(self, method, url, **kwargs):
+        import requests
+        self.calls.append((method, url))
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"value": []}'
+        return response
+
+    def close(self):
+        self.closed = True
+
+
+class StaticTokens:
+    def __init__(self):
+        self.calls = 0
+
+    def token(self):
+        self.calls += 1
+        return f"token {self.calls}"
+
+
+def test_calls_go_through_the_client_session():
+    session = RecordingSession()
+    with bi_publishing.PowerBIClient('token', session=session) as client:
+        assert client['auth_token'] == 'token'
+        assert bi_publishing.get_datasets_in_group(client, 'group') == []
+    assert session.calls == [('GET', f"{bi_publishing.POWERBI_BASE_URL}/groups/group/datasets")]
+    assert session.closed
+
+
+def test_dict_clients_share_a_module_session():
+    client = {'auth_token': 'token'}
+    assert bi_publishing._get_session(client) is bi_publishing._get_session(dict(client))
+
+
+def test_token_provider_supplies_the_auth_token():
+    client = bi_publishing.PowerBIClient('stale', session=RecordingSession(), token_provider=StaticTokens())
+    assert bi_publishing._get_headers(client)['Authorization'] == 'Bearer token 1'
+    assert client['auth_token'] == 'token 2'
+
+
+def test_concurrent_calls_against_the_mock(server, client, group):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda _: bi_publishing.get_reports_in_group(client, group['id']), range(64)))
+    assert results == [[]] * 64
+    assert server.call_counts()[('GET', 'groups/{id}/reports')] == 64
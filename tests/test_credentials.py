@@ -0,0 +1,27 @@
+from bi_publishing.credentials import update_credentials
+
+from conftest import DW_CONN
+
+
+def test_update_credentials_dedupes_datasources(server, client, group):
+    datasets = [server._new_dataset(server.groups[group['id']], f"dataset {i}") for i in range(6)]
+    shared = [datasets[0]['_datasources'][0], datasets[1]['_datasources'][0]]
+    for i, dataset in enumerate(datasets):
+        dataset['_datasources'] = [shared[i % 2]]
+    server.reset_counters()
+
+    result = update_credentials(client, DW_CONN, [(group['id'], d['id']) for d in datasets])
+
+    assert result['failed'] == [] and result['skipped'] == []
+    assert sorted(len(entry['datasets']) for entry in result['updated']) == [3, 3]
+    assert server.call_counts()[('PATCH', 'gateways/{id}/datasources/{id}')] == 2
+    assert all(datasource.get('_credentials') for datasource in shared)
+
+
+def test_update_credentials_reports_failed_listings(server, client, group):
+    dataset = server._new_dataset(server.groups[group['id']], 'dataset')
+
+    result = update_credentials(client, DW_CONN, [(group['id'], dataset['id']), (group['id'], 'missing')])
+
+    assert len(result['updated']) == 1
+    assert [entry['dataset_id'] for entry in result['failed']] == ['missing']
@@ -0,0 +1,71 @@
+import pytest
+
+import bi_publishing
+from bi_publishing.mockserver import MockPowerBIServer
+
+from conftest import write_pbix
+
+
+def _upload(client, group, tmp_path, name='dataset'):
+    path = write_pbix(str(tmp_path / f"{name}.pbix"))
+    return bi_publishing.upload_datasest_to_group(client, group['id'], name, path)
+
+
+def _scripted_imports(monkeypatch, *outcomes):
+    calls = []
+
+    def _get_import(client, group_id, import_id):
+        outcome = outcomes[len(calls)]
+        calls.append(import_id)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(bi_publishing, 'get_import_in_group', _get_import)
+    return calls
+
+
+def test_wait_for_import_returns_the_created_objects(server, client, group, tmp_path):
+    imp = _upload(client, group, tmp_path)
+
+    result = bi_publishing.wait_for_import(client, group['id'], imp['id'], initial_interval=0.005)
+
+    assert result['importState'] == 'Succeeded'
+    assert result['datasets'][0]['id'] in server.groups[group['id']]['datasets']
+
+
+def test_wait_for_import_polls_through_brief_404s(monkeypatch):
+    calls = _scripted_imports(monkeypatch, bi_publishing.ImportNotFound(), bi_publishing.ImportNotFound(),
+                              {'importState': 'Publishing'}, {'importState': 'Succeeded', 'datasets': [{'id': 'd'}]})
+    assert bi_publishing.wait_for_import({}, 'g', 'i', initial_interval=0.001)['datasets'] == [{'id': 'd'}]
+    assert len(calls) == 4
+
+
+def test_wait_for_import_raises_other_errors_straight_away(monkeypatch):
+    calls = _scripted_imports(monkeypatch, Exception('500'), {'importState': 'Succeeded'})
+    with pytest.raises(Exception, match='500'):
+        bi_publishing.wait_for_import({}, 'g', 'i', initial_interval=0.001)
+    assert len(calls) == 1
+
+
+def test_wait_for_import_gives_up_on_an_unknown_import(server, client, group):
+    with pytest.raises(bi_publishing.ImportNotFound):
+        bi_publishing.wait_for_import(client, group['id'], 'missing', initial_interval=0.001, max_not_found=2)
+    assert server.call_counts()[('GET', 'groups/{id}/imports/missing')] == 3
+
+
+def test_wait_for_import_raises_when_the_import_fails(server, client, group, tmp_path):
+    imp = _upload(client, group, tmp_path)
+    # the mock fails imports whose object is gone when they finish
+    server.groups[group['id']]['datasets'].clear()
+    with pytest.raises(Exception, match='failed'):
+        bi_publishing.wait_for_import(client, group['id'], imp['id'], initial_interval=0.005)
+
+
+def test_wait_for_import_times_out(tmp_path):
+    with MockPowerBIServer(import_delay=30) as server, server.client() as client:
+        bi_publishing.create_group(client, 'slow')
+        group = bi_publishing.find_group(client, 'slow')
+        imp = _upload(client, group, tmp_path)
+        with pytest.raises(TimeoutError):
+            bi_publishing.wait_for_import(client, group['id'], imp['id'], timeout=0.1, initial_interval=0.02)
@@ -0,0 +1,54 @@
+import hashlib
+import os
+
+import bi_publishing
+from bi_publishing.artifacts import ArtifactCache
+from bi_publishing.incremental import PublishState, file_sha256
+
+from conftest import DW_CONN, MAPPING, TAG, write_pbix
+
+DATASET, REPORTS = next(iter(MAPPING.items()))
+
+
+def test_file_sha256_reads_the_file_whatever_its_name(tmp_path):
+    path = tmp_path / ('ab' * 32)
+    path.write_bytes(b'content')
+    assert file_sha256(str(path)) == hashlib.sha256(b'content').hexdigest()
+
+
+def test_artifact_cache_sha256(server, client, tmp_path, hub):
+    cache = ArtifactCache(str(tmp_path / 'cache'), client=client)
+    with open(server.files[(TAG, DATASET)], 'rb') as f:
+        assert cache.sha256(TAG, DATASET) == hashlib.sha256(f.read()).hexdigest()
+
+
+def test_publish_state_persists(tmp_path):
+    path = str(tmp_path / 'state.json')
+    state = PublishState(path)
+    state.record('a', 'fp-a', id='1')
+    state.record('b', 'fp-b', id='2')
+    state.forget('a')
+
+    state = PublishState(path)
+    assert state.get('a') is None
+    assert state.unchanged('b', 'fp-b') == {'fingerprint': 'fp-b', 'id': '2'}
+    assert state.unchanged('b', 'other') is None
+
+
+def test_changed_source_is_imported_over_the_existing_object(server, client, group, hub, tmp_path):
+    state = str(tmp_path / 'state.json')
+    cache = ArtifactCache(str(tmp_path / 'cache'), client=client)
+    publish = dict(prefix='[test]', work_dir=str(tmp_path), state=state, artifact_cache=cache)
+    first = bi_publishing.publish_workspace(client, group, MAPPING, TAG, 'db', DW_CONN, **publish)
+    server.reset_counters()
+
+    # a new tag with a changed report
+    for filename in hub:
+        server.add_file('v2', filename, server.files[(TAG, filename)])
+    changed = write_pbix(str(tmp_path / 'changed.pbix'), os.urandom(3000))
+    server.add_file('v2', REPORTS[0], changed)
+    second = bi_publishing.publish_workspace(client, group, MAPPING, 'v2', 'db', DW_CONN, **publish)
+
+    assert server.call_counts()[('POST', 'groups/{id}/imports')] == 1
+    assert second[DATASET]['skipped'] and second[DATASET]['skipped_reports'] == REPORTS[1:]
+    assert second[DATASET]['reports'][REPORTS[0]]['id'] == first[DATASET]['reports'][REPORTS[0]]['id']
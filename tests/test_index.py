@@ -0,0 +1,61 @@
+import time
+
+import bi_publishing
+from bi_publishing.index import MetadataIndex
+
+
+def test_lookup_store_and_add():
+    index = MetadataIndex()
+    index.store('g', 'datasets', [{'id': '1', 'name': 'a'}, {'id': '2', 'name': 'b'}])
+    index.add('g', 'datasets', [{'id': '3', 'name': 'c'}])
+    index.store(None, 'capacities', [{'id': 'c1', 'displayName': 'cap'}])
+
+    assert index.lookup('g', 'datasets', 'c')['id'] == '3'
+    assert index.lookup('g', 'datasets', 'a')['id'] == '1'
+    assert index.lookup(None, 'capacities', 'cap')['id'] == 'c1'
+    assert index.lookup('g', 'reports', 'a') is None
+    assert index.stats()['hits'] == 3 and index.stats()['misses'] == 1
+
+
+def test_entries_expire_after_ttl():
+    index = MetadataIndex(ttl=0.05)
+    index.store('g', 'reports', [{'id': '1', 'name': 'a'}])
+    assert index.lookup('g', 'reports', 'a') is not None
+    time.sleep(0.1)
+    assert index.lookup('g', 'reports', 'a') is None
+    assert index.stats()['collections'] == 0
+
+
+def test_invalidate():
+    index = MetadataIndex()
+    for group_id, kind in (('g', 'datasets'), ('g', 'reports'), ('h', 'reports'), (None, 'groups')):
+        index.store(group_id, kind, [{'id': '1', 'name': 'a'}])
+
+    index.invalidate('g', 'reports')
+    assert index.lookup('g', 'reports', 'a') is None and index.lookup('g', 'datasets', 'a') is not None
+    index.invalidate('g')
+    assert index.lookup('g', 'datasets', 'a') is None and index.lookup('h', 'reports', 'a') is not None
+    index.invalidate()
+    assert index.stats()['collections'] == 0
+
+
+def test_name_lookups_are_answered_from_the_index(server, client, group):
+    dataset = server._new_dataset(server.groups[group['id']], 'sales')
+    assert bi_publishing.get_datasets_in_group(client, group['id'])
+    server.reset_counters()
+
+    assert bi_publishing.get_dataset_by_name(client, group['id'], 'sales')['id'] == dataset['id']
+    assert bi_publishing.find_group(client, 'test workspace')['id'] == group['id']
+    assert server.call_counts() == {}
+
+
+def test_writes_invalidate_the_index(server, client, group):
+    dataset = server._new_dataset(server.groups[group['id']], 'sales')
+    bi_publishing.get_datasets_in_group(client, group['id'])
+
+    bi_publishing.delete_dataset_in_group(client, group['id'], dataset['id'])
+    server._new_dataset(server.groups[group['id']], 'sales')
+    server.reset_counters()
+
+    assert bi_publishing.get_dataset_by_name(client, group['id'], 'sales')['id'] != dataset['id']
+    assert server.call_counts() == {('GET', 'groups/{id}/datasets'): 1}
@@ -0,0 +1,81 @@
+import logging
+
+import pytest
+
+import bi_publishing
+from bi_publishing import instrument
+from bi_publishing.instrument import LoggingHook, StatsHook, endpoint_template
+
+GUID = '0f5c3a1e-8d2b-4c7a-9e61-2b3d4f5a6c7d'
+
+
+@pytest.fixture
+def stats():
+    hook = bi_publishing.add_hook(StatsHook())
+    yield hook
+    bi_publishing.remove_hook(hook)
+
+
+def test_endpoint_template():
+    base = bi_publishing.POWERBI_BASE_URL
+    assert endpoint_template(f"{base}/groups/{GUID}/imports?datasetDisplayName=x") == 'groups/{id}/imports'
+    assert endpoint_template(f"{base}/groups/{GUID}/datasets/{GUID}/refreshes/42") == \
+        'groups/{id}/datasets/{id}/refreshes/{id}'
+    assert endpoint_template('https://account.blob.core.windows.net/uploads/abc?sig=secret') == \
+        'account.blob.core.windows.net'
+
+
+def test_calls_are_reported_per_endpoint(server, client, group, stats):
+    for _ in range(3):
+        bi_publishing.get_reports_in_group(client, group['id'])
+    with pytest.raises(Exception):
+        bi_publishing.get_pages_for_report(client, group['id'], GUID)
+
+    requests = {(row['method'], row['endpoint']): row for row in stats.summary()['requests']}
+    assert requests[('GET', 'groups/{id}/reports')]['count'] == 3
+    assert requests[('GET', 'groups/{id}/reports')]['errors'] == 0
+    assert requests[('GET', 'groups/{id}/reports/{id}/pages')]['errors'] == 1
+    assert 'GET groups/{id}/reports' in stats.report()
+
+
+def test_spans(stats):
+    with bi_publishing.span('publish dataset', dataset='sales') as s:
+        assert s.attributes == {'dataset': 'sales'}
+    with pytest.raises(ValueError):
+        with bi_publishing.span('publish dataset'):
+            raise ValueError()
+
+    (row,) = stats.summary()['spans']
+    assert row['name'] == 'publish dataset' and row['count'] == 2 and row['errors'] == 1
+
+
+def test_nothing_is_tracked_without_hooks():
+    assert instrument.track_request('GET', bi_publishing.POWERBI_BASE_URL) is None
+    with bi_publishing.span('step') as s:
+        assert s is None
+
+
+def test_log_is_quiet_unless_verbose(capsys):
+    bi_publishing.log('--- quiet ---')
+    assert capsys.readouterr().out == ''
+
+    bi_publishing.set_verbose(True)
+    try:
+        bi_publishing.log('--- uploading:', 'sales.pbix')
+    finally:
+        bi_publishing.set_verbose(False)
+    assert capsys.readouterr().out == '--- uploading: sales.pbix\n'
+
+
+def test_logging_hook(caplog, server, client, group):
+    hook = bi_publishing.add_hook(LoggingHook())
+    try:
+        with caplog.at_level(logging.DEBUG, logger='bi_publishing'):
+            bi_publishing.get_reports_in_group(client, group['id'])
+            bi_publishing.log('--- done ---')
+    finally:
+        bi_publishing.remove_hook(hook)
+
+    (call,) = [r for r in caplog.records if r.levelno == logging.DEBUG]
+    assert call.bi_publishing['endpoint'] == 'groups/{id}/reports' and call.bi_publishing['status'] == 200
+    assert caplog.records[-1].getMessage() == '--- done ---'
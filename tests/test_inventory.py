@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+import bi_publishing
+from bi_publishing import inventory
+from bi_publishing.inventory import InventorySnapshot, refresh_inventory
+
+GET_INFO = ('POST', 'admin/workspaces/getInfo')
+
+
+@pytest.fixture
+def workspaces(server, client):
+    """
+    two workspaces with a dataset and a report each, scans finish straight away
+    """
+    server.scan_duration = 0
+    groups = {}
+    for name in ('east', 'west'):
+        bi_publishing.create_group(client, name)
+        group = bi_publishing.find_group(client, name)
+        dataset = server._new_dataset(server.groups[group['id']], f"{name} sales")
+        server._new_report(server.groups[group['id']], 'Sales Performance', dataset['id'])
+        groups[name] = group
+    server.reset_counters()
+    return groups
+
+
+def test_admin_scan(server, client, workspaces, tmp_path):
+    path = str(tmp_path / 'inventory.json')
+
+    summary = refresh_inventory(client, InventorySnapshot(path))
+
+    assert summary == {'source': 'admin', 'incremental': False, 'scanned': 2, 'removed': 0, 'failed': []}
+    assert server.call_counts()[GET_INFO] == 1
+    # the snapshot is answered from the file alone
+    snapshot = InventorySnapshot(path)
+    found = sorted((workspace['name'], report['name']) for workspace, report in
+                   snapshot.find('reports', name='Sales Performance'))
+    assert found == [('east', 'Sales Performance'), ('west', 'Sales Performance')]
+    (_, dataset), = snapshot.find('datasets', name='east sales')
+    assert snapshot.locate(dataset['id'].upper())[0] == 'datasets'
+    assert [w['name'] for w, _ in snapshot.reports_for_dataset(dataset['id'])] == ['east']
+    assert snapshot.counts()[workspaces['west']['id']] == {'datasets': 1, 'reports': 1, 'dashboards': 0}
+
+
+def test_scans_are_batched(server, client, workspaces, monkeypatch):
+    monkeypatch.setattr(inventory, 'SCAN_BATCH_SIZE', 1)
+    assert refresh_inventory(client, InventorySnapshot())['scanned'] == 2
+    assert server.call_counts()[GET_INFO] == 2
+
+
+def test_incremental_scan(server, client, workspaces):
+    snapshot = InventorySnapshot()
+    refresh_inventory(client, snapshot)
+    east, west = workspaces['east']['id'], workspaces['west']['id']
+    server.groups[east]['_modified_at'] = 0
+    server.groups[west]['_modified_at'] = time.time() + 60
+    server._new_dataset(server.groups[west], 'west orders')
+    bi_publishing.delete_group(client, east)
+    server.reset_counters()
+
+    summary = refresh_inventory(client, snapshot)
+
+    assert summary['incremental'] and summary['scanned'] == 1 and summary['removed'] == 1
+    assert [w['name'] for w in snapshot.workspaces()] == ['west']
+    assert len(snapshot.workspace(west)['datasets']) == 2
+    assert refresh_inventory(client, snapshot, full=True)['incremental'] is False
+
+
+def test_falls_back_to_listing_without_admin_rights(server, client, workspaces):
+    server.admin = False
+    snapshot = InventorySnapshot()
+
+    summary = refresh_inventory(client, snapshot)
+
+    assert summary == {'source': 'groups', 'incremental': False, 'scanned': 2, 'removed': 0, 'failed': []}
+    assert server.call_counts().get(GET_INFO, 0) == 0
+    assert len(list(snapshot.find('reports', name='Sales Performance'))) == 2
+    assert snapshot.source == 'groups'
@@ -0,0 +1,64 @@
+from bi_publishing.membership import normalize_member, plan_membership, sync_group_membership
+
+CURRENT = [
+    {'identifier': 'Alice@Corp.com', 'emailAddress': 'Alice@Corp.com', 'groupUserAccessRight': 'Viewer',
+     'principalType': 'User'},
+    {'identifier': 'bob@corp.com', 'emailAddress': 'bob@corp.com', 'groupUserAccessRight': 'Member',
+     'principalType': 'User'},
+    {'identifier': 'app-id', 'groupUserAccessRight': 'Admin', 'principalType': 'App'},
+]
+
+
+def _ops(operations):
+    return sorted((o['op'], o['identifier'], o['access']) for o in operations)
+
+
+def test_normalize_member():
+    assert normalize_member(('a@corp.com', 'Admin')) == \
+        {'identifier': 'a@corp.com', 'access': 'Admin', 'principal_type': 'User'}
+    assert normalize_member({'identifier': 'gid', 'access': 'Viewer', 'principal_type': 'Group'}) == \
+        {'identifier': 'gid', 'access': 'Viewer', 'principal_type': 'Group'}
+
+
+def test_plan_membership():
+    desired = [('alice@corp.com', 'Admin'), ('carol@corp.com', 'Contributor')]
+    assert _ops(plan_membership(CURRENT, desired)) == [
+        ('add', 'carol@corp.com', 'Contributor'),
+        ('remove', 'bob@corp.com', 'Member'),
+        # matched case insensitively and sent with the identifier the service has
+        ('update', 'Alice@Corp.com', 'Admin'),
+    ]
+
+
+def test_plan_membership_unchanged():
+    desired = [('ALICE@corp.com', 'Viewer'), ('bob@corp.com', 'Member')]
+    assert plan_membership(CURRENT, desired) == []
+
+
+def test_plan_membership_without_remove():
+    assert _ops(plan_membership(CURRENT, [('carol@corp.com', 'Viewer')], remove=False)) == \
+        [('add', 'carol@corp.com', 'Viewer')]
+
+
+def test_plan_membership_protect_types():
+    assert ('remove', 'app-id', 'Admin') not in _ops(plan_membership(CURRENT, []))
+    assert ('remove', 'app-id', 'Admin') in _ops(plan_membership(CURRENT, [], protect_types=()))
+
+
+def test_sync_group_membership(server, client, group):
+    users = server.groups[group['id']]['users']
+    for user in CURRENT[:2]:
+        users[user['identifier']] = dict(user)
+    desired = [('alice@corp.com', 'Admin'), ('carol@corp.com', 'Contributor')]
+
+    planned = sync_group_membership(client, group['id'], desired, dry_run=True)
+    assert len(planned['planned']) == 3
+    assert server.call_counts().get(('PUT', 'groups/{id}/users'), 0) == 0
+
+    summary = sync_group_membership(client, group['id'], desired)
+    assert summary['failed'] == []
+    assert [len(summary[k]) for k in ('added', 'updated', 'removed')] == [1, 1, 1]
+    assert {k: u['groupUserAccessRight'] for k, u in users.items()} == \
+        {'Alice@Corp.com': 'Admin', 'carol@corp.com': 'Contributor'}
+
+    assert sync_group_membership(client, group['id'], desired, dry_run=True)['planned'] == []
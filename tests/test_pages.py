@@ -0,0 +1,84 @@
+import bi_publishing
+from bi_publishing.pages import PageCache, get_page_urls_for_groups
+
+from conftest import DW_CONN, MAPPING, TAG
+
+PAGES = ('GET', 'groups/{id}/reports/{id}/pages')
+
+
+class Snapshot:
+    """
+    the part of an InventorySnapshot that get_page_urls_for_groups reads
+    """
+
+    def __init__(self, workspaces):
+        self.workspaces = workspaces
+
+    def workspace(self, group_id):
+        return self.workspaces.get(group_id)
+
+
+def _reports(server, group, count=3):
+    content = server.groups[group['id']]
+    return [server._new_report(content, f"report {i}") for i in range(count)]
+
+
+def _run(client, group_ids, **kwargs):
+    return sorted(get_page_urls_for_groups(client, group_ids, **kwargs), key=lambda r: r.get('report_name') or '')
+
+
+def test_page_urls_for_groups(server, client, group):
+    reports = _reports(server, group)
+    server._new_report(server.groups[group['id']], 'paginated')['reportType'] = 'PaginatedReport'
+
+    results = _run(client, [group['id'], 'missing'])
+
+    assert [r.get('report_name') for r in results] == [None] + [r['name'] for r in reports]
+    assert results[0]['group_id'] == 'missing' and 'error' in results[0]
+    assert [p['page_name'] for p in results[1]['pages']] == ['Page 1', 'Page 2', 'Page 3']
+    assert results[1]['pages'][0]['page_url'].startswith(reports[0]['webUrl'])
+
+
+def test_cache_without_snapshot_is_ttl_only(server, client, group, tmp_path):
+    _reports(server, group)
+    path = str(tmp_path / 'pages.json')
+    first = _run(client, [group['id']], cache=PageCache(path))
+    server.reset_counters()
+
+    assert _run(client, [group['id']], cache=PageCache(path)) == first
+    assert server.call_counts().get(PAGES, 0) == 0
+
+    _run(client, [group['id']], cache=PageCache(path, ttl=0))
+    assert server.call_counts()[PAGES] == 3
+
+
+def test_cache_follows_the_snapshot_marker(server, client, group):
+    reports = _reports(server, group, 2)
+    for report in reports:
+        report['modifiedDateTime'] = '2024-01-01T00:00:00.000Z'
+    snapshot = Snapshot({group['id']: {'reports': reports}})
+    cache = PageCache(ttl=0)
+    _run(client, [group['id']], cache=cache, snapshot=snapshot)
+    server.reset_counters()
+
+    reports[0]['modifiedDateTime'] = '2024-02-01T00:00:00.000Z'
+    _run(client, [group['id']], cache=cache, snapshot=snapshot)
+
+    # entries with a marker don't expire, only the modified report is fetched again
+    assert server.call_counts()[PAGES] == 1
+
+
+def test_publish_invalidates_republished_reports(server, client, group, hub, tmp_path):
+    cache = PageCache()
+    publish = dict(prefix='[test]', work_dir=str(tmp_path), refresh=False, name_conflict='CreateOrOverwrite',
+                   page_cache=cache)
+    first = bi_publishing.publish_workspace(client, group, MAPPING, TAG, 'db', DW_CONN, **publish)
+    _run(client, [group['id']], cache=cache)
+    server.reset_counters()
+
+    second = bi_publishing.publish_workspace(client, group, MAPPING, TAG, 'db', DW_CONN, **publish)
+    _run(client, [group['id']], cache=cache)
+
+    report_ids = [{r['id'] for result in run.values() for r in result['reports'].values()} for run in (first, second)]
+    assert report_ids[0] == report_ids[1]
+    assert server.call_counts()[PAGES] == len(report_ids[0])
@@ -0,0 +1,74 @@
+import json
+
+import requests
+
+import bi_publishing
+
+
+class PagedSession:
+    """
+    requests compatible session answering with the given collection pages in turn and recording the urls and params
+    """
+
+    def __init__(self, *pages):
+        self.pages = list(pages)
+        self.calls = []
+
+    def request(self, method, url, params=None, **kwargs):
+        self.calls.append((url, params))
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(self.pages.pop(0)).encode()
+        return response
+
+
+def _create_groups(server, client, *names):
+    for name in names:
+        bi_publishing.create_group(client, name)
+    server.reset_counters()
+
+
+def test_groups_are_read_in_pages(server, client):
+    names = [f"workspace {i}" for i in range(7)]
+    _create_groups(server, client, *names)
+
+    groups = bi_publishing.get_groups(client, page_size=3)
+
+    assert [g['name'] for g in groups] == names
+    # 3 + 3 + 1, the short page ends the listing
+    assert server.call_counts() == {('GET', 'groups'): 3}
+
+
+def test_iter_groups_is_lazy(server, client):
+    _create_groups(server, client, *(f"workspace {i}" for i in range(7)))
+
+    first = next(bi_publishing.iter_groups(client, page_size=3))
+
+    assert first['name'] == 'workspace 0'
+    assert server.call_counts() == {('GET', 'groups'): 1}
+
+
+def test_groups_are_filtered_by_the_service(server, client):
+    _create_groups(server, client, 'GTM east', 'GTM west', 'finance')
+
+    groups = bi_publishing.get_groups(client, filter="startswith(name,'GTM')")
+
+    assert sorted(g['name'] for g in groups) == ['GTM east', 'GTM west']
+
+
+def test_find_group_quotes_the_name(server, client):
+    _create_groups(server, client, "o'brien", 'obrien')
+
+    assert bi_publishing.find_group(client, "o'brien")['name'] == "o'brien"
+    assert bi_publishing.find_group(client, 'missing') is None
+    assert server.call_counts() == {('GET', 'groups'): 2}
+
+
+def test_next_links_are_followed():
+    next_link = f"{bi_publishing.POWERBI_BASE_URL}/capacities?$skiptoken=abc"
+    session = PagedSession({'value': [{'id': '1'}], '@odata.nextLink': next_link}, {'value': [{'id': '2'}]})
+    client = bi_publishing.PowerBIClient('token', session=session)
+
+    assert [c['id'] for c in bi_publishing.get_capcities(client)] == ['1', '2']
+    # the continuation link already carries its query
+    assert session.calls == [(f"{bi_publishing.POWERBI_BASE_URL}/capacities", {}), (next_link, None)]
@@ -0,0 +1,95 @@
+import os
+import zipfile
+
+import pytest
+
+from bi_publishing import pbix
+from bi_publishing.pbix import CONNECTIONS_MEMBER, PbixTemplate, connect_pbix, connections_content, disconnect_pbix
+
+from conftest import write_pbix
+
+DATA_MODEL = os.urandom(50000)
+
+
+@pytest.fixture(autouse=True, params=['raw', 'recompress'])
+def copy_mode(request, monkeypatch):
+    """
+    runs every test with the raw member copy and with the public api fallback used when zipfile lacks its internals
+    """
+    if request.param == 'recompress':
+        monkeypatch.setattr(pbix, '_has_zip_internals', lambda zip_file: False)
+    return request.param
+
+
+def _members(path):
+    with zipfile.ZipFile(path) as z:
+        assert z.testzip() is None
+        return {name: z.read(name) for name in z.namelist()}
+
+
+def test_disconnect_pbix(tmp_path):
+    source = write_pbix(str(tmp_path / 'report.pbix'), DATA_MODEL, connections='{}')
+    before = _members(source)
+
+    disconnect_pbix(source)
+
+    after = _members(source)
+    assert CONNECTIONS_MEMBER not in after
+    assert after['DataModel'] == DATA_MODEL
+    assert after == {name: data for name, data in before.items() if name != CONNECTIONS_MEMBER}
+
+
+def test_connect_pbix(tmp_path):
+    source = write_pbix(str(tmp_path / 'report.pbix'), DATA_MODEL, connections='{}')
+    output = str(tmp_path / 'connected.pbix')
+
+    connect_pbix(source, 'group', 'dataset', output)
+
+    members = _members(output)
+    assert members[CONNECTIONS_MEMBER].decode() == connections_content('group', 'dataset')
+    assert members['DataModel'] == DATA_MODEL
+    # the source is left alone when an output is given
+    assert _members(source)[CONNECTIONS_MEMBER] == b'{}'
+
+
+def test_template_stamp_matches_connect_pbix(tmp_path):
+    source = write_pbix(str(tmp_path / 'report.pbix'), DATA_MODEL, connections='{}')
+    template = PbixTemplate(source, base_path=str(tmp_path / 'report.base'))
+
+    expected = str(tmp_path / 'expected.pbix')
+    connect_pbix(source, 'group', 'dataset', expected)
+    stamped = template.stamp('group', 'dataset', str(tmp_path / 'stamped.pbix'))
+    assert _members(stamped) == _members(expected)
+
+    outputs = template.stamp_many([(f"group{i}", f"dataset{i}", str(tmp_path / f"{i}.pbix")) for i in range(3)])
+    for i, output in enumerate(outputs):
+        assert _members(output)[CONNECTIONS_MEMBER].decode() == connections_content(f"group{i}", f"dataset{i}")
+
+
+def test_template_open_streams_the_stamped_file(tmp_path):
+    source = write_pbix(str(tmp_path / 'report.pbix'), DATA_MODEL, connections='{}')
+    template = PbixTemplate(source)
+    stamped = template.stamp('group', 'dataset', str(tmp_path / 'stamped.pbix'))
+    files = sorted(os.listdir(tmp_path))
+
+    with template.open('group', 'dataset') as stream:
+        assert stream.name == 'report.pbix'
+        assert len(stream) == os.path.getsize(stamped)
+        data = stream.read()
+        stream.seek(10)
+        assert stream.read(20) == data[10:30]
+    with open(stamped, 'rb') as f:
+        assert data == f.read()
+    # nothing is left behind by the stream
+    assert sorted(os.listdir(tmp_path)) == files
+
+    assert os.path.exists(source + '.base')
+    template.remove()
+    assert not os.path.exists(source + '.base')
+
+
+def test_central_directory_offset_without_start_dir(tmp_path):
+    path = write_pbix(str(tmp_path / 'report.pbix'), DATA_MODEL, connections='{}')
+    with zipfile.ZipFile(path) as z:
+        reader = type('Reader', (), {'infolist': staticmethod(z.infolist)})()
+        assert pbix._central_directory_offset(reader, path) == z.start_dir
@@ -0,0 +1,87 @@
+import pytest
+
+import bi_publishing
+from bi_publishing import pipeline
+from bi_publishing.journal import PublishJournal
+
+from conftest import DW_CONN, MAPPING, TAG
+
+DATASET, REPORTS = next(iter(MAPPING.items()))
+
+
+def _imports(server):
+    return server.call_counts().get(('POST', 'groups/{id}/imports'), 0)
+
+
+def _publish(client, group, work_dir, **kwargs):
+    return bi_publishing.publish_workspace(client, group, MAPPING, TAG, 'db', DW_CONN, prefix='[test]',
+                                           work_dir=str(work_dir), **kwargs)
+
+
+def test_run_dag_respects_dependencies():
+    order = []
+    tasks = {
+        'a': (lambda deps: order.append('a') or 1, []),
+        'b': (lambda deps: order.append('b') or deps['a'] + 1, ['a']),
+        'c': (lambda deps: deps['a'] + deps['b'], ['a', 'b']),
+    }
+    assert pipeline.run_dag(tasks) == {'a': 1, 'b': 2, 'c': 3}
+    assert order == ['a', 'b']
+
+
+def test_run_dag_reports_failed_steps():
+    def _fail(deps):
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError) as info:
+        pipeline.run_dag({'a': (_fail, []), 'b': (lambda deps: None, ['a'])})
+    assert info.value.failed_steps == {'a': 'boom'}
+
+
+def test_publish_workspace(server, client, group, hub, tmp_path):
+    result = _publish(client, group, tmp_path)
+
+    dataset = result[DATASET]['dataset']
+    assert [d['id'] for d in bi_publishing.get_datasets_in_group(client, group['id'])] == [dataset['id']]
+    reports = bi_publishing.get_reports_in_group(client, group['id'])
+    assert sorted(r['name'] for r in reports) == sorted(f"[test] {r}".replace('.pbix', '') for r in REPORTS)
+    assert {r['datasetId'] for r in reports} == {dataset['id']}
+    assert _imports(server) == 1 + len(REPORTS)
+    # the report templates don't outlive the publish
+    assert not list(tmp_path.glob('*.base'))
+
+
+def test_incremental_publish_skips_unchanged(server, client, group, hub, tmp_path):
+    state = str(tmp_path / 'state.json')
+    first = _publish(client, group, tmp_path, state=state)
+    server.reset_counters()
+
+    second = _publish(client, group, tmp_path, state=state)
+
+    assert _imports(server) == 0
+    assert second[DATASET]['skipped']
+    assert sorted(second[DATASET]['skipped_reports']) == sorted(REPORTS)
+    assert second[DATASET]['dataset']['id'] == first[DATASET]['dataset']['id']
+
+
+def test_journal_resumes_interrupted_publish(server, client, group, hub, tmp_path, monkeypatch):
+    journal = str(tmp_path / 'journal.jsonl')
+    refresh = pipeline.refresh_dataset_in_group
+
+    def _interrupted(*args, **kwargs):
+        raise ConnectionError('interrupted')
+
+    monkeypatch.setattr(pipeline, 'refresh_dataset_in_group', _interrupted)
+    with pytest.raises(ConnectionError):
+        _publish(client, group, tmp_path, journal=journal)
+    dataset_id = bi_publishing.get_datasets_in_group(client, group['id'])[0]['id']
+
+    monkeypatch.setattr(pipeline, 'refresh_dataset_in_group', refresh)
+    result = _publish(client, group, tmp_path, journal=journal)
+
+    # nothing that was imported before the interruption is imported again
+    assert _imports(server) == 1 + len(REPORTS)
+    assert result[DATASET]['dataset']['id'] == dataset_id
+    assert len(bi_publishing.get_reports_in_group(client, group['id'])) == len(REPORTS)
+    # a finished run starts over next time
+    assert PublishJournal(journal)._entries[-1]['event'] == 'finished'
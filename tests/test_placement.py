@@ -0,0 +1,92 @@
+import pytest
+
+import bi_publishing
+from bi_publishing.placement import assign_capacities, capacity_inventory, least_loaded, place_groups, plan_placement
+
+
+def _groups(client, *names):
+    for name in names:
+        bi_publishing.create_group(client, name)
+    return [bi_publishing.find_group(client, name)['id'] for name in names]
+
+
+def _capacity_of(server, group_id):
+    return server.groups[group_id].get('capacityId')
+
+
+@pytest.fixture
+def capacities(server):
+    return {
+        'a': server.add_capacity('a'),
+        'b': server.add_capacity('b'),
+        'us': server.add_capacity('us', region='East US'),
+        'paused': server.add_capacity('paused', state='Suspended'),
+        'viewer': server.add_capacity('viewer', access_right='None'),
+    }
+
+
+def test_capacity_inventory(server, client, capacities):
+    placed, _ = _groups(client, 'placed', 'shared')
+    bi_publishing.add_group_to_capacity(client, placed, capacities['a']['id'])
+    server._new_dataset(server.groups[placed], 'sales')
+
+    inventory = capacity_inventory(client, count_datasets=True, sizes={placed: 100})
+
+    entries = {entry['name']: entry for entry in inventory['capacities'].values()}
+    assert {name for name, entry in entries.items() if entry['assignable']} == {'a', 'b', 'us'}
+    assert entries['a']['workspaces'] == {placed}
+    assert entries['a']['datasets'] == 1 and entries['a']['size'] == 100
+    assert inventory['capacities'][capacities['a']['id'].lower()] is entries['a']
+
+
+def test_workspaces_are_spread_over_the_least_loaded_capacities(server, client, capacities):
+    placed, *new = _groups(client, 'placed', 'one', 'two', 'three')
+    bi_publishing.add_group_to_capacity(client, placed, capacities['a']['id'])
+
+    result = place_groups(client, new, regions=['West Europe'])
+
+    assert not result['failed']
+    assert [_capacity_of(server, group_id) for group_id in new] == [capacities[name]['id'] for name in 'bab']
+
+
+def test_placed_workspaces_stay_unless_moved(server, client, capacities):
+    placed, other = _groups(client, 'placed', 'other')
+    for group_id in (placed, other):
+        bi_publishing.add_group_to_capacity(client, group_id, capacities['a']['id'])
+
+    assert plan_placement(client, [placed], regions=['West Europe']) == []
+    (assignment,) = plan_placement(client, [placed], regions=['West Europe'], move=True)
+    assert assignment['from'] == capacities['a']['id'] and assignment['to'] == capacities['b']['id']
+    # a workspace outside the wanted region is moved into it
+    (assignment,) = plan_placement(client, [placed], regions=['East US'])
+    assert assignment['to_name'] == 'us'
+
+
+def test_largest_workspaces_are_placed_first(server, client, capacities):
+    small, large = _groups(client, 'small', 'large')
+    for _ in range(3):
+        server._new_dataset(server.groups[large], 'sales')
+
+    assignments = plan_placement(client, [small, large], policy=least_loaded('datasets'), skus=['A1'],
+                                 regions=['West Europe'])
+
+    assert [(a['name'], a['to_name']) for a in assignments] == [('large', 'a'), ('small', 'b')]
+
+
+def test_dry_run_and_failed_assignments(server, client, capacities):
+    (group_id,) = _groups(client, 'new')
+
+    result = place_groups(client, [group_id], dry_run=True)
+    assert result['assigned'] == [] and len(result['planned']) == 1
+    assert _capacity_of(server, group_id) is None
+
+    del server.capacities[result['planned'][0]['to']]
+    result = assign_capacities(client, result['planned'])
+    assert result['assigned'] == [] and 'not found' in result['failed'][0]['error']
+
+
+def test_unknown_workspaces_and_metrics(server, client, capacities):
+    with pytest.raises(ValueError):
+        least_loaded('memory')
+    with pytest.raises(ValueError, match='not found'):
+        plan_placement(client, ['missing'])
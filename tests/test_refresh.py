@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+import bi_publishing
+from bi_publishing import refresh
+
+
+def test_refresh_payload():
+    assert refresh.refresh_payload() == {}
+    assert refresh.refresh_payload(notify_option='MailOnFailure') == {'notifyOption': 'MailOnFailure'}
+    assert refresh.refresh_payload(commit_mode='transactional', objects=['Sales', ('Orders', '2024')]) == {
+        'commitMode': 'transactional',
+        'objects': [{'table': 'Sales'}, {'table': 'Orders', 'partition': '2024'}],
+    }
+    with pytest.raises(ValueError):
+        refresh.refresh_payload(retry_count=1, notify_option='MailOnFailure')
+
+
+def test_typical_duration():
+    history = [
+        {'status': 'Completed', 'startTime': '2024-01-01T00:00:00Z', 'endTime': '2024-01-01T00:01:00Z'},
+        {'status': 'Completed', 'startTime': '2024-01-01T00:00:00Z', 'endTime': '2024-01-01T00:03:00Z'},
+        {'status': 'Failed', 'startTime': '2024-01-01T00:00:00Z', 'endTime': '2024-01-01T01:00:00Z'},
+        {'status': 'Unknown', 'startTime': '2024-01-01T00:00:00Z'},
+    ]
+    assert refresh.typical_duration(history) == 120
+    assert refresh.typical_duration([]) is None
+
+
+@pytest.mark.parametrize('options', [{}, {'commit_mode': 'transactional'}])
+def test_refresh_and_wait(server, client, group, options):
+    dataset = server._new_dataset(server.groups[group['id']], 'sales')
+
+    request_id = bi_publishing.refresh_dataset_in_group(client, group['id'], dataset['id'], **options)
+    result = refresh.wait_for_refresh(client, group['id'], dataset['id'], request_id, initial_interval=0.01)
+
+    assert result['requestId'] == request_id and result['status'] == 'Completed'
+    assert result['refreshType'] == ('ViaEnhancedApi' if options else 'ViaApi')
+
+
+def test_wait_for_refresh_times_out(server, client, group):
+    server.refresh_duration = 30
+    dataset = server._new_dataset(server.groups[group['id']], 'sales')
+    request_id = bi_publishing.refresh_dataset_in_group(client, group['id'], dataset['id'])
+
+    with pytest.raises(TimeoutError):
+        refresh.wait_for_refresh(client, group['id'], dataset['id'], request_id, timeout=0.1, initial_interval=0.02)
+
+
+def test_group_capacities(server, client):
+    capacity = server.add_capacity('cap')
+    for name in ('dedicated', 'shared'):
+        bi_publishing.create_group(client, name)
+    dedicated, shared = (bi_publishing.find_group(client, name) for name in ('dedicated', 'shared'))
+    bi_publishing.add_group_to_capacity(client, dedicated['id'], capacity['id'])
+
+    assert refresh.group_capacities(client, [dedicated['id'], shared['id']]) == {
+        dedicated['id']: capacity['id'], shared['id']: None}
+
+
+def test_refresh_datasets_caps_refreshes_per_capacity(monkeypatch):
+    lock = threading.Lock()
+    running = {}
+    peak = {}
+
+    def _refresh(client, group_id, dataset_id, **options):
+        if dataset_id == 'broken':
+            raise Exception('refresh rejected')
+        return f"request {dataset_id}"
+
+    def _wait(client, group_id, dataset_id, request_id, timeout):
+        with lock:
+            running[group_id] = running.get(group_id, 0) + 1
+            peak[group_id] = max(peak.get(group_id, 0), running[group_id])
+        time.sleep(0.02)
+        with lock:
+            running[group_id] -= 1
+        return {'requestId': request_id, 'status': 'Completed'}
+
+    monkeypatch.setattr(refresh, 'refresh_dataset_in_group', _refresh)
+    monkeypatch.setattr(refresh, 'wait_for_refresh', _wait)
+    targets = [('a', str(i)) for i in range(6)] + [('b', str(i)) for i in range(6)] + [('c', 'broken')]
+
+    results = refresh.refresh_datasets({}, targets, max_per_capacity=2, capacities={'a': 'cap a', 'b': 'cap b'})
+
+    # shared capacity groups (c) have their own queue
+    assert peak == {'a': 2, 'b': 2}
+    assert [(r['group_id'], r['dataset_id']) for r in results] == targets
+    assert results[0] == {'group_id': 'a', 'dataset_id': '0', 'capacity_id': 'cap a',
+                          'refresh': {'requestId': 'request 0', 'status': 'Completed'}}
+    assert results[-1]['error'] == 'refresh rejected' and results[-1]['capacity_id'] is None
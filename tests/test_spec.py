@@ -0,0 +1,97 @@
+import bi_publishing
+from bi_publishing.spec import WorkspaceSpec, apply, plan
+
+from conftest import DW_CONN, MAPPING, TAG
+
+DATASET, REPORTS = next(iter(MAPPING.items()))
+
+
+def _spec(**kwargs):
+    return WorkspaceSpec('spec workspace', datasets=MAPPING, tag=TAG, db_name='db', dw_conn=DW_CONN, prefix='[t]',
+                         **kwargs)
+
+
+def _ops(changes):
+    return [(op['op'], op['target']) for op in changes.operations]
+
+
+def _imports(server):
+    return server.call_counts().get(('POST', 'groups/{id}/imports'), 0)
+
+
+def _content(server, group_id):
+    group = server.groups[group_id]
+    return sorted(d['name'] for d in group['datasets'].values()), sorted(r['name'] for r in group['reports'].values())
+
+
+def _deployed(server, client, tmp_path):
+    changes = plan(client, _spec())
+    results = apply(client, changes, work_dir=str(tmp_path), refresh=False)
+    server.reset_counters()
+    return results['group']
+
+
+def test_plan_and_apply(server, client, hub, tmp_path):
+    spec = _spec(users=[('admin@corp.com', 'Admin')])
+
+    changes = plan(client, spec)
+    assert _ops(changes) == [('create_group', 'spec workspace'), ('add_user', 'admin@corp.com'),
+                             ('publish', DATASET)]
+
+    results = apply(client, changes, work_dir=str(tmp_path), refresh=False)
+    group = results['group']
+    assert _content(server, group['id']) == (['[t] Dataset - Sales'], ['[t] Management Report', '[t] Strategy Report'])
+    assert list(server.groups[group['id']]['users']) == ['admin@corp.com']
+
+    # an up to date spec makes no changes
+    assert not plan(client, spec)
+
+
+def test_apply_completes_a_partially_deployed_workspace(server, client, hub, tmp_path):
+    group = _deployed(server, client, tmp_path)
+    reports = server.groups[group['id']]['reports']
+    dataset_id, = server.groups[group['id']]['datasets']
+    missing = next(r['id'] for r in reports.values() if r['name'] == '[t] Strategy Report')
+    del reports[missing]
+
+    changes = plan(client, _spec())
+    assert _ops(changes) == [('publish_report', f"{DATASET}/Strategy Report.pbix")]
+
+    results = apply(client, changes, work_dir=str(tmp_path), refresh=False)
+
+    # only the missing report is imported, against the deployed dataset
+    assert _imports(server) == 1
+    assert _content(server, group['id']) == (['[t] Dataset - Sales'], ['[t] Management Report', '[t] Strategy Report'])
+    assert {r['datasetId'] for r in reports.values()} == {dataset_id}
+    assert results['publish'][DATASET]['dataset']['id'] == dataset_id
+    assert not plan(client, _spec())
+
+
+def test_apply_republishes_a_missing_dataset_over_its_reports(server, client, hub, tmp_path):
+    group = _deployed(server, client, tmp_path)
+    content = server.groups[group['id']]
+    report_ids = set(content['reports'])
+    content['datasets'].clear()
+
+    changes = plan(client, _spec())
+    assert _ops(changes) == [('publish', DATASET)]
+    apply(client, changes, work_dir=str(tmp_path), refresh=False)
+
+    # the reports that were still there are overwritten instead of failing or being duplicated
+    assert _imports(server) == 1 + len(REPORTS)
+    assert set(content['reports']) == report_ids
+    dataset_id, = content['datasets']
+    assert {r['datasetId'] for r in content['reports'].values()} == {dataset_id}
+
+
+def test_check_parameters(server, client, hub, tmp_path):
+    group = _deployed(server, client, tmp_path)
+    dataset, = server.groups[group['id']]['datasets'].values()
+    dataset['_parameters']['db_name'] = 'other'
+
+    changes = plan(client, _spec(), check_parameters=True)
+    assert _ops(changes) == [('update_params', DATASET)]
+    apply(client, changes)
+
+    assert dataset['_parameters']['db_name'] == 'db'
+    assert not plan(client, _spec(), check_parameters=True)
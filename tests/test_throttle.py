@@ -0,0 +1,116 @@
+import email.utils
+import io
+import time
+
+import pytest
+import requests
+
+import bi_publishing
+from bi_publishing.mockserver import MockPowerBIServer
+from bi_publishing.throttle import (
+    RateLimiter,
+    RetryPolicy,
+    TokenBucket,
+    _parse_retry_after,
+    endpoint_class,
+    shared_rate_limiter,
+)
+
+URL = f"{bi_publishing.POWERBI_BASE_URL}/groups/group/imports"
+
+
+class ScriptedSession:
+    """
+    requests compatible session answering with the given statuses in turn and recording the bodies it was sent
+    """
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.bodies = []
+
+    def request(self, method, url, data=None, **kwargs):
+        self.bodies.append(data.read() if hasattr(data, 'read') else data)
+        status = self.statuses.pop(0)
+        if isinstance(status, Exception):
+            raise status
+        response = requests.Response()
+        response.status_code = status
+        response.headers['Retry-After'] = '0'
+        response._content = b'{}'
+        return response
+
+
+def test_token_bucket_spaces_out_calls():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.reserve() == bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.02)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.02)
+
+
+def test_endpoint_classes():
+    assert endpoint_class('post', URL) == 'import'
+    assert endpoint_class('GET', URL) == 'read'
+    assert endpoint_class('PATCH', f"{bi_publishing.POWERBI_BASE_URL}/groups/group") == 'write'
+
+
+def test_rate_limiter_applies_class_and_tenant_buckets():
+    limiter = RateLimiter(rate=100, class_rates={'import': 1})
+    assert limiter._buckets('GET', URL) == [limiter.tenant]
+    assert limiter._buckets('POST', URL) == [limiter.classes['import'], limiter.tenant]
+    assert shared_rate_limiter('tenant-a') is shared_rate_limiter('tenant-a')
+    assert shared_rate_limiter('tenant-a') is not shared_rate_limiter('tenant-b')
+
+
+def test_retry_after():
+    assert _parse_retry_after('7') == 7
+    assert _parse_retry_after(email.utils.formatdate(time.time() + 60, usegmt=True)) == pytest.approx(60, abs=2)
+    assert _parse_retry_after('soon') is None
+    assert RetryPolicy(max_retry_after=5).delay(0, {'Retry-After': '120'}) == 5
+
+
+def test_retry_policy():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.should_retry('POST', 0, 429)
+    assert not policy.should_retry('POST', 0, 503)
+    assert policy.should_retry('GET', 1, 503)
+    assert policy.should_retry('PUT', 0, error=ConnectionError())
+    assert not policy.should_retry('GET', 0, 404)
+    assert not policy.should_retry('GET', 2, 429)
+
+
+def test_request_retries_throttled_calls_and_rewinds_the_body():
+    session = ScriptedSession(429, 429, 202)
+    client = bi_publishing.PowerBIClient('token', session=session)
+
+    response = bi_publishing._request(client, 'POST', URL, data=io.BytesIO(b'pbix'))
+
+    assert response.status_code == 202
+    assert session.bodies == [b'pbix'] * 3
+
+
+def test_request_retries_connection_errors_of_idempotent_calls():
+    session = ScriptedSession(requests.ConnectionError(), 200)
+    client = bi_publishing.PowerBIClient('token', session=session, retry_policy=RetryPolicy(backoff=0.01))
+    assert bi_publishing._request(client, 'GET', URL).status_code == 200
+
+    session = ScriptedSession(requests.ConnectionError(), 200)
+    client = bi_publishing.PowerBIClient('token', session=session, retry_policy=RetryPolicy(backoff=0.01))
+    with pytest.raises(requests.ConnectionError):
+        bi_publishing._request(client, 'POST', URL)
+
+
+def test_request_gives_up_after_max_retries():
+    session = ScriptedSession(429, 429, 429)
+    client = bi_publishing.PowerBIClient('token', session=session, retry_policy=RetryPolicy(max_retries=2))
+    assert bi_publishing._request(client, 'POST', URL).status_code == 429
+    assert len(session.bodies) == 3
+
+
+def test_client_rate_limiter_avoids_service_throttling():
+    with MockPowerBIServer(throttle_rate=50, throttle_burst=5) as server:
+        with server.client(rate_limiter=RateLimiter(rate=40, burst=5)) as client:
+            bi_publishing.create_group(client, 'throttled')
+            group = bi_publishing.find_group(client, 'throttled')
+            for _ in range(20):
+                bi_publishing.get_reports_in_group(client, group['id'])
+        assert server.throttled == 0
@@ -0,0 +1,96 @@
+import io
+import os
+
+import pytest
+
+import bi_publishing
+from bi_publishing.uploads import MultipartStream, UploadInterrupted, post_import
+
+BLOCKS = ('PUT', 'mockblob.local')
+
+
+class FlakyFile(io.BytesIO):
+    """
+    in memory file whose first read at `fail_at` raises, like a share that drops out mid upload
+    """
+
+    def __init__(self, data, fail_at):
+        super().__init__(data)
+        self.fail_at = fail_at
+
+    def read(self, size=-1):
+        if self.tell() == self.fail_at:
+            self.fail_at = None
+            raise IOError("read failed")
+        return super().read(size)
+
+
+def _import_url(group, name='dataset'):
+    return f"{bi_publishing.POWERBI_BASE_URL}/groups/{group['id']}/imports?datasetDisplayName={name}&skipReport=true"
+
+
+def test_multipart_stream():
+    data = os.urandom(5000)
+    progress = []
+    body = MultipartStream(io.BytesIO(data), 'report.pbix', progress=lambda sent, total: progress.append((sent, total)))
+
+    chunks = []
+    while True:
+        chunk = body.read(1024)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    content = b''.join(chunks)
+
+    assert len(content) == len(body)
+    assert f'filename="report.pbix"'.encode() in content and data in content
+    assert content.endswith(f'--{body.boundary}--\r\n'.encode())
+    assert progress[-1] == (len(body), len(body))
+    # rewinding gives the same body again, which is what a retry sends
+    body.seek(0)
+    assert body.read() == content
+
+
+def test_inline_upload_streams_the_file(server, client, group):
+    data = os.urandom(200000)
+    progress = []
+
+    response = post_import(client, group['id'], _import_url(group), 'dataset.pbix', io.BytesIO(data),
+                           progress=lambda sent, total: progress.append(sent))
+
+    assert response.ok
+    assert server.call_counts().get(BLOCKS, 0) == 0
+    assert server.bytes_received >= len(data)
+    assert progress[-1] > len(data)
+
+
+def test_large_file_goes_up_in_blocks(server, client, group, tmp_path):
+    path = tmp_path / 'large.pbix'
+    path.write_bytes(os.urandom(10000))
+
+    imp = bi_publishing.upload_datasest_to_group(client, group['id'], 'large', str(path), large_file_threshold=1000,
+                                                 block_size=1024)
+    result = bi_publishing.wait_for_import(client, group['id'], imp['id'], initial_interval=0.005)
+
+    assert result['datasets'][0]['name'] == 'large'
+    # ten blocks plus the block list commit
+    assert server.call_counts()[BLOCKS] == 11
+
+
+def test_interrupted_block_upload_resumes_with_the_missing_blocks(server, client, group):
+    f = FlakyFile(os.urandom(10000), fail_at=2048)
+    options = dict(large_file_threshold=1000, block_size=1024, max_workers=1)
+
+    with pytest.raises(UploadInterrupted) as info:
+        post_import(client, group['id'], _import_url(group), 'dataset.pbix', f, **options)
+    sent = server.call_counts()[BLOCKS]
+    assert 2 <= sent < 10
+    server.reset_counters()
+
+    response = post_import(client, group['id'], _import_url(group), 'dataset.pbix', f,
+                           upload_url=info.value.upload_url, **options)
+
+    assert response.ok
+    # the block list is read back, then only the blocks it lacks are sent before the commit
+    assert server.call_counts()[BLOCKS] == 10 - sent + 1
+    assert server.call_counts()[('GET', 'mockblob.local')] == 1